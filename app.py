@@ -2,8 +2,9 @@ import streamlit as st
 import sys
 sys.path.append('./')
 from src.ui import demo_ui
-from src.utils import cognito_auth_helper
+from src.utils import cognito_auth_helper, client_registry
 import logging
+import os
 
 # Configure logging
 logging.basicConfig(
@@ -130,6 +131,9 @@ def main():
         </style>
     """, unsafe_allow_html=True)
 
+    # open pooled connections to the runtimes the demo pages call, once per process
+    client_registry.prewarm_async(["bedrock-runtime", "bedrock-agent-runtime"], os.getenv('AWS_PROFILE', None))
+
     auth = cognito_auth_helper.CognitoAuth()
     authenticator = auth.get_authenticator()
 
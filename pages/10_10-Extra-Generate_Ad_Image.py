@@ -8,15 +8,13 @@ Shows how to run a multimodal prompt with Anthropic Claude (on demand) and Invok
 
 import datetime
 import logging
-from io import StringIO, BytesIO
+from io import StringIO
 import os
 import fitz
 import streamlit as st
-from PIL import Image
 from tempfile import NamedTemporaryFile
 from argparse import ArgumentParser
-from src.utils import bedrockHelper, utils
-import base64
+from src.utils import bedrockHelper, utils, bedrock_scheduler, image_fanout, image_helper, response_cache, output_encoder
 import json
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -55,6 +53,12 @@ def main(profile):
     if "num_images" not in st.session_state:
         st.session_state["num_images"] = 3
 
+    if "seed_sweep" not in st.session_state:
+        st.session_state["seed_sweep"] = []
+
+    if "cfg_sweep" not in st.session_state:
+        st.session_state["cfg_sweep"] = []
+
     if "cfg_scale" not in st.session_state:
         st.session_state["cfg_scale"] = 10
 
@@ -64,6 +68,9 @@ def main(profile):
     if "media_type" not in st.session_state:
         st.session_state["media_type"] = 'image/jpeg'
 
+    if "output_format" not in st.session_state:
+        st.session_state["output_format"] = output_encoder.DEFAULT_POLICY
+
     if "max_tokens" not in st.session_state:
         st.session_state["max_tokens"] = 1000
 
@@ -92,7 +99,7 @@ def main(profile):
             "Describe the image you want to generate. Generative AI image generation powered by Amazon Bedrock and Stable Diffusion 1 XL and Amazon Titan G1 V2 foundation models."
         )
         # main prompt
-        img_prompt = json.loads(utils.pickle_load("img_prompt.pkl"))
+        img_prompt = json.loads(utils.artifact_load("img_prompt.pkl"))
         prompt = st.text_area(label="Image Prompt:", value=img_prompt["prompt"])
         # Masking prompt
         msk_prompt = img_prompt["mask_prompt"]
@@ -134,9 +141,14 @@ def main(profile):
                             text += page.get_text()
                         prompt = f"{prompt}\n\n{text}"
                 else:  # image media-type
-                    image = Image.open(uploaded_file)
                     file_path = f"{assets_dir}/_temp_images/{uploaded_file.name}"
-                    image.save(file_path)
+                    try:
+                        st.session_state.ingest_stats = image_helper.ingest_image(
+                            uploaded_file, file_path, bedrockHelper.get_max_img_size(st.session_state.model_id)
+                        )
+                    except image_helper.ImageBudgetError as e:
+                        st.error(e.message)
+                        continue
                     file_paths.append(
                         {
                             "file_path": file_path,
@@ -164,67 +176,48 @@ def main(profile):
 
             with st.spinner(text="Analyzing..."):
                 current_time1 = datetime.datetime.now()
-                response = bedrockHelper.build_request(prompt, file_paths, profile,  mask_prompt, negative_prompt, st.session_state.task_type)
-                current_time2 = datetime.datetime.now()
-
-                # Extract the image data
-                if "stability" in st.session_state["model_id"]:
-                    image_path = os.path.join(f"{assets_dir}/generated_images/", "generated_image.png")
-                    if "sd3" in st.session_state["model_id"]:
-                        base64_output_image = response["images"][0]
-                        image_data = base64.b64decode(base64_output_image)
-                        image = Image.open(BytesIO(image_data))
-                        image.save(image_path)
-                        finish_reason = response.get("finish_reasons")[0]
-                        print(finish_reason)
-                        if finish_reason:
-                            raise bedrockHelper.ImageError(f"Image generation error. Error code is {finish_reason}")
-                    else:
-                        base64_image = response.get("artifacts")[0].get("base64")
-                        base64_bytes = base64_image.encode('ascii')
-                        image_bytes = base64.b64decode(base64_bytes)
-                        finish_reason = response.get("artifacts")[0].get("finishReason")
-                        # Save the generated image to a local file
-                        with open(image_path, "wb") as file:
-                            file.write(image_bytes)
-                        if finish_reason == 'ERROR' or finish_reason == 'CONTENT_FILTERED':
-                            raise bedrockHelper.ImageError(f"Image generation error. Error code is {finish_reason}")
-
-                    # Display the generated image in Streamlit
-                    st.image(image_path)
-                    
-                    
-                else:
-                    images = response.get("images")
-                    for i, item in enumerate(images):
-                        base64_bytes = item.encode('ascii')
-                        image_bytes = base64.b64decode(base64_bytes)
-
-                        # Save the generated image to a local file
-                        image_path = os.path.join(f"{assets_dir}/generated_images/", f"generated_image{i}.png")
-                        with open(image_path, "wb") as file:
-                            file.write(image_bytes)
+                fanout = bedrockHelper.build_request_fanout(
+                    prompt, file_paths, profile, mask_prompt, negative_prompt, st.session_state.task_type,
+                    seeds=st.session_state.seed_sweep, cfg_scales=st.session_state.cfg_sweep,
+                )
+                image_count = 0
+                encoder = output_encoder.get_encoder()
+                cols = st.columns(3)
+                # each call's images are shown as soon as that call lands
+                for result in fanout:
+                    if result.error:
+                        st.error(result.error)
+                        continue
+                    try:
+                        images = bedrockHelper.extract_images(st.session_state.model_id, result.response)
+                    except bedrockHelper.ImageError as e:
+                        st.error(e.message)
+                        continue
+                    for image_bytes in images:
+                        # Save the generated image to a local file, encoded and written in the background
+                        image_stem = os.path.join(f"{assets_dir}/generated_images", f"generated_image{image_count}")
+                        encoder.persist(image_bytes, image_stem, [st.session_state.output_format])
+                        if image_count == 0:
+                            # the first image that lands is also kept as the lossless master later pages read;
+                            # non-PNG model output is re-encoded, so it goes through the background encoder too
+                            encoder.persist(image_bytes, os.path.join(f"{assets_dir}/generated_images", "generated_image"), [output_encoder.MASTER_POLICY])
 
                         # Display the generated image in Streamlit
-                        st.image(image_path)
-
-                        finish_reason = response.get("error")
-                        if finish_reason is not None:
-                            raise bedrockHelper.ImageError(f"Image generation error. Error code is {finish_reason}")
-                
-
-
+                        with cols[image_count % 3]:
+                            st.image(image_bytes, caption=f"seed {result.params['seed']}, cfg_scale {result.params['cfg_scale']}")
+                        image_count += 1
+                current_time2 = datetime.datetime.now()
 
                 st.session_state.analysis_time = (
                     current_time2 - current_time1
                 ).total_seconds()
+                st.session_state.fanout_stats = fanout.stats
 
                 st.markdown(
-                    f"Analysis time: {current_time2 - current_time1}",
+                    f"Analysis time: {current_time2 - current_time1} for {image_count} images from {fanout.stats['calls']} calls "
+                    f"(serial time {fanout.stats['serial_seconds']:.1f} s)",
                     unsafe_allow_html=True,
                 )
-                # st.session_state.input_tokens = response["usage"]["input_tokens"]
-                # st.session_state.output_tokens = response["usage"]["output_tokens"]
 
     with st.sidebar:
         st.markdown("### Inference Parameters")
@@ -295,11 +288,42 @@ def main(profile):
         )
 
         st.session_state.num_images = st.slider(
-            "num_images", min_value=1, max_value=4, value=3, step=1
+            "num_images", min_value=1, max_value=16, value=3, step=1
         )
 
+        st.session_state.seed_sweep = image_fanout.parse_sweep(st.text_input(
+            "seed_sweep", value="", help="Optional comma separated seeds, one parallel call per seed"
+        ), int)
+
+        st.session_state.cfg_sweep = image_fanout.parse_sweep(st.text_input(
+            "cfg_sweep", value="", help="Optional comma separated cfg_scale values, combined with seed_sweep as a grid"
+        ), float)
+
+        st.session_state.use_response_cache = st.checkbox(
+            "use_response_cache", value=False,
+            help="Replay identical seeded requests from the local response cache instead of calling Bedrock again",
+        )
+
+        st.session_state.bypass_response_cache = st.checkbox(
+            "bypass_response_cache", value=False,
+            help="Always call Bedrock and overwrite the cached response",
+        )
+
+        st.session_state.output_format = st.selectbox(
+            "output_format", options=list(output_encoder.POLICIES),
+            index=list(output_encoder.POLICIES).index(output_encoder.DEFAULT_POLICY),
+            help="Format for the saved variants; the first image is also kept as a lossless PNG master",
+        )
+
+        if st.button("Invalidate response cache"):
+            response_cache.get_cache().invalidate()
+            st.toast("Response cache cleared")
+
         st.markdown("---")
 
+        scheduler_stats = bedrock_scheduler.get_scheduler().stats().get(st.session_state.model_id, {})
+        encoder_stats = output_encoder.get_encoder().stats()
+
         st.text(f"""• model_id: {st.session_state.model_id}
 
 • style_preset: {st.session_state.style_preset}
@@ -334,8 +358,15 @@ Use a lower number to increase randomness in the generation.
 • num_images: {st.session_state.num_images}
 ⎯
 • uploaded_media_type: {st.session_state.media_type}
+• upload_decode_sec: {st.session_state.get("ingest_stats", {}).get("decode_seconds", 0):.3f}
+• upload_peak_decoded_mb: {st.session_state.get("ingest_stats", {}).get("peak_decoded_bytes", 0) / 2**20:.1f}
 ⎯
 • analysis_time_sec: {st.session_state.analysis_time}
+• scheduler_queue_depth: {scheduler_stats.get("queue_depth", 0)}
+• scheduler_max_wait_sec: {scheduler_stats.get("max_wait_seconds", 0):.2f}
+• scheduler_throttled: {scheduler_stats.get("throttled", 0)}
+• output_written_mb: {sum(v["bytes"] for k, v in encoder_stats.items() if k != "pending") / 2**20:.1f}
+• output_encode_pending: {encoder_stats["pending"]}
 • input_tokens: {st.session_state.input_tokens}
 • output_tokens: {st.session_state.output_tokens}
 """)
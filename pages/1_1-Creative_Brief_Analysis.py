@@ -12,10 +12,9 @@ from io import StringIO
 import os
 import fitz
 import streamlit as st
-from PIL import Image
 from tempfile import NamedTemporaryFile
 from argparse import ArgumentParser
-from src.utils import bedrockHelper, utils
+from src.utils import bedrockHelper, utils, image_helper, prompts, step_memo
 import json
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -39,6 +38,12 @@ def main(profile):
     if "analysis_time" not in st.session_state:
         st.session_state["analysis_time"] = 0
 
+    if "time_to_first_token" not in st.session_state:
+        st.session_state["time_to_first_token"] = 0
+
+    if "tokens_per_second" not in st.session_state:
+        st.session_state["tokens_per_second"] = 0
+
     if "input_tokens" not in st.session_state:
         st.session_state["input_tokens"] = 0
 
@@ -91,47 +96,7 @@ def main(profile):
             """Describe the analysis task you wish to perform and optionally upload the content to be analyzed. 
 Generative AI analysis powered by Amazon Bedrock and Anthropic Claude 3 family of foundation models."""
         )
-        default_prompt = '''You are a Creative Director for a leading advertising agency. 
-Based on the following Creative Brief, analyze and identify the key attributes of the campaign - brand, product, audience. 
-Develop three compelling online digital advertisements based on the analyzed information. 
-In your response, include a unique ad ID (UUID), brand, product, audience, headline, ad copy, call to action, and description of imagery for each. 
-The ad copy should be 20 words or less.
-Format the response as a series of JSON objects according to the template below. Return only the json
-{
-    "advertisements": [
-        {
-            "id": "",
-            "brand": "",
-            "product": "",
-            "audience": "",
-            "image_description": ""
-            "headline": "",
-            "ad_copy": "",
-            "call_to_action": ""
-        },
-        {
-            "id": "",
-            "brand": "",
-            "product": "",
-            "audience": "",
-            "image_description": ""
-            "headline": "",
-            "ad_copy": "",
-            "call_to_action": ""
-        },
-        {
-            "id": "",
-            "brand": "",
-            "product": "",
-            "audience": "",
-            "image_description": ""
-            "headline": "",
-            "ad_copy": "",
-            "call_to_action": ""
-        }
-    ]
-}
-Important: if no media brief is provided, do not produce the analysis.'''
+        default_prompt = prompts.CREATIVE_BRIEF_PROMPT
         prompt = st.text_area(label="User Prompt:", value=default_prompt, height=268)
 
         uploaded_files = st.file_uploader(
@@ -167,9 +132,14 @@ Important: if no media brief is provided, do not produce the analysis.'''
                             text += page.get_text()
                         prompt = f"{prompt}\n\n{text}"
                 else:  # image media-type
-                    image = Image.open(uploaded_file)
                     file_path = f"{assets_dir}/_temp_images/{uploaded_file.name}"
-                    image.save(file_path)
+                    try:
+                        st.session_state.ingest_stats = image_helper.ingest_image(
+                            uploaded_file, file_path, bedrockHelper.get_max_img_size(st.session_state.model_id)
+                        )
+                    except image_helper.ImageBudgetError as e:
+                        st.error(e.message)
+                        continue
                     file_paths.append(
                         {
                             "file_path": file_path,
@@ -197,10 +167,19 @@ Important: if no media brief is provided, do not produce the analysis.'''
 
             with st.spinner(text="Analyzing..."):
                 current_time1 = datetime.datetime.now()
-                response,error = bedrockHelper.build_request(prompt, file_paths, profile)
+                stream, error = bedrockHelper.build_request_stream(prompt, file_paths, profile, step="creative_brief_analysis")
+                response = None
+                analysis_area = st.empty()
+                if stream:
+                    # show tokens as they arrive, then swap in the full text area
+                    with analysis_area.container():
+                        st.write_stream(stream)
+                    response, error = stream.response, stream.error
+                    st.session_state.time_to_first_token = stream.time_to_first_token
+                    st.session_state.tokens_per_second = stream.tokens_per_second
                 current_time2 = datetime.datetime.now()
                 if response:
-                    st.text_area(
+                    analysis_area.text_area(
                         label="Analysis:",
                         value=response["content"][0]["text"],
                         height=800,
@@ -216,8 +195,8 @@ Important: if no media brief is provided, do not produce the analysis.'''
                             img_analysis = json.loads(img_analysis)
                         logger.info("Extraced json")
                     # logger.info(img_analysis)
-                    utils.pickle_dump(img_analysis, "creative_brief_analysis.pkl")
-                    logger.info("Pickled json")
+                    utils.artifact_dump(img_analysis, "creative_brief_analysis.pkl")
+                    logger.info("Stored artifact")
                     st.session_state.analysis_time = (
                         current_time2 - current_time1
                     ).total_seconds()
@@ -256,6 +235,13 @@ Important: if no media brief is provided, do not produce the analysis.'''
             "top_k", min_value=0, max_value=680, value=268, step=1
         )
 
+        st.session_state.reuse_cached_steps = st.checkbox(
+            "reuse_cached_steps", value=True,
+            help="Reuse the previous response when the prompt, model, parameters and inputs are unchanged",
+        )
+
+        step_stats = step_memo.get_memo().stats("creative_brief_analysis")
+
         st.markdown("---")
 
         st.text(
@@ -266,8 +252,13 @@ Important: if no media brief is provided, do not produce the analysis.'''
 • top_k: {st.session_state.top_k}
 ⎯
 • uploaded_media_type: {st.session_state.media_type}
+• upload_decode_sec: {st.session_state.get("ingest_stats", {}).get("decode_seconds", 0):.3f}
+• upload_peak_decoded_mb: {st.session_state.get("ingest_stats", {}).get("peak_decoded_bytes", 0) / 2**20:.1f}
 ⎯
 • analysis_time_sec: {st.session_state.analysis_time}
+• step_cache_hits: {step_stats["hits"]}/{step_stats["hits"] + step_stats["misses"]}
+• time_to_first_token_sec: {st.session_state.time_to_first_token}
+• tokens_per_second: {st.session_state.tokens_per_second}
 • input_tokens: {st.session_state.input_tokens}
 • output_tokens: {st.session_state.output_tokens}
 """
@@ -12,10 +12,9 @@ from io import StringIO
 import os
 import fitz
 import streamlit as st
-from PIL import Image
 from tempfile import NamedTemporaryFile
 from argparse import ArgumentParser
-from src.utils import bedrockHelper, utils
+from src.utils import bedrockHelper, utils, image_helper, prompts, step_memo
 import json
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -67,10 +66,9 @@ def main(profile):
         st.markdown(
             "Describe the analysis task you wish to perform and optionally upload the content to be analyzed. Generative AI analysis powered by Amazon Bedrock and Anthropic Claude 3 family of foundation models."
         )
-        img_analysis = utils.pickle_load("creative_brief_analysis.pkl")
+        img_analysis = utils.artifact_load("creative_brief_analysis.pkl")
         # logger.info(img_analysis)
-        default_prompt = f'''You are a talented Graphic Designer for a leading advertising agency. Based on the following headline, ad copy, call to action, and description of imagery, describe the design for a compelling online digital advertisement. The advertisement should be designed in a tall, portrait format, with a width of 300 pixels and a height of 600 pixels. The Creative Brief is included for reference.
-{img_analysis["advertisements"][0]}'''
+        default_prompt = prompts.design_description_prompt(img_analysis["advertisements"][0])
         prompt = st.text_area(label="User Prompt:", value=default_prompt, height=268)
 
         uploaded_files = st.file_uploader(
@@ -106,9 +104,14 @@ def main(profile):
                             text += page.get_text()
                         prompt = f"{prompt}\n\n{text}"
                 else:  # image media-type
-                    image = Image.open(uploaded_file)
                     file_path = f"{assets_dir}/_temp_images/{uploaded_file.name}"
-                    image.save(file_path)
+                    try:
+                        st.session_state.ingest_stats = image_helper.ingest_image(
+                            uploaded_file, file_path, bedrockHelper.get_max_img_size(st.session_state.model_id)
+                        )
+                    except image_helper.ImageBudgetError as e:
+                        st.error(e.message)
+                        continue
                     file_paths.append(
                         {
                             "file_path": file_path,
@@ -136,7 +139,7 @@ def main(profile):
 
             with st.spinner(text="Analyzing..."):
                 current_time1 = datetime.datetime.now()
-                response,error = bedrockHelper.build_request(prompt, file_paths, profile)
+                response,error = bedrockHelper.build_request(prompt, file_paths, profile, step="design_description")
                 current_time2 = datetime.datetime.now()
                 if response:
                     st.text_area(
@@ -148,8 +151,8 @@ def main(profile):
                         current_time2 - current_time1
                     ).total_seconds()
                     des_desc = response["content"][0]["text"]
-                    utils.pickle_dump(des_desc, "temp/design_description.pkl")
-                    logger.info("Pickled json")
+                    utils.artifact_dump(des_desc, "design_description.pkl")
+                    logger.info("Stored artifact")
                     st.session_state.input_tokens = response["usage"]["input_tokens"]
                     st.session_state.output_tokens = response["usage"]["output_tokens"]
                 else:
@@ -185,6 +188,13 @@ def main(profile):
             "top_k", min_value=0, max_value=680, value=268, step=1
         )
 
+        st.session_state.reuse_cached_steps = st.checkbox(
+            "reuse_cached_steps", value=True,
+            help="Reuse the previous response when the prompt, model, parameters and inputs are unchanged",
+        )
+
+        step_stats = step_memo.get_memo().stats("design_description")
+
         st.markdown("---")
 
         st.text(
@@ -195,8 +205,11 @@ def main(profile):
 • top_k: {st.session_state.top_k}
 ⎯
 • uploaded_media_type: {st.session_state.media_type}
+• upload_decode_sec: {st.session_state.get("ingest_stats", {}).get("decode_seconds", 0):.3f}
+• upload_peak_decoded_mb: {st.session_state.get("ingest_stats", {}).get("peak_decoded_bytes", 0) / 2**20:.1f}
 ⎯
 • analysis_time_sec: {st.session_state.analysis_time}
+• step_cache_hits: {step_stats["hits"]}/{step_stats["hits"] + step_stats["misses"]}
 • input_tokens: {st.session_state.input_tokens}
 • output_tokens: {st.session_state.output_tokens}
 """
@@ -15,7 +15,7 @@ import streamlit as st
 from PIL import Image
 from tempfile import NamedTemporaryFile
 from argparse import ArgumentParser
-from src.utils import bedrockHelper, utils
+from src.utils import bedrockHelper, utils, image_helper
 import json
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -40,6 +40,12 @@ def main(profile):
     if "analysis_time" not in st.session_state:
         st.session_state["analysis_time"] = 0
 
+    if "time_to_first_token" not in st.session_state:
+        st.session_state["time_to_first_token"] = 0
+
+    if "tokens_per_second" not in st.session_state:
+        st.session_state["tokens_per_second"] = 0
+
     if "input_tokens" not in st.session_state:
         st.session_state["input_tokens"] = 0
 
@@ -184,9 +190,14 @@ Important: if no image is provided, do not produce the analysis.'''
                             text += page.get_text()
                         prompt = f"{prompt}\n\n{text}"
                 else:  # image media-type
-                    image = Image.open(uploaded_file)
                     file_path = f"{assets_dir}/_temp_images/{uploaded_file.name}"
-                    image.save(file_path)
+                    try:
+                        st.session_state.ingest_stats = image_helper.ingest_image(
+                            uploaded_file, file_path, bedrockHelper.get_max_img_size(st.session_state.model_id)
+                        )
+                    except image_helper.ImageBudgetError as e:
+                        st.error(e.message)
+                        continue
                     file_paths.append(
                         {
                             "file_path": file_path,
@@ -214,10 +225,19 @@ Important: if no image is provided, do not produce the analysis.'''
 
             with st.spinner(text="Analyzing..."):
                 current_time1 = datetime.datetime.now()
-                response, error = bedrockHelper.build_request(prompt, file_paths, profile)
+                stream, error = bedrockHelper.build_request_stream(prompt, file_paths, profile)
+                response = None
+                analysis_area = st.empty()
+                if stream:
+                    # show tokens as they arrive, then swap in the full text area
+                    with analysis_area.container():
+                        st.write_stream(stream)
+                    response, error = stream.response, stream.error
+                    st.session_state.time_to_first_token = stream.time_to_first_token
+                    st.session_state.tokens_per_second = stream.tokens_per_second
                 current_time2 = datetime.datetime.now()
                 if response:
-                    st.text_area(
+                    analysis_area.text_area(
                         label="Analysis:",
                         value=response["content"][0]["text"],
                         height=800,
@@ -233,8 +253,8 @@ Important: if no image is provided, do not produce the analysis.'''
                             img_analysis = json.loads(img_analysis)
                         logger.info("Extraced json")
                     # logger.info(img_analysis)
-                    utils.pickle_dump(img_analysis, "img_analysis.pkl")
-                    logger.info("Pickled json")
+                    utils.artifact_dump(img_analysis, "img_analysis.pkl")
+                    logger.info("Stored artifact")
                     st.session_state.analysis_time = (
                         current_time2 - current_time1
                     ).total_seconds()
@@ -283,8 +303,12 @@ Important: if no image is provided, do not produce the analysis.'''
 • top_k: {st.session_state.top_k}
 ⎯
 • uploaded_media_type: {st.session_state.media_type}
+• upload_decode_sec: {st.session_state.get("ingest_stats", {}).get("decode_seconds", 0):.3f}
+• upload_peak_decoded_mb: {st.session_state.get("ingest_stats", {}).get("peak_decoded_bytes", 0) / 2**20:.1f}
 ⎯
 • analysis_time_sec: {st.session_state.analysis_time}
+• time_to_first_token_sec: {st.session_state.time_to_first_token}
+• tokens_per_second: {st.session_state.tokens_per_second}
 • input_tokens: {st.session_state.input_tokens}
 • output_tokens: {st.session_state.output_tokens}
 """
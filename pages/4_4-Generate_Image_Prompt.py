@@ -12,10 +12,9 @@ from io import StringIO
 import os
 import fitz
 import streamlit as st
-from PIL import Image
 from tempfile import NamedTemporaryFile
 from argparse import ArgumentParser
-from src.utils import bedrockHelper, utils
+from src.utils import bedrockHelper, utils, image_helper, prompts, step_memo
 import json
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -38,6 +37,12 @@ def main(profile):
     if "analysis_time" not in st.session_state:
         st.session_state["analysis_time"] = 0
 
+    if "time_to_first_token" not in st.session_state:
+        st.session_state["time_to_first_token"] = 0
+
+    if "tokens_per_second" not in st.session_state:
+        st.session_state["tokens_per_second"] = 0
+
     if "input_tokens" not in st.session_state:
         st.session_state["input_tokens"] = 0
 
@@ -71,12 +76,8 @@ Generative AI analysis powered by Amazon Bedrock and Anthropic Claude 3 family o
 # Avoid brand logo boxes, text overlays and humans in the image.
 # Prompt should be less than 512 charecters
 # Creative Brief : {img_analysis["advertisements"][0]}'''
-        img_analysis = utils.pickle_load("design_description.pkl")
-        default_prompt = f'''You are an expert at optimizing generating large language model prompts for advertising image generation.
-Help the marketing analyst create a concise and effective positive prompt that will provide effective responses from a large language model using the accompanying advertising creative design description.
-Avoid brand logo boxes, text overlays in the image. Return the response in json format "prompt": "","mask_prompt": "","negative_prompt": ""
-Main Prompt should be less than 512 characters. Return only the json object.
-Creative Design description : {img_analysis}'''
+        img_analysis = utils.artifact_load("design_description.pkl")
+        default_prompt = prompts.image_prompt_prompt(img_analysis)
         prompt = st.text_area(label="User Prompt:", value=default_prompt, height=268)
 
         uploaded_files = st.file_uploader(
@@ -112,9 +113,14 @@ Creative Design description : {img_analysis}'''
                             text += page.get_text()
                         prompt = f"{prompt}\n\n{text}"
                 else:  # image media-type
-                    image = Image.open(uploaded_file)
                     file_path = f"{assets_dir}/_temp_images/{uploaded_file.name}"
-                    image.save(file_path)
+                    try:
+                        st.session_state.ingest_stats = image_helper.ingest_image(
+                            uploaded_file, file_path, bedrockHelper.get_max_img_size(st.session_state.model_id)
+                        )
+                    except image_helper.ImageBudgetError as e:
+                        st.error(e.message)
+                        continue
                     file_paths.append(
                         {
                             "file_path": file_path,
@@ -142,18 +148,27 @@ Creative Design description : {img_analysis}'''
 
             with st.spinner(text="Analyzing..."):
                 current_time1 = datetime.datetime.now()
-                response,error = bedrockHelper.build_request(prompt, file_paths, profile)
+                stream, error = bedrockHelper.build_request_stream(prompt, file_paths, profile, step="image_prompt")
+                response = None
+                analysis_area = st.empty()
+                if stream:
+                    # show tokens as they arrive, then swap in the full text area
+                    with analysis_area.container():
+                        st.write_stream(stream)
+                    response, error = stream.response, stream.error
+                    st.session_state.time_to_first_token = stream.time_to_first_token
+                    st.session_state.tokens_per_second = stream.tokens_per_second
                 current_time2 = datetime.datetime.now()
                 if response:
-                    st.text_area(
+                    analysis_area.text_area(
                         label="Analysis:",
                         value=response["content"][0]["text"],
                         height=800,
                     )
                     img_prompt = response["content"][0]["text"]
                     # logger.info(img_prompt)
-                    utils.pickle_dump(img_prompt, "img_prompt.pkl")
-                    logger.info("Pickled json")
+                    utils.artifact_dump(img_prompt, "img_prompt.pkl")
+                    logger.info("Stored artifact")
                     st.session_state.analysis_time = (
                         current_time2 - current_time1
                     ).total_seconds()
@@ -192,6 +207,13 @@ Creative Design description : {img_analysis}'''
             "top_k", min_value=0, max_value=680, value=268, step=1
         )
 
+        st.session_state.reuse_cached_steps = st.checkbox(
+            "reuse_cached_steps", value=True,
+            help="Reuse the previous response when the prompt, model, parameters and inputs are unchanged",
+        )
+
+        step_stats = step_memo.get_memo().stats("image_prompt")
+
         st.markdown("---")
 
         st.text(
@@ -202,8 +224,13 @@ Creative Design description : {img_analysis}'''
 • top_k: {st.session_state.top_k}
 ⎯
 • uploaded_media_type: {st.session_state.media_type}
+• upload_decode_sec: {st.session_state.get("ingest_stats", {}).get("decode_seconds", 0):.3f}
+• upload_peak_decoded_mb: {st.session_state.get("ingest_stats", {}).get("peak_decoded_bytes", 0) / 2**20:.1f}
 ⎯
 • analysis_time_sec: {st.session_state.analysis_time}
+• step_cache_hits: {step_stats["hits"]}/{step_stats["hits"] + step_stats["misses"]}
+• time_to_first_token_sec: {st.session_state.time_to_first_token}
+• tokens_per_second: {st.session_state.tokens_per_second}
 • input_tokens: {st.session_state.input_tokens}
 • output_tokens: {st.session_state.output_tokens}
 """
@@ -9,9 +9,11 @@ Shows how to run a multimodal prompt with Anthropic Claude (on demand) and Invok
 import datetime
 import logging
 import os
+import shutil
+import uuid
 import streamlit as st
 from argparse import ArgumentParser
-from src.utils import utils, generateAd
+from src.utils import utils, generateAd, step_memo, contact_sheet, output_encoder
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 assets_dir = "assets"
@@ -59,6 +61,9 @@ def main(profile):
     if "media_type" not in st.session_state:
         st.session_state["media_type"] = "image/png"
 
+    if "ad_formats_dir" not in st.session_state:
+        st.session_state["ad_formats_dir"] = f"{os.getcwd()}/temp/ad_formats/{uuid.uuid4().hex}"
+
     st.markdown("## Generative AI-powered Image Generation")
 
     with st.form("ad_analyze_form", border=True, clear_on_submit=False):
@@ -66,8 +71,10 @@ def main(profile):
             "This step uses a python program to process the below image to generate a digital ad copy"
         )
         image_path = os.path.join(f"{assets_dir}/generated_images/", "generated_image_frm_seed.png")
+        # page 5 writes the master in the background; wait for it before reading
+        output_encoder.get_encoder().flush()
         st.image(image_path)
-        img_analysis = utils.pickle_load("creative_brief_analysis.pkl")
+        img_analysis = utils.artifact_load("creative_brief_analysis.pkl")
         headline = st.text_area(label="Headline:", value=img_analysis["advertisements"][0]["headline"], height=68)
         ad_copy = st.text_area(label="Ad copy text:", value=img_analysis["advertisements"][0]["ad_copy"], height=68)
         cta = st.text_area(label="Call to action:", value=img_analysis["advertisements"][0]["call_to_action"], height=68)
@@ -79,14 +86,43 @@ def main(profile):
 
             with st.spinner(text="Analyzing..."):
                 current_time1 = datetime.datetime.now()
-                generateAd.generate_ad_image(headline, ad_copy, cta, image_path, brand)
+                memo = step_memo.get_memo()
+                output_format = st.session_state.get("output_format", output_encoder.DEFAULT_POLICY)
+                fp = step_memo.fingerprint(
+                    "ad_composition",
+                    params={"headline": headline, "ad_copy": ad_copy, "cta": cta, "brand": brand, "output_format": output_format},
+                    upstream={"image": image_path},
+                )
+                cached = None
+                if st.session_state.get("reuse_cached_steps", True):
+                    cached = memo.get("ad_composition", fp, f"{assets_dir}/generated_ads")
+                if cached is None:
+                    ad_image_path = generateAd.generate_ad_image(headline, ad_copy, cta, image_path, brand, policy=output_format)
+                    memo.put("ad_composition", fp, {"ad": ad_image_path}, (datetime.datetime.now() - current_time1).total_seconds())
+                else:
+                    ad_image_path = cached["ad"]
                 current_time2 = datetime.datetime.now()
 
-                ad_image_path = os.path.join(f"{assets_dir}/generated_ads/", "generated_ad.png")
-
                 # Display the generated image in Streamlit
                 st.image(ad_image_path)
 
+                ad_formats = st.session_state.get("ad_formats", [])
+                if ad_formats:
+                    # one folder per session under temp/, replaced on every submit
+                    formats_dir = st.session_state.ad_formats_dir
+                    shutil.rmtree(formats_dir, ignore_errors=True)
+                    format_paths = generateAd.generate_ad_formats(
+                        headline, ad_copy, cta, image_path, brand,
+                        formats={name: generateAd.AD_FORMATS[name] for name in ad_formats},
+                        output_dir=formats_dir,
+                        policy=output_format,
+                    )
+                    # one downscaled review sheet instead of every size at full resolution
+                    for sheet in contact_sheet.build_contact_sheets(
+                        list(format_paths.values()), formats_dir, columns=len(format_paths), rows=1
+                    ):
+                        st.image(sheet, caption=", ".join(format_paths))
+
                 st.session_state.analysis_time = (
                     current_time2 - current_time1
                 ).total_seconds()
@@ -145,6 +181,18 @@ def main(profile):
             "steps", min_value=0, max_value=168, value=30, step=1
         )
 
+        st.session_state.reuse_cached_steps = st.checkbox(
+            "reuse_cached_steps", value=True,
+            help="Reuse the previous ad when the copy and the image are unchanged",
+        )
+
+        st.session_state.ad_formats = st.multiselect(
+            "ad_formats", options=list(generateAd.AD_FORMATS), default=[],
+            help="Also render the ad in these sizes from the same layout pass",
+        )
+
+        step_stats = step_memo.get_memo().stats("ad_composition")
+
         st.markdown("---")
 
         st.text(
@@ -157,6 +205,7 @@ def main(profile):
 • uploaded_media_type: {st.session_state.media_type}
 ⎯
 • analysis_time_sec: {st.session_state.analysis_time}
+• step_cache_hits: {step_stats["hits"]}/{step_stats["hits"] + step_stats["misses"]}
 • input_tokens: {st.session_state.input_tokens}
 • output_tokens: {st.session_state.output_tokens}
 """
@@ -12,77 +12,31 @@ import os
 import fitz
 import streamlit as st
 from argparse import ArgumentParser
-from src.utils import bedrockHelper, utils
-import faker
+from src.utils import bedrockHelper, utils, item_catalog, item_index, prompts, semantic_index, user_profiles
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 assets_dir = "assets"
-import pandas as pd
-movie_data = pd.read_csv(assets_dir + '/movie_items.csv', sep=',', dtype={'PROMOTION': "string"})
-retail_data = pd.read_csv(assets_dir + '/adidas_items.csv', sep=',', dtype={'PROMOTION': "string"})
-travel_data = pd.read_csv(assets_dir + '/travel_items.csv', sep=',', dtype={'PROMOTION': "string"})
+# catalogs are converted to Parquet once and kept process-wide, see item_catalog
 # retail_data.head(5)
 # item_data.head(5)
 # return recommended items
 
 
-def get_user_profile():
-    fake = faker.Faker()
-    cat_map = ({'domain': 'movie', 'category': 'Drama'},
-        {'domain': 'movie', 'category': 'Action'},
-        {'domain': 'movie', 'category': 'Adventure'},
-        {'domain': 'movie', 'category': 'Comedy'},
-        {'domain': 'movie', 'category': 'Sci-Fi'},
-        {'domain': 'retail', 'category': 'Kids/Accessories'},
-        {'domain': 'retail', 'category': 'Kids/Clothing'},
-        {'domain': 'retail', 'category': 'Kids/Shoes'},
-        {'domain': 'retail', 'category': 'Men/Accessories'},
-        {'domain': 'retail', 'category': 'Men/Clothing'},
-        {'domain': 'retail', 'category': 'Men/Shoes'},
-        {'domain': 'retail', 'category': 'Running/Accessories'},
-        {'domain': 'retail', 'category': 'Running/Shoes'},
-        {'domain': 'retail', 'category': 'Soccer/Accessories'},
-        {'domain': 'retail', 'category': 'Soccer/Shoes'},
-        {'domain': 'retail', 'category': 'Women/Accessories'},
-        {'domain': 'retail', 'category': 'Women/Clothing'},
-        {'domain': 'retail', 'category': 'Women/Shoes'},
-        {'domain': 'travel', 'category': 'Beijing'},
-        {'domain': 'travel', 'category': 'Guangzhou'},
-        {'domain': 'travel', 'category': 'Hong Kong'},
-        {'domain': 'travel', 'category': 'London'},
-        {'domain': 'travel', 'category': 'New York'},
-        {'domain': 'travel', 'category': 'Seoul'},
-        {'domain': 'travel', 'category': 'Shanghai'},
-        {'domain': 'travel', 'category': 'Sydney'},
-        {'domain': 'travel', 'category': 'Tokyo'})
-    languages = ('American English', 'Common Wealth English', 'Spanish', 'French', 'German', 'Italian', 'Portuguese', 'Dutch', 
-                 'Russian', 'Chinese', 'Japanese', 'Korean', 'Arabic', 'Hindi')
-    user_profile = {
-        "user_id": fake.random_int(min=1, max=999),
-        "name": fake.name(),
-        # "age": fake.random_int(min=18, max=75),
-        "fav_category": fake.random_element(elements=cat_map),
-        "language": fake.random_element(elements=languages),
-        }
-    # load to a pandas data frame
-    user_df = pd.json_normalize(user_profile)
-    return user_df
-
 def get_top_items(type, category, n=3):
     print(f"Getting top {n} items for {category} in {type}")
-    if type == 'movie':
-        data = movie_data[movie_data['GENRES'].str.contains(category)].sort_values(by='IMDB_RATING', ascending=False).head(3)
-        data = data.rename(columns={'TITLE': 'name'})
-        data = data.rename(columns={'PLOT': 'description'})
-        return data[['name', 'description']]
-    elif type == 'retail':
-        data = retail_data[retail_data['breadcrumbs'].str.contains(category)].sort_values(by='average_rating', ascending=False).head(3)
-        return data[['name', 'description']]
-    elif type == 'travel':
-        data = travel_data[travel_data['DST_CITY'].str.contains(category)].sort_values(by='NUMBER_OF_SEARCH_BY_USER', ascending=False).head(3)
-        data['description'] = data.apply(lambda row: 'Travel from ' + str(row['SRC_CITY']) + ' on ' + str(row['AIRLINE'] + ' for a ' + str(row['DURATION_DAYS']) + ' days trip in ' + str(row['MONTH']) + ' - $' + str(row['DYNAMIC_PRICE'])), axis=1)
-        data = data.rename(columns={'DST_CITY': 'name'})
-        return data[['name', 'description']]
+    # precomputed per-category top-k lists, see item_index
+    return item_index.get_top_items(type, category, n)
+
+
+def get_interest_items(type, interests, profile, n=3):
+    print(f"Getting top {n} items for '{interests}' in {type}")
+    # embedding search over item names and descriptions, see semantic_index; None until the index is built
+    embedder = semantic_index.get_embedder(profile=profile)
+    items = semantic_index.get_semantic_items(type, interests, n, embedder, build=False)
+    if items is None:
+        semantic_index.build_index_async(type, embedder)
+        return None
+    return items[["name", "description"]]
 
 def main(profile):
     """
@@ -100,6 +54,12 @@ def main(profile):
     if "analysis_time" not in st.session_state:
         st.session_state["analysis_time"] = 0
 
+    if "time_to_first_token" not in st.session_state:
+        st.session_state["time_to_first_token"] = 0
+
+    if "tokens_per_second" not in st.session_state:
+        st.session_state["tokens_per_second"] = 0
+
     if "input_tokens" not in st.session_state:
         st.session_state["input_tokens"] = 0
 
@@ -139,6 +99,9 @@ def main(profile):
     if "style_preset" not in st.session_state:
         st.session_state["style_preset"] = "photographic"
 
+    if "interests" not in st.session_state:
+        st.session_state["interests"] = ""
+
     st.header("AWS Agentic AI Demo powered by Amazon Bedrock Agents", divider="rainbow")
 
     with st.form("email_prompt", border=True, clear_on_submit=False):
@@ -146,7 +109,7 @@ def main(profile):
             """Generative AI powered by Amazon Bedrock and Anthropic Claude 3 family of foundation models."""
         )
         # display a random user id and their favorite genre on button click
-        user_df = get_user_profile()
+        user_df = user_profiles.get_user_profile()
 
         submitted1 = st.form_submit_button("Click to pick a consumer profile")
 
@@ -162,39 +125,31 @@ def main(profile):
         else:
             st.write("--")
         
+        st.session_state.interests = st.text_input(
+            label="Consumer interests (optional, e.g. cozy winter jacket):", value=st.session_state.interests
+        )
+
         submitted2 = st.form_submit_button("Click to get personalized recommendations")
 
         if submitted2:
             st.write(st.session_state.user_df, unsafe_allow_html=True)
-            top_df = get_top_items(st.session_state.item_domain,st.session_state.fav_category)
+            top_df = None
+            if st.session_state.interests.strip():
+                top_df = get_interest_items(st.session_state.item_domain, st.session_state.interests, profile)
+                if top_df is None:
+                    st.info(f"The {st.session_state.item_domain} semantic index is being built in the background "
+                            "(or run python -m src.utils.semantic_index); showing favorite category items for now.")
+            if top_df is None:
+                top_df = get_top_items(st.session_state.item_domain,st.session_state.fav_category)
             st.session_state.top_df = top_df.to_html(escape=False, index=False)
             st.write(st.session_state.top_df, unsafe_allow_html=True)
         else:
             st.write("--")
 
-        default_prompt = f'''You are a skilled publicist working for a leading consumer brand
-Write a high-converting marketing email advertising several items available, given the item and user information below. 
-Your email will leverage the power of storytelling and persuasive language.
-You want the email to impress the user, so make it appealing to them based on the information contained in the <user> tags,
-and take into account the user\'s preferred category in the <category> tags.
-The items to recommend and their information is contained in the <item> tag.
-All items in the <item> tag must be recommended. Give a summary of the items and why the user should consider them.
-Use the language of the user to write the email.
-Do not include any information that is not explicitly asked for in the prompt.
-Do not include any information not explicitly asked for in the prompt.
-Do not include any information that is not relevant to the email.
-Put the email between <email> tags.'''
-
         submitted3 = st.form_submit_button("Click to generate prompt")
 
         if submitted3:
-            new_prompt = default_prompt \
-            + f"\n<user>{st.session_state.user_df}</user>"\
-            + f"\n<category>{st.session_state.cat_df}</category>"\
-            + f"\n<item>\n{st.session_state.top_df}\n</item>"\
-            + "\n<email>"\
-            + "\n"\
-            + "\n</email>"
+            new_prompt = prompts.email_prompt(st.session_state.user_df, st.session_state.cat_df, st.session_state.top_df)
             prompt = st.text_area(label="User Prompt:", value=new_prompt, height=268)
             st.session_state.prompt = prompt
         else:
@@ -211,10 +166,19 @@ Put the email between <email> tags.'''
             st.markdown("---")
             with st.spinner(text="Analyzing..."):
                 current_time1 = datetime.datetime.now()
-                response,error = bedrockHelper.build_request(f"{st.session_state.prompt}", file_paths, profile)
+                stream, error = bedrockHelper.build_request_stream(f"{st.session_state.prompt}", file_paths, profile)
+                response = None
+                analysis_area = st.empty()
+                if stream:
+                    # show tokens as they arrive, then swap in the full text area
+                    with analysis_area.container():
+                        st.write_stream(stream)
+                    response, error = stream.response, stream.error
+                    st.session_state.time_to_first_token = stream.time_to_first_token
+                    st.session_state.tokens_per_second = stream.tokens_per_second
                 current_time2 = datetime.datetime.now()
                 if response:
-                    st.text_area(
+                    analysis_area.text_area(
                         label="Analysis:",
                         value=response["content"][0]["text"],
                         height=800,
@@ -257,6 +221,8 @@ Put the email between <email> tags.'''
             "top_k", min_value=0, max_value=680, value=268, step=1
         )
 
+        catalog_stats = item_catalog.get_catalogs().stats()
+
         st.markdown("---")
 
         st.text(
@@ -267,8 +233,13 @@ Put the email between <email> tags.'''
 • top_k: {st.session_state.top_k}
 ⎯
 • uploaded_media_type: {st.session_state.media_type}
+• catalog_hits: {catalog_stats["hits"]}
+• catalog_loads: {catalog_stats["loads"]} ({catalog_stats["load_seconds"]:.3f} s)
+• interests: {st.session_state.interests or "-"}
 ⎯
 • analysis_time_sec: {st.session_state.analysis_time}
+• time_to_first_token_sec: {st.session_state.time_to_first_token}
+• tokens_per_second: {st.session_state.tokens_per_second}
 • input_tokens: {st.session_state.input_tokens}
 • output_tokens: {st.session_state.output_tokens}
 """
@@ -12,7 +12,7 @@ import os
 import streamlit as st
 from PIL import Image
 from argparse import ArgumentParser
-from src.utils import sagemakerHelper, utils
+from src.utils import sagemakerHelper, utils, image_helper
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 assets_dir = "assets"
@@ -125,9 +125,12 @@ def main(profile):
                     uploaded_file.size,
                 )
                 st.session_state.media_type = uploaded_file.type.split("/")[1].upper()
-                image = Image.open(uploaded_file)
                 file_path = f"{assets_dir}/_temp_images/{uploaded_file.name}"
-                image.save(file_path)
+                try:
+                    st.session_state.ingest_stats = image_helper.ingest_image(uploaded_file, file_path)
+                except image_helper.ImageBudgetError as e:
+                    st.error(e.message)
+                    continue
                 file_paths.append(
                     {
                         "file_path": file_path,
@@ -173,9 +176,9 @@ def main(profile):
                     value=response,
                     height=100,
                 )
-                # pickle results
-                utils.pickle_dump(response, "img_tag.pkl")
-                logger.info("Pickled response")
+                # store results
+                utils.artifact_dump(response, "img_tag.pkl")
+                logger.info("Stored artifact")
 
                 # show latency
                 st.session_state.analysis_time = (
@@ -205,6 +208,8 @@ def main(profile):
 ⎯
 • endpoint_name: {st.session_state.endpoint_name}
 • uploaded_media_type: {st.session_state.media_type}
+• upload_decode_sec: {st.session_state.get("ingest_stats", {}).get("decode_seconds", 0):.3f}
+• upload_peak_decoded_mb: {st.session_state.get("ingest_stats", {}).get("peak_decoded_bytes", 0) / 2**20:.1f}
 ⎯
 • analysis_time_sec: {st.session_state.analysis_time}
 • input_tokens: {st.session_state.input_tokens}
@@ -1,12 +1,11 @@
 import streamlit as st
 import uuid
-import yaml
 import sys
 from pathlib import Path
 import os
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from src.utils.bedrock_agent import agents_helper
+from src.utils import agent_resolution
 from src.ui.config import bot_configs
 from src.ui.ui_utils import invoke_agent
 import logging
@@ -78,20 +77,24 @@ def experimental_interface():
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def initialize_session():
-    """Initialize session state and bot configuration."""
-
-    # Refresh agent IDs and aliases
+def resolve_agents():
+    """Fill in agent IDs and aliases from the process-wide resolution cache."""
+    resolver = agent_resolution.get_resolver()
     for idx, config in enumerate(bot_configs):
         try:
-            agent_id = agents_helper.get_agent_id_by_name(config['agent_name'])
-            agent_alias_id = agents_helper.get_agent_latest_alias_id(agent_id)
+            agent_id, agent_alias_id = resolver.resolve(config['agent_name'])
             bot_configs[idx]['agent_id'] = agent_id
             bot_configs[idx]['agent_alias_id'] = agent_alias_id
-        except Exception as e:
+        except LookupError as e:
             logger.error(f"Could not find agent named:{config['agent_name']}, skipping...")
             continue
 
+def initialize_session():
+    """Initialize session state and bot configuration."""
+
+    # Refresh agent IDs and aliases
+    resolve_agents()
+
     # Get bot configuration
     bot_name = os.environ.get('BOT_NAME', 'Marketing Planning Agent')
     bot_config = next((config for config in bot_configs if config['bot_name'] == bot_name), None)
@@ -114,8 +117,7 @@ def initialize_session():
         # Load tasks if any
         task_yaml_content = {}
         if 'tasks' in bot_config:
-            with open(bot_config['tasks'], 'r') as file:
-                task_yaml_content = yaml.safe_load(file)
+            task_yaml_content = agent_resolution.get_resolver().load_tasks(bot_config['tasks'])
         st.session_state['task_yaml_content'] = task_yaml_content
 
         # Initialize session ID and message history
@@ -154,6 +156,9 @@ def chat_interface():
                 ))
             except Exception as e:
                 logger.error(f"Error: {e}")  # Keep logging for debugging
+                # the agent may have been redeployed; resolve it again on the next message
+                agent_resolution.get_resolver().invalidate(st.session_state['bot_config']['agent_name'])
+                st.session_state['agent_stale'] = True
                 st.error(f"An error occurred: {str(e)}")  # Show error in UI
                 response = "I encountered an error processing your request. Please try again."
 
@@ -168,7 +173,11 @@ def chat_interface():
 
 def main():
     """Main application flow."""
-    initialize_session()
+    # once per session, not on every rerun; agent lookups are cached per process
+    if 'bot_config' not in st.session_state:
+        initialize_session()
+    elif st.session_state.pop('agent_stale', False):
+        resolve_agents()
     """Main UI function"""
     chat_interface()
 
@@ -1,9 +1,9 @@
-import boto3
 import streamlit as st
 import datetime
 import json
 import math
 from src.utils.bedrock_agent import Task
+from src.utils import client_registry
 import os
 import logging
 logger = logging.getLogger(__name__)
@@ -165,9 +165,8 @@ def process_orchestration_trace(event, agentClient, step):
 def invoke_agent(input_text, session_id, task_yaml_content):
     """Main agent invocation and response processing."""
     profile_name = os.getenv('AWS_PROFILE', None)
-    session = boto3.Session(profile_name=profile_name)
-    client = session.client('bedrock-agent-runtime')
-    agentClient = session.client('bedrock-agent')
+    client = client_registry.get_client('bedrock-agent-runtime', profile_name)
+    agentClient = client_registry.get_client('bedrock-agent', profile_name)
     
     # Process tasks if any
     _tasks = []
@@ -0,0 +1,134 @@
+"""
+Process-wide cache of Bedrock agent ID and alias resolution.
+
+Resolving an agent name costs a list_agents call, and finding its latest alias
+costs a list_agent_aliases call plus a get_agent_alias status wait. Results are
+shared by every Streamlit session in the process for AGENT_CACHE_TTL seconds;
+a name that could not be resolved is retried after a shorter NEGATIVE_TTL so a
+newly created agent shows up quickly. Concurrent sessions asking for the same
+name wait for one resolution instead of each making the calls. invalidate()
+drops entries explicitly, e.g. after an agent is redeployed.
+"""
+import logging
+import os
+import threading
+import time
+import yaml
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+AGENT_CACHE_TTL = float(os.environ.get("AGENT_CACHE_TTL", 10 * 60))
+NEGATIVE_TTL = 30.0
+
+
+class AgentResolver:
+    def __init__(self, helper, ttl=AGENT_CACHE_TTL, negative_ttl=NEGATIVE_TTL):
+        """
+        Args:
+            helper (AgentsForAmazonBedrock): Makes the control-plane calls.
+            ttl (float): Seconds a resolved agent is served from memory.
+            negative_ttl (float): Seconds a failed resolution is remembered.
+        """
+        self.helper = helper
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._inflight = {}
+        self._tasks = {}
+        self._stats = {"hits": 0, "misses": 0, "failures": 0, "resolve_seconds": 0.0}
+
+    def _lookup(self, agent_name):
+        start = time.perf_counter()
+        try:
+            agent_id = self.helper.get_agent_id_by_name(agent_name)
+            if agent_id is None:
+                raise LookupError(f"no agent named {agent_name}")
+            value, error = (agent_id, self.helper.get_agent_latest_alias_id(agent_id)), None
+        except Exception as e:
+            value, error = None, e
+        return value, error, time.perf_counter() - start
+
+    def resolve(self, agent_name):
+        """
+        Agent ID and latest alias ID for an agent name.
+        Returns:
+            (agent_id, agent_alias_id)
+        Raises:
+            LookupError: The agent does not exist or could not be resolved; remembered for negative_ttl seconds.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(agent_name)
+                if entry is not None and entry["expires"] > time.monotonic():
+                    self._stats["hits"] += 1
+                    if entry["error"] is not None:
+                        raise LookupError(entry["error"])
+                    return entry["value"]
+                event = self._inflight.get(agent_name)
+                if event is None:
+                    event = threading.Event()
+                    self._inflight[agent_name] = event
+                    self._stats["misses"] += 1
+                    break
+            # another session is resolving this name; its result lands in the cache
+            event.wait()
+
+        value, error, seconds = self._lookup(agent_name)
+        with self._lock:
+            self._stats["resolve_seconds"] += seconds
+            if error is not None:
+                self._stats["failures"] += 1
+                logger.error(f"Could not resolve agent {agent_name}: {error}")
+            self._entries[agent_name] = {
+                "value": value,
+                "error": None if error is None else str(error),
+                "expires": time.monotonic() + (self.ttl if error is None else self.negative_ttl),
+            }
+            del self._inflight[agent_name]
+        event.set()
+        if error is not None:
+            raise LookupError(str(error))
+        logger.info(f"Resolved agent {agent_name} to {value[0]}/{value[1]} in {seconds:.2f} s")
+        return value
+
+    def invalidate(self, agent_name=None):
+        """Forget one agent's resolution, or every cached agent and tasks file when agent_name is None."""
+        with self._lock:
+            if agent_name is None:
+                self._entries.clear()
+                self._tasks.clear()
+            else:
+                self._entries.pop(agent_name, None)
+
+    def load_tasks(self, path):
+        """Parsed tasks YAML, re-read only when the file changes."""
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._tasks.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        with open(path, "r") as file:
+            tasks = yaml.safe_load(file) or {}
+        with self._lock:
+            self._tasks[path] = (mtime, tasks)
+        return tasks
+
+    def stats(self):
+        """Cache hits, resolutions, failures and time spent resolving in this process."""
+        with self._lock:
+            return dict(self._stats, cached=len(self._entries))
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_resolver():
+    """Return the process-wide agent resolver."""
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            from src.utils.bedrock_agent import agents_helper
+            _resolver = AgentResolver(agents_helper)
+    return _resolver
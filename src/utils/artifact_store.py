@@ -0,0 +1,191 @@
+"""
+Per-session store for the artifacts pages hand to each other.
+
+Each artifact is keyed by (session ID, step), e.g. the creative brief analysis
+produced on page 1 and read on pages 2, 6 and 9. Values live in an in-memory
+hot tier so reruns do not touch the disk, and are written through to
+temp/sessions/<session>/<step>.json. Disk entries are loaded lazily on the first
+read after a restart. Sessions that have not written anything fall back to the
+shared seed files in temp/*.pkl so the demo pages still open with content.
+Subscribers are called whenever a step is written.
+"""
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+STORE_DIR = f"{os.getcwd()}/temp/sessions"
+LEGACY_DIR = f"{os.getcwd()}/temp"
+DEFAULT_SESSION = "default"
+MAX_HOT_ENTRIES = 1024
+MAX_SESSION_AGE_SECONDS = 24 * 60 * 60
+
+_MISSING = object()
+
+
+def current_session_id():
+    """Streamlit session ID of the running script, or DEFAULT_SESSION outside a Streamlit run."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except ImportError:
+        ctx = None
+    return ctx.session_id if ctx is not None else DEFAULT_SESSION
+
+
+def step_name(file_name):
+    """Map a legacy pickle file name such as temp/img_prompt.pkl to its step name."""
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+
+class ArtifactStore:
+    def __init__(self, store_dir=STORE_DIR, legacy_dir=LEGACY_DIR, max_hot_entries=MAX_HOT_ENTRIES):
+        self.store_dir = store_dir
+        self.legacy_dir = legacy_dir
+        self.max_hot_entries = max_hot_entries
+        self._hot = OrderedDict()
+        self._versions = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._stats = {"hot_hits": 0, "disk_loads": 0, "legacy_loads": 0, "misses": 0, "writes": 0}
+
+    def _path(self, session_id, step):
+        return os.path.join(self.store_dir, session_id, f"{step}.json")
+
+    def _remember(self, key, value):
+        # caller holds the lock
+        self._hot[key] = value
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.max_hot_entries:
+            self._hot.popitem(last=False)
+
+    def get(self, step, session_id=None, default=_MISSING):
+        """
+        Return the artifact for a step.
+        Args:
+            step (str): Step name, e.g. creative_brief_analysis.
+            session_id (str): Defaults to the current Streamlit session.
+            default: Returned when no artifact exists; without it FileNotFoundError is raised.
+        """
+        session_id = session_id or current_session_id()
+        key = (session_id, step)
+        with self._lock:
+            if key in self._hot:
+                self._hot.move_to_end(key)
+                self._stats["hot_hits"] += 1
+                return self._hot[key]
+        value, source = self._load(session_id, step)
+        with self._lock:
+            if value is _MISSING:
+                self._stats["misses"] += 1
+            else:
+                self._stats[source] += 1
+                # a concurrent put wins over what was just read from disk
+                if key not in self._hot:
+                    self._remember(key, value)
+                value = self._hot[key]
+        if value is _MISSING:
+            if default is _MISSING:
+                raise FileNotFoundError(f"No artifact {step} for session {session_id}")
+            return default
+        return value
+
+    def _load(self, session_id, step):
+        try:
+            with open(self._path(session_id, step), "r") as f:
+                return json.load(f), "disk_loads"
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read artifact {step}: {e}")
+        # seed data shipped with the repo, read once per session and never written back
+        try:
+            with open(os.path.join(self.legacy_dir, f"{step}.pkl"), "rb") as f:
+                return pickle.load(f), "legacy_loads"
+        except FileNotFoundError:
+            return _MISSING, "misses"
+
+    def put(self, step, value, session_id=None):
+        """Store an artifact in the hot tier, write it through to disk and notify subscribers."""
+        session_id = session_id or current_session_id()
+        path = self._path(session_id, step)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp{threading.get_ident()}"
+            with open(tmp_path, "w") as f:
+                json.dump(value, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logger.error(f"Could not write artifact {step}: {e}")
+        with self._lock:
+            self._remember((session_id, step), value)
+            self._versions[(session_id, step)] = self._versions.get((session_id, step), 0) + 1
+            self._stats["writes"] += 1
+            subscribers = list(self._subscribers.get(step, ())) + list(self._subscribers.get(None, ()))
+        for callback in subscribers:
+            try:
+                callback(session_id, step, value)
+            except Exception as e:
+                logger.error(f"Artifact subscriber for {step} failed: {e}")
+
+    def version(self, step, session_id=None):
+        """Number of times the step has been written in this process, 0 if never."""
+        with self._lock:
+            return self._versions.get((session_id or current_session_id(), step), 0)
+
+    def subscribe(self, callback, step=None):
+        """Call callback(session_id, step, value) after every write of step, or of any step when None."""
+        with self._lock:
+            self._subscribers.setdefault(step, []).append(callback)
+
+    def unsubscribe(self, callback, step=None):
+        with self._lock:
+            if callback in self._subscribers.get(step, []):
+                self._subscribers[step].remove(callback)
+
+    def prune(self, max_age=MAX_SESSION_AGE_SECONDS):
+        """Delete session directories that have not been written for max_age seconds."""
+        try:
+            names = os.listdir(self.store_dir)
+        except OSError:
+            return 0
+        now = time.time()
+        removed = 0
+        for name in names:
+            session_dir = os.path.join(self.store_dir, name)
+            try:
+                if now - os.path.getmtime(session_dir) <= max_age:
+                    continue
+                for entry in os.scandir(session_dir):
+                    os.remove(entry.path)
+                os.rmdir(session_dir)
+            except OSError:
+                continue
+            with self._lock:
+                for key in [k for k in self._hot if k[0] == name]:
+                    del self._hot[key]
+            removed += 1
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, hot_entries=len(self._hot))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide artifact store, pruning stale sessions on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+            _store.prune()
+    return _store
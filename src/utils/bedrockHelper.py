@@ -1,12 +1,14 @@
 import base64
+import hashlib
 import json
 import logging
-import boto3
 import streamlit as st
 from botocore.exceptions import ClientError
 from PIL import Image
 import io
 import math
+import time
+from src.utils import bedrock_scheduler, client_registry, image_cache, image_fanout, image_helper, model_catalog, payload_codec, response_cache, step_memo
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 assets_dir = "../../assets"
@@ -17,8 +19,7 @@ class ImageError(Exception):
         self.message = message
 
 def get_available_models(profile="default"):
-    session = boto3.Session(profile_name=profile)
-    client = session.client('bedrock')
+    client = client_registry.get_client('bedrock', profile)
     try:
         models = client.list_foundation_models()
     except ClientError as e:
@@ -27,59 +28,18 @@ def get_available_models(profile="default"):
     return models["modelSummaries"]
 
 def get_filtered_models(profile="default", input_mode= 'TEXT', output_mode='IMAGE'):
-    models = get_available_models(profile)
-    filtered_models = []
-    for model in models:
-        if input_mode in model["inputModalities"] and output_mode in model["outputModalities"]:
-            filtered_models.append(model["modelId"])
-    logger.info(f"Available models: {filtered_models}")
+    # served from the process-wide catalog so sidebar reruns never wait on list_foundation_models
+    filtered_models = model_catalog.get_catalog(profile).get_models(input_mode, output_mode)
+    logger.debug(f"Available models: {filtered_models}")
     return filtered_models
 
+def get_max_img_size(model_id):
+    """Largest edge in the model's supported size table; uploads never need to be decoded above this."""
+    _, sizes = model_catalog.get_supported_sizes(model_id)
+    return max(max(size) for size in sizes)
+
 def get_supported_img_size(inp_width, aspect_ratio, model_id):
-    stability_ratios = (1,1.28, 1.46,1.75,2.4)
-    stability_sizes = (
-        (1024, 1024),
-        (512, 512),
-        (1152, 896),
-        (1216, 832),
-        (1344, 768),
-        (1536, 640)
-    )
-    titan_aspect_ratios = (1,0.666666666666667,1.5,0.6,1.666666666666667,0.777777777777778,
-        1.28571428571429,0.545454545454545,1.83333333333333,0.454545454545455,2.2,1.8,1.8328125)
-    titan_sizes = (
-        (1024,1024),
-        (768,768),
-        (512,512),
-        (768,1152),
-        (384,576),
-        (1152,768),
-        (576,384),
-        (768,1280),
-        (384,640),
-        (1280,768),
-        (640,384),
-        (896,1152),
-        (448,576),
-        (1152,896),
-        (576,448),
-        (768,1408),
-        (384,704),
-        (1408,768),
-        (704,384),
-        (640,1408),
-        (320,704),
-        (1408,640),
-        (704,320),
-        (1152,640),
-        (1173,640),
-    )
-    if "amazon.titan" in model_id:
-        aspect_ratios = titan_aspect_ratios
-        sizes = titan_sizes
-    else:
-        aspect_ratios = stability_ratios
-        sizes = stability_sizes
+    aspect_ratios, sizes = model_catalog.get_supported_sizes(model_id)
     # for the given aspect ratio find the closest aspect ratio aspect_ratios
     closest_aspect_ratio = min(aspect_ratios, key=lambda x: abs(x - aspect_ratio))
     closest_width= min(sizes, key=lambda x: abs(x[0] - inp_width))
@@ -92,13 +52,10 @@ def get_supported_img_size(inp_width, aspect_ratio, model_id):
     logger.info(f"Closest Supported image size WxH: {closest_match[0]} x {closest_match[1]}")
     return closest_match[0],closest_match[1]
 
-def resize_image(image_file, task_type, model_id):
+def resize_image(image_file, task_type, model_id, resample=image_helper.DEFAULT_RESAMPLE_FILTER):
     # Open the image
     image = Image.open(image_file)
 
-    # Get the pixel data
-    pixels = image.load()
-
     # Get the original image size
     width, height = image.size
 
@@ -141,31 +98,39 @@ def resize_image(image_file, task_type, model_id):
         new_width, new_height = get_supported_img_size(width, aspect_ratio, model_id)
 
     logger.info(f"New image size WxH: {new_width} x {new_height}")
-    # Create a new image with the desired size
-    new_image = Image.new("RGB", (new_width, new_height))
-
-    # Iterate over the pixels and copy them to the new image
-    for x in range(new_width):
-        for y in range(new_height):
-            # Get the pixel value from the original image
-            pixel_value = pixels[int(x * width / new_width), int(y * height / new_height)]
-
-            # Set the pixel value in the new image
-            new_image.putpixel((x, y), pixel_value)
-
-    # Create a BytesIO object
-    byte_io = io.BytesIO()
-
-    # Save the image to the BytesIO object
-    new_image.save(byte_io, format="JPEG")
-
-    # Get the base64 encoded data
-    base64_data = base64.b64encode(byte_io.getvalue())
-
-    # Decode the base64 data to a string
-    base64_str = base64_data.decode("utf-8")
+    # For JPEGs let the decoder scale down in the DCT domain before any pixel is materialized
+    image.draft("RGB", (new_width, new_height))
+    # Resample the whole image in one pass and encode it for the request body
+    new_image = image_helper.resample_image(image, new_width, new_height, resample)
+    base64_str = image_helper.encode_base64_jpeg(new_image)
     return base64_str, new_width, new_height
 
+def get_resized_image(image_file, task_type, model_id, resample=image_helper.DEFAULT_RESAMPLE_FILTER):
+    """
+    resize_image behind the content-addressed image cache.
+    Args:
+        image_file (file): Open binary file of the source image.
+        task_type (str): The image task, part of the cache key.
+        model_id (str): The model the image is sent to, part of the cache key.
+        resample (str): Resample filter name, part of the cache key.
+    Returns:
+        (base64_str, width, height): Same contract as resize_image.
+    """
+    content = image_file.read()
+    content_hash = hashlib.sha256(content).hexdigest()
+    # only the header is parsed here, the pixels are decoded by resize_image on a miss
+    width, height = Image.open(io.BytesIO(content)).size
+    target_size = get_supported_img_size(width, width / height, model_id)
+    key = image_cache.make_key(content_hash, model_id, task_type, target_size, resample)
+    cache = image_cache.get_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        logger.info(f"Image cache hit for {content_hash[:12]}, hit ratio {cache.stats()['hit_ratio']:.2f}")
+        return cached
+    resized = resize_image(io.BytesIO(content), task_type, model_id, resample)
+    cache.put(key, resized)
+    return resized
+
 def run_multi_modal_prompt(
     bedrock_runtime,
     model_id,
@@ -185,7 +150,10 @@ def run_multi_modal_prompt(
     negative_prompt = "",
     task_type = "",
     image_height = 1024,
-    image_width = 1024
+    image_width = 1024,
+    use_cache = False,
+    bypass_cache = False,
+    priority = bedrock_scheduler.INTERACTIVE
 ):
     """
     Invokes a model with a multimodal prompt.
@@ -197,17 +165,22 @@ def run_multi_modal_prompt(
         temperature (float): The amount of randomness injected into the response.
         top_p (float): Use nucleus sampling.
         top_k (int): Only sample from the top K options for each subsequent token.
+        use_cache (bool): Replay identical seeded image requests from the response cache.
+        bypass_cache (bool): Skip the cache lookup but store the fresh response.
+        priority (int): Scheduler priority, bedrock_scheduler.INTERACTIVE or BATCH.
     Returns:
         response_body (string): Response from foundation model.
     """
     prompt_data = messages[0]["content"][0]["text"]
     init_image = messages[0]["content"][1]["source"]["data"] if len(messages[0]["content"]) > 1 else None
+    if init_image is not None:
+        init_image = payload_codec.Base64Image(init_image)
     
     if 'stability' in model_id:
         if 'sd3' in model_id:
             if task_type == "IMAGE_VARIATION":
                 logger.info("Image to Image")
-                body = json.dumps(
+                body = payload_codec.encode_body(
                 {
                     "mode":"image-to-image",
                     "prompt":prompt_data,
@@ -221,7 +194,7 @@ def run_multi_modal_prompt(
 
             else:
                 logger.info("Text to Image")
-                body = json.dumps(
+                body = payload_codec.encode_body(
                 {
                     "aspect_ratio":"1:1",
                     "mode":"text-to-image",
@@ -232,7 +205,7 @@ def run_multi_modal_prompt(
                 }
             )
         else:
-            body = json.dumps(
+            body = payload_codec.encode_body(
                 {
                     "text_prompts":[{"text":prompt_data, "weight": weight}],
                     "cfg_scale":cfg_scale,
@@ -259,7 +232,7 @@ def run_multi_modal_prompt(
         # TODO add conditioning
         if task_type == "TEXT_IMAGE":
             logger.info("Text to Image")
-            body = json.dumps({
+            body = payload_codec.encode_body({
                 "taskType": task_type,
                 "textToImageParams": {
                     "text": prompt_data,
@@ -270,7 +243,7 @@ def run_multi_modal_prompt(
         elif task_type == "INPAINTING":
             logger.info("Inpainting")
             
-            body = json.dumps({
+            body = payload_codec.encode_body({
                 "taskType": task_type,
                 "inPaintingParams": {
                     "image": init_image,
@@ -284,7 +257,7 @@ def run_multi_modal_prompt(
             })
         elif task_type == "OUTPAINTING":
             logger.info("Outpainting")
-            body = json.dumps({
+            body = payload_codec.encode_body({
                 "taskType": task_type,
                 "outPaintingParams": {
                     "image": init_image,
@@ -299,7 +272,7 @@ def run_multi_modal_prompt(
             })
         if task_type == "IMAGE_VARIATION":
             logger.info("Image Variation")
-            body = json.dumps({
+            body = payload_codec.encode_body({
                 "taskType": task_type,
                 "imageVariationParams": {
                     "text": prompt_data,
@@ -313,7 +286,7 @@ def run_multi_modal_prompt(
             })
         if task_type == "COLOR_GUIDED_GENERATION":
             logger.info("Color Guided Generation")
-            body = json.dumps({
+            body = payload_codec.encode_body({
                 "taskType": task_type,
                 "imageVariationParams": {
                     "text": prompt_data,
@@ -326,14 +299,14 @@ def run_multi_modal_prompt(
             })
         if task_type == "BACKGROUND_REMOVAL":
             logger.info("Background Removal")
-            body = json.dumps({
+            body = payload_codec.encode_body({
                 "taskType": task_type,
                 "backgroundRemovalParams": {
                     "image": init_image,
                 }
             })
     else:
-        body = json.dumps(
+        body = payload_codec.encode_body(
             {
                 "anthropic_version": "bedrock-2023-05-31",
                 "max_tokens": max_tokens,
@@ -344,89 +317,420 @@ def run_multi_modal_prompt(
             }
         )
     
+    cache_key = None
+    if use_cache and response_cache.is_cacheable(model_id, body):
+        cache_key = response_cache.make_key(model_id, body)
+        if not bypass_cache:
+            cached = response_cache.get_cache().get(cache_key)
+            if cached is not None:
+                logger.info("Returning cached bedrock response")
+                return cached, None
+
     logger.info("Sending request to bedrock")
 
+    scheduler = bedrock_scheduler.get_scheduler()
+    tokens = bedrock_scheduler.estimate_tokens(model_id, prompt_data, max_tokens)
     try:
-        response = bedrock_runtime.invoke_model(body=body, modelId=model_id)
+        response = scheduler.invoke(
+            model_id,
+            lambda: bedrock_runtime.invoke_model(body=body, modelId=model_id),
+            priority,
+            tokens,
+        )
     except ClientError as e:
         logger.error(e)
         response = None
         error = e.response["Error"]
     if response:
-        response_body = json.loads(response.get("body").read())
+        if "stability" in model_id or "amazon.titan-image" in model_id:
+            response_body = payload_codec.decode_response(response.get("body").read())
+        else:
+            response_body = json.loads(response.get("body").read())
+        usage = response_body.get("usage")
+        if tokens and usage:
+            scheduler.record_usage(model_id, tokens, usage.get("input_tokens", 0) + usage.get("output_tokens", 0))
+        if cache_key:
+            response_cache.get_cache().put(cache_key, response_body)
         logger.info("Returning bedock response")
         return response_body, None
     else:
         logger.info("Returning error")
         return None, error
 
-def build_request(prompt, file_paths, profile="default", mask_prompt = "", negative_prompt = "", task_type = "", image_height=1024, image_width=1024):
+def session_params():
+    """
+    Snapshot the inference parameters the pages keep in st.session_state.
+    build_request and build_request_fanout accept the same dict from callers that run
+    outside Streamlit, such as the headless pipeline.
+    """
+    return {
+        "model_id": st.session_state.model_id,
+        "max_tokens": st.session_state.max_tokens,
+        "temperature": st.session_state.temperature,
+        "top_p": st.session_state.top_p,
+        "top_k": st.session_state.top_k,
+        # text-only pages never set the image parameters, fall back to run_multi_modal_prompt's defaults
+        "seed": st.session_state.get("seed", 45),
+        "cfg_scale": st.session_state.get("cfg_scale", 10),
+        "steps": st.session_state.get("steps", 30),
+        "num_images": st.session_state.get("num_images", 3),
+        "style_preset": st.session_state.get("style_preset", "photographic"),
+        "weight": st.session_state.get("weight", 1.0),
+        "image_strength": st.session_state.get("image_strength", 0.5),
+        "resample_filter": st.session_state.get("resample_filter", image_helper.DEFAULT_RESAMPLE_FILTER),
+        "use_cache": st.session_state.get("use_response_cache", False),
+        "bypass_cache": st.session_state.get("bypass_response_cache", False),
+        "reuse_steps": st.session_state.get("reuse_cached_steps", True),
+    }
+
+IMAGE_ONLY_PARAMS = ("seed", "cfg_scale", "steps", "num_images", "style_preset", "weight", "image_strength")
+
+def _step_fingerprint(step, prompt, file_paths, params, **extra):
+    if "anthropic" in params["model_id"]:
+        # image sliders left over from other pages must not change a text step's fingerprint
+        params = {k: v for k, v in params.items() if k not in IMAGE_ONLY_PARAMS}
+    return step_memo.fingerprint(
+        step,
+        prompt,
+        params["model_id"],
+        dict(params, **extra),
+        upstream={"files": [file_path["file_path"] for file_path in file_paths or []]},
+    )
+
+def build_messages(prompt, file_paths, task_type, model_id, image_height=1024, image_width=1024, resample=None):
+    """
+    Build the single user message sent to the model, resizing any attached images.
+    Returns:
+        (messages, image_width, image_height): The messages list and the size of the last image.
+    """
+    message = {
+        "role": "user",
+        "content": [
+            {"type": "text", "text": prompt},
+        ],
+    }
+
+    if file_paths is not None:  # must be image(s)
+        for file_path in file_paths:  # append each to message
+            with open(file_path["file_path"], "rb") as image_file:
+                # content_image = base64.b64encode(image_file.read()).decode("utf8")
+                resized_image,image_width,image_height = get_resized_image(
+                    image_file,
+                    task_type,
+                    model_id,
+                    resample or st.session_state.get("resample_filter", image_helper.DEFAULT_RESAMPLE_FILTER),
+                )
+                logger.info(f"Image height, Image width:{image_height}, {image_width}")
+
+                message["content"].append(
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": file_path["file_type"],
+                            "data": payload_codec.Base64Image(resized_image),
+                        },
+                    }
+                )
+
+    return [message], image_width, image_height
+
+def build_request(prompt, file_paths, profile="default", mask_prompt = "", negative_prompt = "", task_type = "", image_height=1024, image_width=1024, params=None, priority=bedrock_scheduler.INTERACTIVE, step=None):
     """
     Entrypoint for Anthropic Claude multimodal prompt example.
     Args:
         prompt (str): The prompt to use.
         image (str): The image to use.
+        params (dict): Inference parameters shaped like session_params(), defaults to st.session_state.
+        priority (int): Scheduler priority, bedrock_scheduler.INTERACTIVE or BATCH.
+        step (str): Pipeline step name; when set, a response for identical inputs is reused.
     Returns:
         response_body (string): Response from foundation model.
     """
+    params = params or session_params()
+    fp = None
+    if step and params.get("reuse_steps", True):
+        fp = _step_fingerprint(
+            step, prompt, file_paths, params,
+            mask_prompt=mask_prompt, negative_prompt=negative_prompt, task_type=task_type,
+            image_height=image_height, image_width=image_width,
+        )
+        cached = step_memo.get_memo().get(step, fp)
+        if cached is not None:
+            return cached, None
+    started = time.perf_counter()
 
     try:
-        session = boto3.Session(profile_name=profile)
-        bedrock_runtime = session.client(service_name="bedrock-runtime")
-
-        message = {
-            "role": "user",
-            "content": [
-                {"type": "text", "text": prompt},
-            ],
-        }
+        bedrock_runtime = client_registry.get_client("bedrock-runtime", profile)
 
-        if file_paths is not None:  # must be image(s)
-            for file_path in file_paths:  # append each to message
-                with open(file_path["file_path"], "rb") as image_file:
-                    # content_image = base64.b64encode(image_file.read()).decode("utf8")
-                    resized_image,image_width,image_height = resize_image(image_file, task_type, st.session_state.model_id)
-                    logger.info(f"Image height, Image width:{image_height}, {image_width}")
-
-                    message["content"].append(
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": file_path["file_type"],
-                                "data": resized_image,
-                            },
-                        }
-                    )
-
-            messages = [message]
+        messages, image_width, image_height = build_messages(
+            prompt, file_paths, task_type, params["model_id"], image_height, image_width, params["resample_filter"]
+        )
 
         response = run_multi_modal_prompt(
             bedrock_runtime,
-            st.session_state.model_id,
+            params["model_id"],
             messages,
-            st.session_state.max_tokens,
-            st.session_state.temperature,
-            st.session_state.top_p,
-            st.session_state.top_k,
-            st.session_state.seed,
-            st.session_state.cfg_scale,
-            st.session_state.steps,
-            st.session_state.num_images,
-            st.session_state.style_preset,
-            st.session_state.weight,
-            st.session_state.image_strength,
+            params["max_tokens"],
+            params["temperature"],
+            params["top_p"],
+            params["top_k"],
+            params["seed"],
+            params["cfg_scale"],
+            params["steps"],
+            params["num_images"],
+            params["style_preset"],
+            params["weight"],
+            params["image_strength"],
             mask_prompt=mask_prompt,
             negative_prompt=negative_prompt,
             task_type=task_type,
             image_height=image_height,
             image_width=image_width,
+            use_cache=params["use_cache"],
+            bypass_cache=params["bypass_cache"],
+            priority=priority,
         )
 
         # logger.info(json.dumps(response, indent=4))
 
+        if fp and response[0] is not None:
+            step_memo.get_memo().put(step, fp, response[0], time.perf_counter() - started)
         return response
     except ClientError as err:
         message = err.response.get("Error").get("Message")
         logger.error("A client error occurred: %s", message)
-        raise ImageError(message)
\ No newline at end of file
+        raise ImageError(message)
+
+def build_request_fanout(prompt, file_paths, profile="default", mask_prompt = "", negative_prompt = "", task_type = "", num_images=None, seeds=None, cfg_scales=None, params=None):
+    """
+    Fan an image generation request out into concurrent invoke_model calls.
+    Args:
+        prompt (str): The prompt to use.
+        file_paths (list): Images to attach to the prompt.
+        num_images (int): Total images wanted, defaults to the num_images parameter.
+        seeds (list): Optional seeds to sweep.
+        cfg_scales (list): Optional cfg scales to sweep; combined with seeds as a grid.
+        params (dict): Inference parameters shaped like session_params(), defaults to st.session_state.
+    Returns:
+        FanOut: Iterate it to receive FanOutResult objects as each call completes.
+    """
+    # snapshot the widget values, worker threads must not touch st.session_state
+    params = dict(params or session_params())
+    model_id = params.pop("model_id")
+    bedrock_runtime = client_registry.get_client("bedrock-runtime", profile)
+    messages, image_width, image_height = build_messages(
+        prompt, file_paths, task_type, model_id, resample=params.pop("resample_filter")
+    )
+    default_num_images = params.pop("num_images")
+    calls = image_fanout.plan_calls(
+        model_id,
+        num_images or default_num_images,
+        params.pop("seed"),
+        params.pop("cfg_scale"),
+        seeds,
+        cfg_scales,
+    )
+
+    def invoke(call):
+        return run_multi_modal_prompt(
+            bedrock_runtime,
+            model_id,
+            messages,
+            seed=call["seed"],
+            cfg_scale=call["cfg_scale"],
+            num_images=call["num_images"],
+            mask_prompt=mask_prompt,
+            negative_prompt=negative_prompt,
+            task_type=task_type,
+            image_height=image_height,
+            image_width=image_width,
+            priority=bedrock_scheduler.BATCH,
+            **params,
+        )
+
+    return image_fanout.FanOut(model_id, invoke, calls)
+
+def _image_bytes(item):
+    # decode_response already hands back bytes, older cached or pickled responses hold base64 text
+    return item if isinstance(item, (bytes, bytearray)) else base64.b64decode(item)
+
+def extract_images(model_id, response):
+    """
+    Decode the generated images from an image model response.
+    Returns:
+        images (list): Raw image bytes, one entry per generated image.
+    """
+    if "stability" in model_id:
+        if "sd3" in model_id:
+            finish_reason = response.get("finish_reasons")[0]
+            if finish_reason:
+                raise ImageError(f"Image generation error. Error code is {finish_reason}")
+            return [_image_bytes(item) for item in response["images"]]
+        finish_reason = response.get("artifacts")[0].get("finishReason")
+        if finish_reason == 'ERROR' or finish_reason == 'CONTENT_FILTERED':
+            raise ImageError(f"Image generation error. Error code is {finish_reason}")
+        return [_image_bytes(artifact.get("base64")) for artifact in response.get("artifacts")]
+    finish_reason = response.get("error")
+    if finish_reason is not None:
+        raise ImageError(f"Image generation error. Error code is {finish_reason}")
+    return [_image_bytes(item) for item in response.get("images")]
+
+
+class ModelStream:
+    """
+    Iterable of text deltas from invoke_model_with_response_stream, suitable for st.write_stream.
+    Once iteration finishes, response holds a dict shaped like the invoke_model response body
+    (content and usage), and the timing metrics are filled in.
+    """
+    def __init__(self, event_stream, started):
+        self._event_stream = event_stream
+        self.started = started
+        self.text = ""
+        self.usage = {"input_tokens": 0, "output_tokens": 0}
+        self.stop_reason = None
+        self.error = None
+        self.time_to_first_token = None
+        self.tokens_per_second = None
+        self.response = None
+        self._done_callbacks = []
+
+    def add_done_callback(self, fn):
+        """Call fn(stream) once iteration finishes, after an error too; response is None when the stream failed."""
+        self._done_callbacks.append(fn)
+
+    def __iter__(self):
+        chunks = []
+        first_token_at = None
+        try:
+            for event in self._event_stream:
+                if "chunk" not in event:
+                    continue
+                chunk = json.loads(event["chunk"]["bytes"])
+                if chunk["type"] == "message_start":
+                    self.usage.update(chunk["message"].get("usage", {}))
+                elif chunk["type"] == "content_block_delta" and chunk["delta"].get("type") == "text_delta":
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        self.time_to_first_token = first_token_at - self.started
+                    chunks.append(chunk["delta"]["text"])
+                    yield chunk["delta"]["text"]
+                elif chunk["type"] == "message_delta":
+                    self.usage.update(chunk.get("usage", {}))
+                    self.stop_reason = chunk["delta"].get("stop_reason")
+        # errors raised mid-stream arrive as EventStreamError, a ClientError subclass
+        except ClientError as e:
+            logger.error(e)
+            self.error = e.response["Error"]
+        finished = time.perf_counter()
+        self.text = "".join(chunks)
+        if first_token_at is not None and finished > first_token_at:
+            self.tokens_per_second = self.usage["output_tokens"] / (finished - first_token_at)
+        if self.error is None:
+            self.response = {
+                "content": [{"type": "text", "text": self.text}],
+                "stop_reason": self.stop_reason,
+                "usage": self.usage,
+            }
+        logger.info(f"Stream finished, time to first token {self.time_to_first_token}s, {self.tokens_per_second} tokens/s")
+        for fn in self._done_callbacks:
+            try:
+                fn(self)
+            except Exception as e:
+                logger.error(f"Stream completion callback failed: {e}")
+
+class CachedStream:
+    """Replays a memoized response through the ModelStream interface."""
+    def __init__(self, response):
+        self.response = response
+        self.text = response["content"][0]["text"]
+        self.usage = response.get("usage", {})
+        self.stop_reason = response.get("stop_reason")
+        self.error = None
+        self.time_to_first_token = 0
+        self.tokens_per_second = None
+
+    def __iter__(self):
+        yield self.text
+
+def run_multi_modal_prompt_stream(
+    bedrock_runtime,
+    model_id,
+    messages,
+    max_tokens = 4096,
+    temperature = 0.5,
+    top_p = .999,
+    top_k = 250,
+):
+    """
+    Streaming variant of run_multi_modal_prompt for Anthropic Claude text generation.
+    Returns:
+        (ModelStream, error): A stream of text deltas, or None and the Bedrock error.
+    """
+    body = payload_codec.encode_body(
+        {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "messages": messages,
+            "temperature": temperature,
+            "top_p": top_p,
+            "top_k": top_k,
+        }
+    )
+    logger.info("Sending streaming request to bedrock")
+    scheduler = bedrock_scheduler.get_scheduler()
+    prompt_data = messages[0]["content"][0]["text"]
+    tokens = bedrock_scheduler.estimate_tokens(model_id, prompt_data, max_tokens)
+    started = time.perf_counter()
+    try:
+        response = scheduler.invoke(
+            model_id,
+            lambda: bedrock_runtime.invoke_model_with_response_stream(body=body, modelId=model_id),
+            bedrock_scheduler.INTERACTIVE,
+            tokens,
+        )
+    except ClientError as e:
+        logger.error(e)
+        return None, e.response["Error"]
+    stream = ModelStream(response.get("body"), started)
+    if tokens:
+        # give back the part of the max_tokens reservation the response did not use
+        stream.add_done_callback(lambda finished: scheduler.record_usage(
+            model_id, tokens, finished.usage.get("input_tokens", 0) + finished.usage.get("output_tokens", 0)
+        ))
+    return stream, None
+
+def build_request_stream(prompt, file_paths, profile="default", step=None):
+    """
+    Streaming variant of build_request for text analysis pages.
+    Args:
+        prompt (str): The prompt to use.
+        file_paths (list): Images to attach to the prompt.
+        step (str): Pipeline step name; when set, a response for identical inputs is replayed.
+    Returns:
+        (ModelStream, error): Iterate the stream to receive text as it is generated.
+    """
+    params = session_params()
+    fp = None
+    if step and params["reuse_steps"]:
+        fp = _step_fingerprint(step, prompt, file_paths, params)
+        cached = step_memo.get_memo().get(step, fp)
+        if cached is not None:
+            return CachedStream(cached), None
+    bedrock_runtime = client_registry.get_client("bedrock-runtime", profile)
+    messages, _, _ = build_messages(prompt, file_paths, "", params["model_id"], resample=params["resample_filter"])
+    stream, error = run_multi_modal_prompt_stream(
+        bedrock_runtime,
+        params["model_id"],
+        messages,
+        params["max_tokens"],
+        params["temperature"],
+        params["top_p"],
+        params["top_k"],
+    )
+    if stream and fp:
+        def memoize(finished):
+            if finished.response is not None:
+                step_memo.get_memo().put(step, fp, finished.response, time.perf_counter() - finished.started)
+        stream.add_done_callback(memoize)
+    return stream, error
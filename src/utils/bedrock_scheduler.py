@@ -0,0 +1,194 @@
+"""
+Process-wide, throttling-aware scheduler for Amazon Bedrock runtime calls.
+
+Each model gets two token buckets, one for requests per minute and one for
+tokens per minute, sized a little under the account quota. Callers wait in a
+per-model priority queue where interactive page requests go ahead of batch
+fan-out work. A ThrottlingException drains the model's buckets so every
+waiter backs off together, and the call is retried with full-jitter
+exponential backoff.
+"""
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from botocore.exceptions import ClientError
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+INTERACTIVE = 0
+BATCH = 1
+
+# per-model quotas; keys are matched as substrings of the model ID
+MODEL_LIMITS = {
+    "anthropic.claude-3-5-sonnet": {"rpm": 50, "tpm": 400_000},
+    "anthropic.claude-3-sonnet": {"rpm": 100, "tpm": 400_000},
+    "anthropic.claude-3-haiku": {"rpm": 200, "tpm": 800_000},
+    "anthropic.claude-3-opus": {"rpm": 50, "tpm": 400_000},
+    "amazon.titan-image": {"rpm": 60, "tpm": None},
+    "amazon.titan-embed-text": {"rpm": 2000, "tpm": None},
+    "stability": {"rpm": 60, "tpm": None},
+}
+DEFAULT_LIMITS = {"rpm": 60, "tpm": 200_000}
+THROTTLING_CODES = ("ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException")
+# pooled clients already retry throttling inside botocore, these retries only see what escapes them
+MAX_RETRIES = 3
+BASE_BACKOFF_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 30.0
+
+
+def estimate_tokens(model_id, prompt, max_tokens):
+    """Rough tokens-per-minute cost of a request: prompt characters / 4 plus the reserved max_tokens."""
+    if "anthropic" not in model_id:
+        return 0
+    return len(prompt) // 4 + max_tokens
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most one minute of capacity."""
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self):
+        self.tokens = min(self.tokens, 0.0)
+
+
+class _ModelState:
+    def __init__(self, limits):
+        self.rpm = TokenBucket(limits["rpm"])
+        self.tpm = TokenBucket(limits["tpm"]) if limits.get("tpm") else None
+        self.queue = []
+        self.stats = {"calls": 0, "throttled": 0, "waits": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "max_queue_depth": 0}
+
+
+class BedrockScheduler:
+    def __init__(self, model_limits=MODEL_LIMITS, default_limits=DEFAULT_LIMITS):
+        self.model_limits = model_limits
+        self.default_limits = default_limits
+        self._cond = threading.Condition()
+        self._models = {}
+        self._seq = itertools.count()
+
+    def _state(self, model_id):
+        state = self._models.get(model_id)
+        if state is None:
+            limits = next((v for k, v in self.model_limits.items() if k in model_id), self.default_limits)
+            state = _ModelState(limits)
+            self._models[model_id] = state
+        return state
+
+    def acquire(self, model_id, priority=INTERACTIVE, tokens=0):
+        """Block until this caller is first in the model's queue and both buckets have capacity."""
+        start = time.monotonic()
+        with self._cond:
+            state = self._state(model_id)
+            entry = (priority, next(self._seq))
+            heapq.heappush(state.queue, entry)
+            state.stats["max_queue_depth"] = max(state.stats["max_queue_depth"], len(state.queue))
+            while True:
+                if state.queue[0] == entry:
+                    now = time.monotonic()
+                    wait = state.rpm.wait_time(1, now)
+                    if state.tpm is not None and tokens:
+                        wait = max(wait, state.tpm.wait_time(tokens, now))
+                    if wait <= 0:
+                        heapq.heappop(state.queue)
+                        state.rpm.consume(1)
+                        if state.tpm is not None and tokens:
+                            state.tpm.consume(tokens)
+                        self._cond.notify_all()
+                        break
+                    self._cond.wait(timeout=wait)
+                else:
+                    self._cond.wait()
+            waited = time.monotonic() - start
+            state.stats["calls"] += 1
+            if waited > 0.001:
+                state.stats["waits"] += 1
+                state.stats["wait_seconds"] += waited
+                state.stats["max_wait_seconds"] = max(state.stats["max_wait_seconds"], waited)
+        if waited > 0.5:
+            logger.info(f"Waited {waited:.2f}s for {model_id} capacity")
+        return waited
+
+    def record_usage(self, model_id, estimated_tokens, actual_tokens):
+        """Return over-reserved tokens to the bucket once the real usage is known."""
+        if estimated_tokens <= actual_tokens:
+            return
+        with self._cond:
+            state = self._state(model_id)
+            if state.tpm is not None:
+                state.tpm.refund(estimated_tokens - actual_tokens)
+                self._cond.notify_all()
+
+    def _throttled(self, model_id):
+        with self._cond:
+            state = self._state(model_id)
+            state.stats["throttled"] += 1
+            state.rpm.drain()
+            if state.tpm is not None:
+                state.tpm.drain()
+
+    def invoke(self, model_id, call, priority=INTERACTIVE, tokens=0):
+        """
+        Run call() once the model has capacity, retrying throttled calls with jittered backoff.
+        Args:
+            model_id (str): The model being invoked.
+            call (callable): Zero-argument function that makes the Bedrock request.
+            priority (int): INTERACTIVE or BATCH.
+            tokens (int): Estimated tokens the request reserves against the TPM quota.
+        Returns:
+            The return value of call().
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            self.acquire(model_id, priority, tokens)
+            try:
+                return call()
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in THROTTLING_CODES or attempt == MAX_RETRIES:
+                    raise
+                self._throttled(model_id)
+                backoff = random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt))
+                logger.warning(f"{model_id} throttled, retry {attempt + 1} in {backoff:.2f}s")
+                time.sleep(backoff)
+
+    def stats(self):
+        """Per-model queue depth, wait time and throttling counters."""
+        with self._cond:
+            return {
+                model_id: dict(state.stats, queue_depth=len(state.queue))
+                for model_id, state in self._models.items()
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = BedrockScheduler()
+    return _scheduler
@@ -0,0 +1,144 @@
+"""
+Process-wide registry of pooled boto3 clients.
+
+boto3 clients are thread safe and keep a urllib3 connection pool, so one client
+per (profile, service, region, config) can be shared by every Streamlit session
+instead of paying credential resolution and a TLS handshake on each call.
+"""
+import copy
+import json
+import logging
+import threading
+import boto3
+from botocore.awsrequest import AWSRequest
+from botocore.config import Config
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_CLIENT_CONFIG = {
+    "max_pool_connections": 50,
+    "tcp_keepalive": True,
+    "retries": {"mode": "adaptive", "max_attempts": 5},
+    "connect_timeout": 10,
+    # image generation and long Claude responses regularly run past the 60 s default
+    "read_timeout": 300,
+}
+
+_sessions = {}
+_clients = {}
+_lock = threading.Lock()
+_prewarmed = set()
+_prewarm_started = set()
+_stats = {"hits": 0, "misses": 0, "prewarmed": 0}
+
+
+def _config_key(config):
+    return json.dumps(config, sort_keys=True)
+
+
+def get_session(profile=None):
+    """Return the shared boto3 session for a profile."""
+    with _lock:
+        return _get_session_locked(profile)
+
+
+def _get_session_locked(profile):
+    session = _sessions.get(profile)
+    if session is None:
+        session = boto3.Session(profile_name=profile)
+        _sessions[profile] = session
+    return session
+
+
+def get_client(service_name, profile=None, region_name=None, config=None):
+    """
+    Return a shared client, creating it on first use.
+    Args:
+        service_name (str): boto3 service name, e.g. bedrock-runtime.
+        profile (str): AWS CLI profile name, None for the default credential chain.
+        region_name (str): Region override, None for the profile's region.
+        config (dict): botocore Config keyword overrides merged over DEFAULT_CLIENT_CONFIG.
+    Returns:
+        client: The pooled boto3 client.
+    """
+    merged = dict(DEFAULT_CLIENT_CONFIG, **(config or {}))
+    key = (profile, service_name, region_name, _config_key(merged))
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            _stats["hits"] += 1
+            return client
+        _stats["misses"] += 1
+        # boto3 sessions are not thread safe, so clients are only created under the lock
+        session = _get_session_locked(profile)
+        # Config rewrites the nested retries dict in place, so hand it a copy
+        client = session.client(service_name, region_name=region_name, config=Config(**copy.deepcopy(merged)))
+        _clients[key] = client
+    logger.info(f"Created pooled {service_name} client for profile {profile}")
+    return client
+
+
+def prewarm(service_names, profile=None, region_name=None, connections=2):
+    """
+    Create clients and open connections to their endpoints ahead of the first real call.
+    The warm-up requests are unsigned HEAD requests; their responses are discarded and
+    the connections go back into the client's pool. Each client is only warmed once.
+    Opening connections relies on botocore's internal endpoint session; when a botocore
+    version does not expose it, only the client (credentials and endpoint) is prepared.
+    """
+    for service_name in service_names:
+        client = get_client(service_name, profile, region_name)
+        with _lock:
+            if id(client) in _prewarmed:
+                continue
+            _prewarmed.add(id(client))
+        http_session = getattr(getattr(client, "_endpoint", None), "http_session", None)
+        if not hasattr(http_session, "send"):
+            continue
+        for _ in range(connections):
+            try:
+                request = AWSRequest(method="HEAD", url=client.meta.endpoint_url).prepare()
+                http_session.send(request)
+            except Exception as e:
+                logger.warning(f"Could not prewarm {service_name}: {e}")
+                break
+            with _lock:
+                _stats["prewarmed"] += 1
+
+
+def prewarm_async(service_names, profile=None, region_name=None, connections=2):
+    """
+    Run prewarm in a daemon thread so page rendering never waits on it.
+    Only the first call per (services, profile, region) in a process starts a thread, so it is safe
+    to call from a Streamlit script that reruns on every interaction.
+    Returns:
+        thread (Thread): The warm-up thread, or None when one was already started.
+    """
+    key = (tuple(service_names), profile, region_name)
+    with _lock:
+        if key in _prewarm_started:
+            return None
+        _prewarm_started.add(key)
+    thread = threading.Thread(
+        target=prewarm,
+        args=(service_names, profile, region_name, connections),
+        name="client-registry-prewarm",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def get_stats():
+    """Registry hit/miss counters and the number of cached clients."""
+    with _lock:
+        return dict(_stats, clients=len(_clients), sessions=len(_sessions))
+
+
+def clear():
+    """Drop every cached client and session, e.g. after credentials rotate."""
+    with _lock:
+        _clients.clear()
+        _sessions.clear()
+        _prewarmed.clear()
+        _prewarm_started.clear()
@@ -1,4 +1,4 @@
-import boto3
+from src.utils import client_registry
 from jose import jwk, jwt
 from jose.utils import base64url_decode
 import requests
@@ -23,10 +23,7 @@ class CognitoAuth:
         """Load configuration from AWS Secrets Manager"""
         secret_name = os.environ.get('COGNITO_SECRET_NAME')
         profile_name = os.getenv('AWS_PROFILE', None)
-        session = boto3.Session(profile_name=profile_name)
-        client = session.client(
-            service_name='secretsmanager'
-        )
+        client = client_registry.get_client('secretsmanager', profile_name)
 
         try:
             get_secret_value_response = client.get_secret_value(
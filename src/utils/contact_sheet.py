@@ -0,0 +1,193 @@
+"""
+N-up contact sheets for reviewing generated ads and images.
+
+Tiles are streamed one at a time: each comes from an existing thumbnail when
+one is large enough, otherwise from a draft decode (JPEG is decoded straight
+at a reduced scale) followed by a reducing thumbnail, and is pasted into a
+canvas allocated once per sheet. Only one source image and one sheet are held
+in memory at a time, however many tiles there are.
+"""
+import datetime
+import glob
+import json
+import logging
+import os
+import time
+from argparse import ArgumentParser
+from PIL import Image, ImageDraw
+from src.utils import font_registry
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+ASSETS_DIR = "assets"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif")
+DEFAULT_COLUMNS, DEFAULT_ROWS = 4, 3
+DEFAULT_TILE_SIZE = (320, 320)
+PADDING = 10
+LABEL_SIZE = 12
+BG_COLOR = (240, 240, 240)
+LABEL_COLOR = (60, 60, 60)
+# manifest keys whose paths are inputs (source imagery, brief files) rather than results; a record under
+# one of these keys (e.g. the pipeline's "image" stage) is still searched
+INPUT_KEYS = ("image", "images", "sources")
+# let Pillow box-reduce first when shrinking by more than this factor
+REDUCING_GAP = 3.0
+
+
+def _existing(value, base_dir):
+    for path in (value, os.path.join(base_dir, value)):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _is_input_paths(value):
+    return isinstance(value, str) or (isinstance(value, list) and all(isinstance(item, str) for item in value))
+
+
+def _manifest_images(value, base_dir, skip_inputs=True, seen=None):
+    # every output image a manifest names, in document order; .json files it names (pipeline stage outputs)
+    # are opened and everything in them is treated as output
+    seen = set() if seen is None else seen
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if skip_inputs and key in INPUT_KEYS and _is_input_paths(item):
+                continue
+            yield from _manifest_images(item, base_dir, skip_inputs, seen)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _manifest_images(item, base_dir, skip_inputs, seen)
+    elif isinstance(value, str) and value.lower().endswith(IMAGE_EXTENSIONS):
+        path = _existing(value, base_dir)
+        if path is not None:
+            yield path
+    elif isinstance(value, str) and value.lower().endswith(".json"):
+        path = _existing(value, base_dir)
+        if path is not None and os.path.abspath(path) not in seen:
+            seen.add(os.path.abspath(path))
+            try:
+                with open(path, "r") as f:
+                    output = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping {path}: {e}")
+                return
+            yield from _manifest_images(output, os.path.dirname(path), False, seen)
+
+
+def collect_images(source):
+    """
+    List the images to put on the sheets.
+    Args:
+        source (str or list): A directory, a manifest.json (generate_ad_batch, generate_ad_formats or pipeline;
+            stage outputs the pipeline manifest names are followed), or a list of paths.
+    Returns:
+        paths (list): Image paths without duplicates, in directory or manifest order.
+    """
+    if isinstance(source, (list, tuple)):
+        paths = list(source)
+    elif os.path.isdir(source):
+        paths = sorted(
+            os.path.join(source, name) for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+    else:
+        with open(source, "r") as f:
+            paths = list(_manifest_images(json.load(f), os.path.dirname(source)))
+    return list(dict.fromkeys(paths))
+
+
+def find_thumbnail(path, tile_size):
+    """
+    Existing thumbnail of an image that is at least as large as a tile, or None.
+    Looks in a thumbnails/ folder next to the image and in a sibling *_thumbs folder
+    (assets/stock_originals -> assets/stock_thumbs/thumbnail_<name>).
+    """
+    folder, name = os.path.split(path)
+    stem = os.path.splitext(name)[0]
+    candidates = glob.glob(os.path.join(folder, "thumbnails", f"{glob.escape(stem)}.*"))
+    prefix = os.path.basename(folder).rsplit("_", 1)[0]
+    candidates += glob.glob(os.path.join(os.path.dirname(folder), f"{glob.escape(prefix)}_thumbs", f"thumbnail_{glob.escape(stem)}.*"))
+    for candidate in candidates:
+        try:
+            with Image.open(candidate) as thumb:
+                # only the header is read here
+                if thumb.width >= tile_size[0] or thumb.height >= tile_size[1]:
+                    return candidate
+        except OSError:
+            continue
+    return None
+
+
+def load_tile(path, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Decode an image at tile size without a full resolution decode where the format allows it.
+    Returns:
+        tile (Image): RGB image fitting inside tile_size, aspect ratio kept.
+    """
+    with Image.open(find_thumbnail(path, tile_size) or path) as image:
+        # JPEG decodes directly at 1/2, 1/4 or 1/8 scale; other formats ignore this
+        image.draft("RGB", tile_size)
+        image.thumbnail(tile_size, reducing_gap=REDUCING_GAP)
+        return image.convert("RGB")
+
+
+def build_contact_sheets(source, output_dir=None, columns=DEFAULT_COLUMNS, rows=DEFAULT_ROWS,
+                         tile_size=DEFAULT_TILE_SIZE, labels=True):
+    """
+    Write N-up review sheets of generated ads or images.
+    Args:
+        source (str or list): Directory, manifest.json or list of image paths.
+        output_dir (str): Defaults to assets/generated_ads/contact_sheets_<timestamp>.
+        columns, rows (int): Grid per sheet; extra images go onto further sheets.
+        tile_size (tuple): Maximum (width, height) of each tile.
+        labels (bool): Print each image's file name under its tile.
+    Returns:
+        sheets (list): Paths of the written sheets.
+    """
+    start = time.perf_counter()
+    paths = collect_images(source)
+    output_dir = output_dir or f"{ASSETS_DIR}/generated_ads/contact_sheets_{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    os.makedirs(output_dir, exist_ok=True)
+    fonts = font_registry.get_registry()
+    label_font = fonts.get_font(LABEL_SIZE) if labels else None
+    label_height = fonts.line_height(label_font) + PADDING // 2 if labels else 0
+    cell_width, cell_height = tile_size[0] + PADDING, tile_size[1] + label_height + PADDING
+    per_sheet = columns * rows
+
+    sheets = []
+    for first in range(0, len(paths), per_sheet):
+        batch = paths[first:first + per_sheet]
+        used_rows = -(-len(batch) // columns)
+        sheet = Image.new("RGB", (columns * cell_width + PADDING, used_rows * cell_height + PADDING), BG_COLOR)
+        draw = ImageDraw.Draw(sheet)
+        for i, path in enumerate(batch):
+            x = PADDING + (i % columns) * cell_width
+            y = PADDING + (i // columns) * cell_height
+            try:
+                tile = load_tile(path, tile_size)
+            except OSError as e:
+                logger.error(f"Skipping {path}: {e}")
+                continue
+            sheet.paste(tile, (x + (tile_size[0] - tile.width) // 2, y + (tile_size[1] - tile.height) // 2))
+            if labels:
+                label = os.path.basename(path)
+                while len(label) > 4 and fonts.measure(label, label_font)[0] > tile_size[0]:
+                    label = label[:-4] + "..."
+                draw.text((x, y + tile_size[1] + PADDING // 2), label, font=label_font, fill=LABEL_COLOR)
+        sheet_path = os.path.join(output_dir, f"sheet_{len(sheets) + 1:03d}_{len(batch)}-up.png")
+        sheet.save(sheet_path)
+        sheets.append(sheet_path)
+    logger.info(f"Wrote {len(sheets)} contact sheets for {len(paths)} images in {time.perf_counter() - start:.2f} s")
+    return sheets
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Write N-up contact sheets for reviewing generated ads and images")
+    parser.add_argument("--source", required=True, help="Directory of images or a manifest.json")
+    parser.add_argument("--output", default=None, help="Output directory for the sheets")
+    parser.add_argument("--columns", type=int, default=DEFAULT_COLUMNS)
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS)
+    parser.add_argument("--tile", type=int, default=DEFAULT_TILE_SIZE[0], help="Tile edge in pixels")
+    parser.add_argument("--no-labels", action="store_true", help="Leave out the file name under each tile")
+    args = parser.parse_args()
+    for sheet in build_contact_sheets(args.source, args.output, args.columns, args.rows, (args.tile, args.tile), not args.no_labels):
+        print(sheet)
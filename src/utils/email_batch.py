@@ -0,0 +1,604 @@
+"""
+Batch personalized email generation for whole user segments.
+
+Users are grouped by (domain, category, language); each group's item table is
+looked up with item_index once and shared by every prompt in the group. Emails
+are generated either online, with a bounded pool of concurrent Bedrock calls
+queued behind interactive traffic, or offline as a Bedrock batch inference
+(model invocation) job. Both paths append one JSON line per user to
+emails.jsonl in the run directory; a rerun on the same directory skips users
+that already have an email, so an interrupted segment resumes where it stopped.
+run_local_batch is a stand-in for the batch service that reads and writes the
+same JSONL formats, for trying the offline path without an AWS account.
+run_draft_translate writes one draft per item set and translates it per
+language instead of writing every email from scratch.
+"""
+import datetime
+import json
+import logging
+import os
+import re
+import time
+from argparse import ArgumentParser
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from src.utils import bedrock_scheduler, bedrockHelper, client_registry, item_index, prompts, step_memo, user_profiles
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+RUNS_DIR = f"{os.getcwd()}/temp/email_batch"
+EMAIL_PARAMS = {
+    "model_id": "anthropic.claude-3-sonnet-20240229-v1:0",
+    "max_tokens": 2000,
+    "temperature": 0.5,
+    "top_p": 0.999,
+    "top_k": 268,
+    "seed": 45,
+    "cfg_scale": 10,
+    "steps": 30,
+    "num_images": 1,
+    "style_preset": "photographic",
+    "weight": 1.0,
+    "image_strength": 0.5,
+    "resample_filter": "lanczos",
+    "use_cache": False,
+    "bypass_cache": False,
+    "reuse_steps": False,
+}
+DEFAULT_CONCURRENCY = 8
+# write checkpoint.json after this many emails
+CHECKPOINT_EVERY = 100
+# on-demand USD per 1K input and output tokens
+MODEL_PRICES = {
+    "anthropic.claude-3-5-sonnet": (0.003, 0.015),
+    "anthropic.claude-3-sonnet": (0.003, 0.015),
+    "anthropic.claude-3-haiku": (0.00025, 0.00125),
+    "anthropic.claude-3-opus": (0.015, 0.075),
+}
+# batch inference is billed at half the on-demand price
+BATCH_DISCOUNT = 0.5
+# Bedrock rejects model invocation jobs with fewer records than this
+MIN_BATCH_RECORDS = 100
+BATCH_TERMINAL_STATUSES = ("Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired")
+# drafts are written in this language and need no translation call
+DRAFT_LANGUAGE = "American English"
+
+_EMAIL_RE = re.compile(r"<email>(.*?)</email>", re.DOTALL)
+
+
+def estimate_cost(model_id, input_tokens, output_tokens, batch=False):
+    """USD cost of a number of tokens on a model, 0.0 for models without a listed price."""
+    for prefix, (input_price, output_price) in MODEL_PRICES.items():
+        if model_id.startswith(prefix):
+            cost = input_tokens / 1000 * input_price + output_tokens / 1000 * output_price
+            return cost * BATCH_DISCOUNT if batch else cost
+    return 0.0
+
+
+def extract_email(text):
+    """The email between <email> tags, or the whole response when the model left them out."""
+    emails = [email.strip() for email in _EMAIL_RE.findall(text) if email.strip()]
+    return emails[-1] if emails else text.strip()
+
+
+def build_records(users):
+    """
+    Prompts for a segment, one per user, with each group's item table built once.
+    Args:
+        users (list): Profile dicts as produced by user_profiles.generate_users.
+    Returns:
+        (records, groups): Records with record_id, user, the group's shared item table and an error when the
+            table could not be built, and the number of (domain, category, language) groups.
+            record_prompt renders each prompt when it is sent.
+    """
+    items = {}
+    groups = set()
+    records = []
+    for position, user in enumerate(users):
+        domain, category = user["fav_category"]["domain"], user["fav_category"]["category"]
+        groups.add((domain, category, user["language"]))
+        if (domain, category) not in items:
+            try:
+                items[(domain, category)] = (item_index.get_top_items(domain, category).to_html(escape=False, index=False), None)
+            except (KeyError, ValueError) as e:
+                # e.g. a catalog without the columns its domain ranks by; only this group's users fail
+                logger.error(f"No items for {domain} {category}: {e!r}")
+                items[(domain, category)] = (None, f"no items for {domain} {category}: {e!r}")
+        table, error = items[(domain, category)]
+        records.append({"record_id": f"{position:08d}", "user": user, "items": table, "error": error})
+    return records, len(groups)
+
+
+def record_prompt(record):
+    """The email prompt for one record, the same prompt the email page builds for a single user."""
+    user_html, category_html = user_profiles.profile_html(record["user"])
+    return prompts.email_prompt(user_html, category_html, record["items"])
+
+
+def _result(record, text=None, input_tokens=0, output_tokens=0, seconds=0.0, error=None):
+    user = record["user"]
+    return {
+        "record_id": record["record_id"],
+        "user_id": user.get("user_id"),
+        "name": user.get("name"),
+        "language": user.get("language"),
+        "domain": user["fav_category"]["domain"],
+        "category": user["fav_category"]["category"],
+        "email": extract_email(text) if text else None,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "seconds": seconds,
+        "error": error,
+    }
+
+
+def _completed(emails_path):
+    # record ids that already have an email; failed records are retried
+    done = set()
+    if os.path.exists(emails_path):
+        with open(emails_path, "r") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # a line cut short by an interrupted run
+                    continue
+                if not result.get("error"):
+                    done.add(result["record_id"])
+    return done
+
+
+def _write_json(path, value):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(value, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _run_dir(users, output_dir):
+    output_dir = output_dir or os.path.join(RUNS_DIR, datetime.datetime.now().strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(output_dir, exist_ok=True)
+    users_path = os.path.join(output_dir, "users.jsonl")
+    if users is None:
+        # resuming: the segment is whatever the interrupted run saved
+        users = user_profiles.load_users(users_path)
+    elif not os.path.exists(users_path):
+        user_profiles.write_users(users, users_path)
+    return users, output_dir
+
+
+def _summary(mode, model_id, users, groups, results, skipped, wall_seconds, batch):
+    emails = [result for result in results if not result["error"]]
+    input_tokens = sum(result["input_tokens"] for result in emails)
+    output_tokens = sum(result["output_tokens"] for result in emails)
+    cost = estimate_cost(model_id, input_tokens, output_tokens, batch)
+    return {
+        "mode": mode,
+        "model_id": model_id,
+        "users": users,
+        "groups": groups,
+        "emails": len(emails),
+        "failed": len(results) - len(emails),
+        "already_done": skipped,
+        "wall_seconds": wall_seconds,
+        "emails_per_minute": len(emails) / wall_seconds * 60 if wall_seconds else 0.0,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": cost,
+        "cost_per_email": cost / len(emails) if emails else 0.0,
+    }
+
+
+def invoke_email(prompt, params, profile):
+    """
+    Generate one email on demand, queued behind interactive page traffic.
+    Returns:
+        (text, input_tokens, output_tokens): The model's reply and its token usage.
+    """
+    response, error = bedrockHelper.build_request(prompt, [], profile, params=params, priority=bedrock_scheduler.BATCH)
+    if error:
+        raise RuntimeError(error.get("Message", str(error)))
+    return response["content"][0]["text"], response["usage"]["input_tokens"], response["usage"]["output_tokens"]
+
+
+def run_email_batch(users=None, output_dir=None, params=None, profile="default", concurrency=DEFAULT_CONCURRENCY, invoke=invoke_email):
+    """
+    Generate emails for a segment with concurrent on-demand calls.
+    Args:
+        users (list): Profile dicts; None resumes the segment saved in output_dir.
+        output_dir (str): Run directory, defaults to temp/email_batch/<timestamp>.
+        params (dict): Inference parameters, defaults to EMAIL_PARAMS.
+        concurrency (int): Calls in flight at once.
+        invoke (callable): (prompt, params, profile) -> (text, input_tokens, output_tokens).
+    Returns:
+        summary (dict): Counts, emails per minute and cost per email, also written to summary.json.
+    """
+    params = params or EMAIL_PARAMS
+    users, output_dir = _run_dir(users, output_dir)
+    emails_path = os.path.join(output_dir, "emails.jsonl")
+    records, groups = build_records(users)
+    done = _completed(emails_path)
+    todo = [record for record in records if record["record_id"] not in done]
+    logger.info(f"{len(todo)} of {len(records)} emails to generate in {groups} groups")
+
+    def generate(record):
+        start = time.perf_counter()
+        if record["error"]:
+            return _result(record, error=record["error"])
+        try:
+            text, input_tokens, output_tokens = invoke(record_prompt(record), params, profile)
+        except Exception as e:
+            logger.error(f"Email for record {record['record_id']} failed: {e}")
+            return _result(record, seconds=time.perf_counter() - start, error=str(e))
+        return _result(record, text, input_tokens, output_tokens, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = []
+    with open(emails_path, "a") as out, ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="email-batch") as executor:
+        pending = set()
+        queue = iter(todo)
+        # keep at most two calls per worker queued so 50K records never sit in memory as futures
+        while True:
+            for record in queue:
+                pending.add(executor.submit(generate, record))
+                if len(pending) >= 2 * concurrency:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                out.write(json.dumps(result) + "\n")
+                results.append(result)
+            out.flush()
+            if len(results) // CHECKPOINT_EVERY != (len(results) - len(finished)) // CHECKPOINT_EVERY:
+                _write_json(os.path.join(output_dir, "checkpoint.json"), _summary(
+                    "online", params["model_id"], len(records), groups, results, len(done), time.perf_counter() - start, False
+                ))
+    summary = _summary("online", params["model_id"], len(records), groups, results, len(done), time.perf_counter() - start, False)
+    _write_json(os.path.join(output_dir, "summary.json"), summary)
+    return summary
+
+
+def _memoized_call(step, prompt, params, profile, invoke):
+    # drafts and translations are reused across runs for an unchanged prompt, model and parameters
+    memo = step_memo.get_memo()
+    fp = step_memo.fingerprint(step, prompt, params["model_id"], params)
+    cached = memo.get(step, fp)
+    if cached is not None:
+        return dict(cached, cached=True)
+    start = time.perf_counter()
+    text, input_tokens, output_tokens = invoke(prompt, params, profile)
+    output = {"text": extract_email(text), "input_tokens": input_tokens, "output_tokens": output_tokens}
+    memo.put(step, fp, output, time.perf_counter() - start)
+    return dict(output, cached=False)
+
+
+def run_draft_translate(users=None, output_dir=None, params=None, profile="default", concurrency=DEFAULT_CONCURRENCY, invoke=invoke_email):
+    """
+    Generate a segment's emails from one canonical draft per item set.
+    Each (domain, category) gets one full storytelling call in DRAFT_LANGUAGE; every other language in the
+    group gets a short translation call started as soon as its draft lands. Drafts and translations are memoized
+    by step_memo, so a translation is cached per draft hash and language. The reader's name is filled into
+    prompts.NAME_PLACEHOLDER afterwards; the rest of the profile does not change the email in this mode.
+    Args and Returns:
+        As run_email_batch; each result also carries the draft_hash it was translated from,
+        and tokens are the user's share of the calls behind their email.
+    """
+    params = params or EMAIL_PARAMS
+    users, output_dir = _run_dir(users, output_dir)
+    emails_path = os.path.join(output_dir, "emails.jsonl")
+    records, groups = build_records(users)
+    done = _completed(emails_path)
+    todo = [record for record in records if record["record_id"] not in done]
+    item_sets = {}
+    for record in todo:
+        fav = record["user"]["fav_category"]
+        item_sets.setdefault((fav["domain"], fav["category"]), []).append(record)
+    logger.info(f"{len(todo)} emails from {len(item_sets)} drafts")
+
+    start = time.perf_counter()
+    calls = {"drafts": 0, "translations": 0, "cache_hits": 0}
+    emails = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="email-translate") as executor:
+        drafts = {}
+        for key, members in item_sets.items():
+            if members[0]["error"]:
+                continue
+            category_html = user_profiles.profile_html(members[0]["user"])[1]
+            prompt = prompts.email_draft_prompt(category_html, members[0]["items"])
+            drafts[executor.submit(_memoized_call, "email_draft", prompt, params, profile, invoke)] = key
+        translations = {}
+        for future in as_completed(drafts):
+            key = drafts[future]
+            try:
+                draft = future.result()
+            except Exception as e:
+                logger.error(f"Draft for {key} failed: {e}")
+                emails[key, None] = (None, str(e))
+                continue
+            calls["drafts"] += 1
+            calls["cache_hits"] += draft["cached"]
+            draft_hash = step_memo.artifact_hash(draft["text"])
+            emails[key, DRAFT_LANGUAGE] = (dict(draft, draft_hash=draft_hash, calls=[draft]), None)
+            for language in {record["user"]["language"] for record in item_sets[key]} - {DRAFT_LANGUAGE}:
+                prompt = prompts.email_translation_prompt(draft["text"], language)
+                translations[executor.submit(_memoized_call, "email_translation", prompt, params, profile, invoke)] = (key, language, draft, draft_hash)
+        for future in as_completed(translations):
+            key, language, draft, draft_hash = translations[future]
+            try:
+                translation = future.result()
+            except Exception as e:
+                logger.error(f"{language} translation for {key} failed: {e}")
+                emails[key, language] = (None, str(e))
+                continue
+            calls["translations"] += 1
+            calls["cache_hits"] += translation["cached"]
+            emails[key, language] = (dict(translation, draft_hash=draft_hash, calls=[draft, translation]), None)
+
+    # a call's tokens are shared by every user whose email it produced; memo hits cost nothing this run
+    sharing = {}
+    for key, members in item_sets.items():
+        for record in members:
+            sharing[key, record["user"]["language"]] = sharing.get((key, record["user"]["language"]), 0) + 1
+    draft_users = {key: len(members) for key, members in item_sets.items()}
+
+    def share(email, key, language):
+        input_tokens = output_tokens = 0.0
+        for i, call in enumerate(email["calls"]):
+            if call["cached"]:
+                continue
+            # the draft serves the whole item set, a translation only its language
+            users_served = draft_users[key] if i == 0 else sharing[key, language]
+            input_tokens += call["input_tokens"] / users_served
+            output_tokens += call["output_tokens"] / users_served
+        return input_tokens, output_tokens
+
+    results = []
+    with open(emails_path, "a") as out:
+        for key, members in item_sets.items():
+            for record in members:
+                language = record["user"]["language"]
+                email, error = emails.get((key, language)) or emails.get((key, None)) or (None, record["error"] or "no draft")
+                if email is None:
+                    result = _result(record, error=error)
+                else:
+                    input_tokens, output_tokens = share(email, key, language)
+                    text = email["text"].replace(prompts.NAME_PLACEHOLDER, str(record["user"].get("name", "")))
+                    result = dict(_result(record, text, input_tokens, output_tokens), draft_hash=email["draft_hash"])
+                out.write(json.dumps(result) + "\n")
+                results.append(result)
+    summary = _summary("draft-translate", params["model_id"], len(records), groups, results, len(done), time.perf_counter() - start, False)
+    summary.update(calls)
+    _write_json(os.path.join(output_dir, "summary.json"), summary)
+    return summary
+
+
+def model_input(prompt, params):
+    """Request body for one record of a batch inference job, the same body invoke_model gets."""
+    return {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": params["max_tokens"],
+        "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}],
+        "temperature": params["temperature"],
+        "top_p": params["top_p"],
+        "top_k": params["top_k"],
+    }
+
+
+def write_batch_input(records, path, params):
+    """Write records in the model invocation job input format: recordId and modelInput per line."""
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps({"recordId": record["record_id"], "modelInput": model_input(record_prompt(record), params)}) + "\n")
+    return path
+
+
+def parse_batch_output(path):
+    """
+    Read a model invocation job output file.
+    Returns:
+        outputs (dict): recordId -> (text, input_tokens, output_tokens, error).
+    """
+    outputs = {}
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            output = json.loads(line)
+            if output.get("error"):
+                outputs[output["recordId"]] = (None, 0, 0, str(output["error"]))
+                continue
+            body = output["modelOutput"]
+            outputs[output["recordId"]] = (
+                body["content"][0]["text"], body["usage"]["input_tokens"], body["usage"]["output_tokens"], None
+            )
+    return outputs
+
+
+def _stand_in_response(body):
+    prompt = body["messages"][0]["content"][0]["text"]
+    text = f"<email>\nStand-in email for a {len(prompt)} character prompt.\n</email>"
+    return {
+        "type": "message",
+        "role": "assistant",
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4},
+    }
+
+
+def run_local_batch(input_path, output_path, respond=_stand_in_response):
+    """
+    Stand-in for the batch inference service: read a job input file and write the output file Bedrock would.
+    Args:
+        respond (callable): modelInput dict -> modelOutput dict; the default returns a canned email.
+    """
+    with open(input_path, "r") as f, open(output_path, "w") as out:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            try:
+                output = dict(record, modelOutput=respond(record["modelInput"]))
+            except Exception as e:
+                output = dict(record, error={"errorCode": 500, "errorMessage": str(e)})
+            out.write(json.dumps(output) + "\n")
+    return output_path
+
+
+def submit_batch_job(input_path, s3_prefix, role_arn, model_id, profile="default", job_name=None):
+    """
+    Upload a job input file and start a model invocation job.
+    Args:
+        s3_prefix (str): s3://bucket/prefix the input is uploaded under and the output is written to.
+        role_arn (str): Service role Bedrock assumes to read and write the bucket.
+    Returns:
+        job_arn (str): The started job.
+    """
+    bucket, _, prefix = s3_prefix.removeprefix("s3://").partition("/")
+    job_name = job_name or f"email-batch-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    job_prefix = f"{prefix.strip('/')}/{job_name}".lstrip("/")
+    key = f"{job_prefix}/input/{os.path.basename(input_path)}"
+    client_registry.get_client("s3", profile).upload_file(input_path, bucket, key)
+    response = client_registry.get_client("bedrock", profile).create_model_invocation_job(
+        jobName=job_name,
+        roleArn=role_arn,
+        modelId=model_id,
+        inputDataConfig={"s3InputDataConfig": {"s3Uri": f"s3://{bucket}/{key}"}},
+        outputDataConfig={"s3OutputDataConfig": {"s3Uri": f"s3://{bucket}/{job_prefix}/output/"}},
+    )
+    logger.info(f"Started batch inference job {response['jobArn']}")
+    return response["jobArn"]
+
+
+def wait_batch_job(job_arn, profile="default", poll_seconds=60):
+    """Poll a model invocation job until it finishes and return its description."""
+    bedrock = client_registry.get_client("bedrock", profile)
+    while True:
+        job = bedrock.get_model_invocation_job(jobIdentifier=job_arn)
+        if job["status"] in BATCH_TERMINAL_STATUSES:
+            logger.info(f"Batch inference job {job_arn} finished: {job['status']}")
+            return job
+        time.sleep(poll_seconds)
+
+
+def download_batch_output(job, output_path, profile="default"):
+    """Fetch a finished job's output file, written by Bedrock as <output uri>/<job id>/<input name>.out."""
+    input_name = os.path.basename(job["inputDataConfig"]["s3InputDataConfig"]["s3Uri"])
+    bucket, _, prefix = job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"].removeprefix("s3://").partition("/")
+    key = f"{prefix.rstrip('/')}/{job['jobArn'].rsplit('/', 1)[-1]}/{input_name}.out".lstrip("/")
+    client_registry.get_client("s3", profile).download_file(bucket, key, output_path)
+    return output_path
+
+
+def _pending_job(checkpoint_path):
+    # a job submitted by an interrupted run whose output was never collected
+    try:
+        with open(checkpoint_path, "r") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get("job_arn") and not checkpoint.get("collected"):
+        return checkpoint["job_arn"]
+    return None
+
+
+def run_batch_inference(users=None, output_dir=None, params=None, profile="default", s3_prefix=None, role_arn=None, local=False):
+    """
+    Generate emails for a segment offline with one Bedrock batch inference job.
+    Users that already have an email in output_dir are left out of the job. No job is submitted when nothing is
+    left to send, and fewer than MIN_BATCH_RECORDS records are generated with run_email_batch instead.
+    The job ARN is checkpointed, so resuming an interrupted run waits on that job instead of submitting another.
+    Records of a job that ends Failed, Stopped or Expired are written as errors and retried on the next run.
+    Args:
+        s3_prefix (str), role_arn (str): Where the job reads and writes, required unless local.
+        local (bool): Run the job with run_local_batch instead of Bedrock.
+    Returns:
+        summary (dict): Counts, emails per minute and cost per email at batch pricing, also written to summary.json.
+    """
+    params = params or EMAIL_PARAMS
+    users, output_dir = _run_dir(users, output_dir)
+    emails_path = os.path.join(output_dir, "emails.jsonl")
+    records, groups = build_records(users)
+    done = _completed(emails_path)
+    todo = [record for record in records if record["record_id"] not in done]
+    sendable = [record for record in todo if not record["error"]]
+    checkpoint_path = os.path.join(output_dir, "checkpoint.json")
+    job_arn = None if local else _pending_job(checkpoint_path)
+    if not local and not job_arn and 0 < len(sendable) < MIN_BATCH_RECORDS:
+        # Bedrock rejects the job, so a small remainder goes through the on-demand path instead
+        logger.warning(f"Only {len(sendable)} records, Bedrock needs at least {MIN_BATCH_RECORDS} per job; generating them on demand")
+        return run_email_batch(users, output_dir, params, profile)
+
+    start = time.perf_counter()
+    output_path = os.path.join(output_dir, "batch_input.jsonl.out")
+    outputs = {}
+    missing = "missing from job output"
+    if not sendable:
+        # nothing left to generate; no job is submitted
+        logger.info(f"No records to send, {len(done)} emails already done")
+        job_arn = None
+    elif local:
+        input_path = write_batch_input(sendable, os.path.join(output_dir, "batch_input.jsonl"), params)
+        outputs = parse_batch_output(run_local_batch(input_path, output_path))
+    else:
+        if job_arn:
+            logger.info(f"Resuming batch inference job {job_arn}")
+        else:
+            input_path = write_batch_input(sendable, os.path.join(output_dir, "batch_input.jsonl"), params)
+            job_arn = submit_batch_job(input_path, s3_prefix, role_arn, params["model_id"], profile)
+            _write_json(checkpoint_path, {"job_arn": job_arn, "records": len(todo)})
+        job = wait_batch_job(job_arn, profile)
+        if job["status"] in ("Completed", "PartiallyCompleted"):
+            outputs = parse_batch_output(download_batch_output(job, output_path, profile))
+        else:
+            # no output file is written for these; every record is an error and is retried next run
+            missing = f"batch job {job['status']}: {job.get('message', 'no message')}"
+            logger.error(f"Batch inference job {job_arn} ended {job['status']}")
+
+    results = []
+    with open(emails_path, "a") as out:
+        for record in todo:
+            text, input_tokens, output_tokens, error = outputs.get(record["record_id"], (None, 0, 0, record["error"] or missing))
+            result = _result(record, text, input_tokens, output_tokens, error=error)
+            out.write(json.dumps(result) + "\n")
+            results.append(result)
+    if job_arn:
+        # the job's output is in emails.jsonl now; the next run submits a new job for what is left
+        _write_json(checkpoint_path, {"job_arn": job_arn, "records": len(todo), "status": job["status"], "collected": True})
+    summary = _summary("local-batch" if local else "batch", params["model_id"], len(records), groups, results, len(done),
+                       time.perf_counter() - start, True)
+    _write_json(os.path.join(output_dir, "summary.json"), summary)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Generate personalized emails for a user segment")
+    parser.add_argument("--users", default=None, help="JSONL file of user profiles, or a population Parquet file")
+    parser.add_argument("--limit", type=int, default=None, help="Only the first this many profiles of --users")
+    parser.add_argument("--generate", type=int, default=None, help="Generate this many random profiles instead")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for --generate")
+    parser.add_argument("--output", default=None, help="Run directory; an existing one is resumed")
+    parser.add_argument("--mode", default="online", choices=["online", "draft-translate", "batch", "local-batch"])
+    parser.add_argument("--model", default=EMAIL_PARAMS["model_id"], help="Claude model id")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Calls in flight in online mode")
+    parser.add_argument("--s3-prefix", default=None, help="s3://bucket/prefix for batch mode")
+    parser.add_argument("--role-arn", default=None, help="Service role for batch mode")
+    parser.add_argument("--profile", default="default", help="AWS CLI profile name")
+    args = parser.parse_args()
+    if not (args.users or args.generate or args.output):
+        parser.error("pass --users or --generate, or --output to resume a run")
+    if args.users:
+        users = user_profiles.load_users(args.users, args.limit)
+    elif args.generate:
+        users = user_profiles.generate_users(args.generate, args.seed)
+    else:
+        users = None
+    params = dict(EMAIL_PARAMS, model_id=args.model)
+    if args.mode == "online":
+        summary = run_email_batch(users, args.output, params, args.profile, args.concurrency)
+    elif args.mode == "draft-translate":
+        summary = run_draft_translate(users, args.output, params, args.profile, args.concurrency)
+    else:
+        summary = run_batch_inference(users, args.output, params, args.profile, args.s3_prefix, args.role_arn, local=args.mode == "local-batch")
+    print(json.dumps(summary, indent=2))
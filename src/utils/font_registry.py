@@ -0,0 +1,188 @@
+"""
+Font discovery and text layout cache for ad composition.
+
+Fonts are looked up once per process from AD_FONT_PATH, a list of preferred
+faces and the usual macOS and Linux font directories, then each (face, size)
+is loaded once. Text measurement and line wrapping are memoized per
+(text, font, max width), and the registry keeps the time spent on misses so
+it can estimate how much composition time the cache saved.
+"""
+import glob
+import logging
+import os
+import threading
+import time
+from PIL import ImageFont
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# tried in order, the first existing file wins
+PREFERRED_FONTS = (
+    "/System/Library/Fonts/NewYork.ttf",
+    "DejaVuSerif.ttf",
+    "LiberationSerif-Regular.ttf",
+    "NotoSerif-Regular.ttf",
+    "DejaVuSans.ttf",
+    "LiberationSans-Regular.ttf",
+    "NotoSans-Regular.ttf",
+)
+FONT_DIRS = (
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    os.path.expanduser("~/.fonts"),
+    os.path.expanduser("~/.local/share/fonts"),
+    "/System/Library/Fonts",
+    "/Library/Fonts",
+)
+MAX_LAYOUT_ENTRIES = 16384
+
+
+def discover_fonts(font_dirs=FONT_DIRS):
+    """
+    Index the TrueType and OpenType fonts installed on this machine.
+    Returns:
+        fonts (dict): File name -> full path, first directory wins.
+    """
+    fonts = {}
+    for font_dir in font_dirs:
+        for pattern in ("*.ttf", "*.otf", "*.ttc"):
+            for path in glob.glob(os.path.join(font_dir, "**", pattern), recursive=True):
+                fonts.setdefault(os.path.basename(path), path)
+    return fonts
+
+
+def resolve_font_path(font_path=None, font_dirs=FONT_DIRS):
+    """
+    Pick the font file to draw ads with.
+    Args:
+        font_path (str): Explicit path or file name; falls back to AD_FONT_PATH, then PREFERRED_FONTS.
+    Returns:
+        path (str): Path of an existing font file, or None when only PIL's built-in font is available.
+    """
+    installed = None
+    for candidate in (font_path, os.environ.get("AD_FONT_PATH"), *PREFERRED_FONTS):
+        if not candidate:
+            continue
+        if os.path.isfile(candidate):
+            return candidate
+        if installed is None:
+            installed = discover_fonts(font_dirs)
+        if os.path.basename(candidate) in installed:
+            return installed[os.path.basename(candidate)]
+    installed = installed if installed is not None else discover_fonts(font_dirs)
+    if installed:
+        return next(iter(sorted(installed.values())))
+    return None
+
+
+class FontRegistry:
+    def __init__(self, max_entries=MAX_LAYOUT_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._paths = {}
+        self._fonts = {}
+        self._layout = {}
+        self._stats = {"font_loads": 0, "font_hits": 0, "load_seconds": 0.0,
+                       "layout_misses": 0, "layout_hits": 0, "layout_seconds": 0.0}
+
+    def font_path(self, font_path=None):
+        """Resolved font file for a requested path, discovered once per process."""
+        with self._lock:
+            if font_path in self._paths:
+                return self._paths[font_path]
+        path = resolve_font_path(font_path)
+        if path is None:
+            logger.warning("No TrueType font found, using PIL's built-in font")
+        elif font_path and path != font_path:
+            logger.info(f"Font {font_path} not found, using {path}")
+        with self._lock:
+            self._paths[font_path] = path
+        return path
+
+    def get_font(self, size, font_path=None):
+        """Load a (face, size) once per process."""
+        path = self.font_path(font_path)
+        key = (path, size)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._stats["font_hits"] += 1
+                return font
+        start = time.perf_counter()
+        font = ImageFont.truetype(path, size) if path else ImageFont.load_default(size)
+        with self._lock:
+            self._fonts[key] = font
+            self._stats["font_loads"] += 1
+            self._stats["load_seconds"] += time.perf_counter() - start
+        return font
+
+    def _cached(self, key, compute):
+        with self._lock:
+            value = self._layout.get(key)
+            if value is not None:
+                self._stats["layout_hits"] += 1
+                return value
+        start = time.perf_counter()
+        value = compute()
+        with self._lock:
+            if len(self._layout) >= self.max_entries:
+                self._layout.clear()
+            self._layout[key] = value
+            self._stats["layout_misses"] += 1
+            self._stats["layout_seconds"] += time.perf_counter() - start
+        return value
+
+    def measure(self, text, font):
+        """(width, height) of a single line, the extent draw.textbbox((0, 0), text, font) reports."""
+        return self._cached(("measure", text, font), lambda: tuple(font.getbbox(text)[2:]))
+
+    def line_height(self, font):
+        """Baseline to baseline distance for wrapped lines."""
+        return self._cached(("line_height", font), lambda: sum(font.getmetrics()))
+
+    def wrap(self, text, font, max_width):
+        """
+        Break text into lines no wider than max_width, splitting on spaces.
+        A single word wider than max_width keeps its own line.
+        Returns:
+            lines (tuple): The wrapped lines.
+        """
+        def compute():
+            lines = []
+            for paragraph in text.split("\n"):
+                line = ""
+                for word in paragraph.split(" "):
+                    candidate = f"{line} {word}" if line else word
+                    if line and self.measure(candidate, font)[0] > max_width:
+                        lines.append(line)
+                        line = word
+                    else:
+                        line = candidate
+                lines.append(line)
+            return tuple(lines)
+        return self._cached(("wrap", text, font, max_width), compute)
+
+    def stats(self):
+        """
+        Cache counters for this process.
+        saved_seconds estimates the time hits avoided from the average cost of loads and misses.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        avg_load = stats["load_seconds"] / stats["font_loads"] if stats["font_loads"] else 0.0
+        avg_layout = stats["layout_seconds"] / stats["layout_misses"] if stats["layout_misses"] else 0.0
+        stats["saved_seconds"] = stats["font_hits"] * avg_load + stats["layout_hits"] * avg_layout
+        return stats
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide font registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = FontRegistry()
+    return _registry
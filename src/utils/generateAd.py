@@ -1,69 +1,383 @@
 # sample program generated by bedrock hosted LLM edited to to take inputs
 # change this as needed like passing the array of headline, ad_copy, cta, ad_image_in
 # to generate multiple combinations of the ads in one shot
+import datetime
+import itertools
+import json
+import logging
 import os
-from PIL import Image, ImageDraw, ImageFont
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from PIL import Image, ImageDraw
+from src.utils import font_registry, output_encoder
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
 
-def generate_ad_image(headline, ad_copy, cta, image, brand = None):
-    # change below as needed
-    path="assets"
-    # ad_image_in = f"{path}/generated_images/generated_image.png"
-    ad_image_in = image
-    ad_image_out = f"{path}/generated_ads/generated_ad.png"
+# change this as needed
+ASSETS_DIR = "assets"
+FONT_PATH = None  # None picks the first installed font in font_registry.PREFERRED_FONTS, or set AD_FONT_PATH
+AD_WIDTH, AD_HEIGHT = 720, 1000
+BG_COLOR = (255, 255, 255)  # White background
+TEXT_COLOR = (0, 0, 0)
+HEADLINE_SIZE, BODY_SIZE, CTA_SIZE = 36, 24, 20
+# below this many ads the process pool costs more to start than it saves
+MIN_BATCH_FOR_POOL = 8
+# IAB and social sizes rendered by generate_ad_formats, name -> (width, height)
+AD_FORMATS = {
+    "half_page": (300, 600),
+    "medium_rectangle": (300, 250),
+    "leaderboard": (728, 90),
+    "square": (1080, 1080),
+    "story": (1080, 1920),
+}
+# smallest font sizes a format is allowed to shrink text to
+MIN_HEADLINE_SIZE, MIN_BODY_SIZE, MIN_CTA_SIZE = 12, 10, 10
+# formats at least this many times wider than tall use the banner layout
+BANNER_RATIO = 3
 
-    # Define the dimensions and background color
-    width, height = 720, 1000
-    bg_color = (255, 255, 255)  # White background
 
-    # Create a new image
-    ad = Image.new('RGB', (width, height), bg_color)
+def load_fonts(font_path=FONT_PATH):
+    """Headline, body and call to action fonts, loaded once per process."""
+    fonts = font_registry.get_registry()
+    return fonts.get_font(HEADLINE_SIZE, font_path), fonts.get_font(BODY_SIZE, font_path), fonts.get_font(CTA_SIZE, font_path)
 
-    # Load fonts
-    # change this as needed
-    font_path = '/System/Library/Fonts/NewYork.ttf'  # Replace with the actual font file path
 
-    headline_font = ImageFont.truetype(font_path, 36)
-    body_font = ImageFont.truetype(font_path, 24)   
-    cta_font = ImageFont.truetype(font_path, 20)
+def _draw_centered_lines(draw, lines, font, width, y):
+    # draws wrapped lines centered on the ad and returns their total height
+    fonts = font_registry.get_registry()
+    line_height = fonts.line_height(font)
+    for line in lines[:-1]:
+        draw.text(((width - fonts.measure(line, font)[0]) / 2, y), line, font=font, fill=TEXT_COLOR)
+        y += line_height
+    last_width, last_height = fonts.measure(lines[-1], font)
+    draw.text(((width - last_width) / 2, y), lines[-1], font=font, fill=TEXT_COLOR)
+    return (len(lines) - 1) * line_height + last_height
+
+
+def prepare_imagery(image, width=AD_WIDTH):
+    """Decode the ad imagery and resize it to the ad width, keeping its aspect ratio."""
+    imagery = Image.open(image) if not isinstance(image, Image.Image) else image
+    # Resize the imagery to fit the ad
+    imagery_width, imagery_height = imagery.size
+    aspect_ratio = imagery_width / imagery_height
+    new_height = int(width / aspect_ratio)
+    return imagery.resize((width, new_height))
+
+
+def compose_ad(headline, ad_copy, cta, imagery, fonts=None):
+    """
+    Lay out one ad on a blank canvas.
+    Args:
+        imagery (Image): Imagery already sized by prepare_imagery.
+        fonts (tuple): Headline, body and CTA fonts from load_fonts.
+    Returns:
+        ad (Image): The composed 720x1000 ad.
+    """
+    width, height = AD_WIDTH, AD_HEIGHT
+    headline_font, body_font, cta_font = fonts or load_fonts()
+    measure = font_registry.get_registry().measure
+
+    # Create a new image
+    ad = Image.new('RGB', (width, height), BG_COLOR)
 
     # Create a drawing object
     draw = ImageDraw.Draw(ad)
 
     # Draw the headline
     # change this as needed
-    headline_width, headline_height = draw.textbbox((0, 0), headline, font=headline_font)[2:]
+    headline_width, headline_height = measure(headline, headline_font)
     headline_x = (width - headline_width) / 2
     headline_y = 50
-    draw.text((headline_x, headline_y), headline, font=headline_font, fill=(0, 0, 0))
+    draw.text((headline_x, headline_y), headline, font=headline_font, fill=TEXT_COLOR)
 
     # Draw the ad copy
     # change this as needed
-    ad_copy_width, ad_copy_height = draw.textbbox((0, 0), ad_copy, font=body_font)[2:]
-    ad_copy_x = (width - ad_copy_width) / 2
+    # long copy wraps instead of running off the canvas
     ad_copy_y = headline_y + headline_height + 30
-    draw.text((ad_copy_x, ad_copy_y), ad_copy, font=body_font, fill=(0, 0, 0))
+    ad_copy_lines = font_registry.get_registry().wrap(ad_copy, body_font, width - 60)
+    ad_copy_height = _draw_centered_lines(draw, ad_copy_lines, body_font, width, ad_copy_y)
 
     # Draw the call to action
     # change this as needed
-    cta_width, cta_height = draw.textbbox((0, 0), cta, font=cta_font)[2:]
+    cta_width, cta_height = measure(cta, cta_font)
     cta_x = (width - cta_width) / 2
     cta_y = height - cta_height - 50
-    draw.text((cta_x, cta_y), cta, font=cta_font, fill=(0, 0, 0))
-
-    # Open the imagery
-    imagery = Image.open(ad_image_in)
-
-    # Resize the imagery to fit the ad
-    imagery_width, imagery_height = imagery.size
-    aspect_ratio = imagery_width / imagery_height
-    new_height = int(width / aspect_ratio)
-    imagery = imagery.resize((width, new_height))
+    draw.text((cta_x, cta_y), cta, font=cta_font, fill=TEXT_COLOR)
 
     # Paste the imagery onto the ad
     imagery_x = 0
     imagery_y = ad_copy_y + ad_copy_height + 30
     ad.paste(imagery, (imagery_x, imagery_y))
+    return ad
+
+
+def generate_ad_image(headline, ad_copy, cta, image, brand = None, ad_image_out = None, policy = None):
+    # change below as needed
+    # ad_image_in = f"{ASSETS_DIR}/generated_images/generated_image.png"
+    ad_image_in = image
+    # callers running several ads at once pass their own output path
+    ad_image_out = ad_image_out or f"{ASSETS_DIR}/generated_ads/generated_ad.png"
+    ad_image_stem, extension = os.path.splitext(ad_image_out)
+    # the output path's extension picks the encoding unless a policy is given; the returned path follows the policy
+    policy = policy or next(
+        (name for name, spec in output_encoder.POLICIES.items() if spec["extension"] == extension.lower().replace(".jpeg", ".jpg")), output_encoder.MASTER_POLICY
+    )
+
+    fonts = font_registry.get_registry()
+    saved = fonts.stats()["saved_seconds"]
+    ad = compose_ad(headline, ad_copy, cta, prepare_imagery(ad_image_in))
+    logger.info(f"Font and layout cache saved {fonts.stats()['saved_seconds'] - saved:.4f} s on this ad")
 
     # Save the ad
     # change this as needed
-    ad.save(ad_image_out)
\ No newline at end of file
+    return output_encoder.save(ad, ad_image_stem, policy)
+
+
+# per-worker state for generate_ad_batch, set once by _init_batch_worker
+_batch_imagery = None
+_batch_fonts = None
+
+
+def _init_batch_worker(imagery, font_path):
+    global _batch_imagery, _batch_fonts
+    _batch_imagery = imagery
+    _batch_fonts = load_fonts(font_path)
+
+
+def _render_batch_ad(job):
+    start = time.perf_counter()
+    fonts = font_registry.get_registry()
+    saved = fonts.stats()["saved_seconds"]
+    ad = compose_ad(job["headline"], job["ad_copy"], job["cta"], _batch_imagery[job["image_index"]], _batch_fonts)
+    layout_saved = fonts.stats()["saved_seconds"] - saved
+    output_encoder.save(ad, job["file_stem"], job["policy"])
+    return dict(job, seconds=time.perf_counter() - start, layout_saved_seconds=layout_saved)
+
+
+def generate_ad_batch(headlines, ad_copies, ctas, images, brand=None, output_dir=None, processes=None, font_path=FONT_PATH,
+                      policy=output_encoder.DEFAULT_POLICY):
+    """
+    Render every headline x ad copy x CTA x image combination.
+    Each image is decoded and resized once, and each worker process loads the fonts once.
+    Args:
+        headlines, ad_copies, ctas (list): Text variants.
+        images (list): Paths of the imagery to combine with the text.
+        output_dir (str): Defaults to assets/generated_ads/batch_<timestamp>.
+        processes (int): Worker processes, None for one per CPU.
+        policy (str): Output encoding, one of output_encoder.POLICIES.
+    Returns:
+        manifest (dict): One entry per ad with its file and the variants used, also written to manifest.json.
+    """
+    start = time.perf_counter()
+    output_dir = output_dir or f"{ASSETS_DIR}/generated_ads/batch_{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    os.makedirs(output_dir, exist_ok=True)
+    imagery = [prepare_imagery(image) for image in images]
+    jobs = []
+    for (h, headline), (c, ad_copy), (a, cta), (i, image) in itertools.product(
+        enumerate(headlines), enumerate(ad_copies), enumerate(ctas), enumerate(images)
+    ):
+        jobs.append({
+            "file": output_encoder.output_path(os.path.join(output_dir, f"ad_h{h}_c{c}_a{a}_i{i}"), policy),
+            "file_stem": os.path.join(output_dir, f"ad_h{h}_c{c}_a{a}_i{i}"),
+            "policy": policy,
+            "headline": headline,
+            "ad_copy": ad_copy,
+            "cta": cta,
+            "image": image,
+            "image_index": i,
+        })
+    if len(jobs) < MIN_BATCH_FOR_POOL or processes == 1:
+        _init_batch_worker(imagery, font_path)
+        ads = [_render_batch_ad(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_batch_worker, initargs=(imagery, font_path)) as executor:
+            ads = list(executor.map(_render_batch_ad, jobs, chunksize=max(1, len(jobs) // (4 * (processes or os.cpu_count() or 1)))))
+    manifest = {
+        "brand": brand,
+        "created_at": datetime.datetime.now().isoformat(),
+        "wall_seconds": time.perf_counter() - start,
+        "layout_saved_seconds": sum(ad["layout_saved_seconds"] for ad in ads),
+        "ads": [{k: v for k, v in ad.items() if k not in ("image_index", "file_stem", "policy")} for ad in ads],
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def build_pyramid(imagery, min_size):
+    """
+    Decode the imagery once and halve it until the next level would be smaller than min_size.
+    Every format then resizes from the closest level instead of from the full size original.
+    Args:
+        imagery (str or Image): Path or decoded image.
+        min_size (tuple): Smallest (width, height) any format needs from the imagery.
+    Returns:
+        pyramid (list): Images from the original size down, each half the previous one.
+    """
+    level = Image.open(imagery) if not isinstance(imagery, Image.Image) else imagery
+    level = level.convert("RGB")
+    pyramid = [level]
+    while level.width // 2 >= min_size[0] and level.height // 2 >= min_size[1]:
+        level = level.reduce(2)
+        pyramid.append(level)
+    return pyramid
+
+
+def _fit_imagery(pyramid, size):
+    # cover the box: scale to fill it and crop the overflow evenly on both sides
+    width, height = size
+    level = pyramid[0]
+    for candidate in pyramid:
+        if candidate.width >= width and candidate.height >= height:
+            level = candidate
+    scale = max(width / level.width, height / level.height)
+    crop_width, crop_height = width / scale, height / scale
+    left, top = (level.width - crop_width) / 2, (level.height - crop_height) / 2
+    return level.resize((width, height), box=(left, top, left + crop_width, top + crop_height))
+
+
+def _fit_font(text, size, min_size, max_width, font_path):
+    # largest size not above the scaled one that fits; sizes and measurements come from the shared registry
+    fonts = font_registry.get_registry()
+    font = fonts.get_font(size, font_path)
+    while size > min_size and fonts.measure(text, font)[0] > max_width:
+        size -= 1
+        font = fonts.get_font(size, font_path)
+    return font
+
+
+def layout_spec(width, height):
+    """
+    Font sizes and margins for one ad size, scaled from the 720x1000 base layout.
+    Returns:
+        spec (dict): banner, margin, gap and the headline, body and CTA font sizes.
+    """
+    banner = width >= BANNER_RATIO * height
+    # a banner's height only has room for a headline line over a CTA line
+    scale = height / 360 if banner else min(width / AD_WIDTH, height / AD_HEIGHT)
+    return {
+        "banner": banner,
+        "margin": max(4, round(50 * scale)),
+        "gap": max(4, round(30 * scale)),
+        "headline_size": max(MIN_HEADLINE_SIZE, round(HEADLINE_SIZE * scale)),
+        "body_size": max(MIN_BODY_SIZE, round(BODY_SIZE * scale)),
+        "cta_size": max(MIN_CTA_SIZE, round(CTA_SIZE * scale)),
+    }
+
+
+def compose_format(headline, ad_copy, cta, pyramid, size, font_path=FONT_PATH):
+    """
+    Lay out one ad size from the shared imagery pyramid.
+    Tall and square sizes stack headline, ad copy, imagery and CTA like compose_ad;
+    banners put the imagery on the left and the headline and CTA on the right, dropping the ad copy.
+    """
+    width, height = size
+    spec = layout_spec(width, height)
+    margin, gap = spec["margin"], spec["gap"]
+    fonts = font_registry.get_registry()
+    ad = Image.new('RGB', (width, height), BG_COLOR)
+    draw = ImageDraw.Draw(ad)
+
+    if spec["banner"]:
+        imagery_width = min(width // 3, round(height * 16 / 9))
+        ad.paste(_fit_imagery(pyramid, (imagery_width, height)), (0, 0))
+        text_x, text_width = imagery_width + gap, width - imagery_width - 2 * gap
+        headline_font = _fit_font(headline, spec["headline_size"], MIN_HEADLINE_SIZE, text_width, font_path)
+        cta_font = _fit_font(cta, spec["cta_size"], MIN_CTA_SIZE, text_width, font_path)
+        headline_height = fonts.measure(headline, headline_font)[1]
+        cta_width, cta_height = fonts.measure(cta, cta_font)
+        top = (height - headline_height - cta_height - gap // 2) / 2
+        draw.text((text_x, top), headline, font=headline_font, fill=TEXT_COLOR)
+        draw.text((width - gap - cta_width, top + headline_height + gap // 2), cta, font=cta_font, fill=TEXT_COLOR)
+        return ad
+
+    text_width = width - 2 * gap
+    headline_font = _fit_font(headline, spec["headline_size"], MIN_HEADLINE_SIZE, text_width, font_path)
+    body_font = _fit_font(ad_copy, spec["body_size"], MIN_BODY_SIZE, text_width, font_path)
+    cta_font = _fit_font(cta, spec["cta_size"], MIN_CTA_SIZE, text_width, font_path)
+
+    headline_width, headline_height = fonts.measure(headline, headline_font)
+    headline_y = margin
+    draw.text(((width - headline_width) / 2, headline_y), headline, font=headline_font, fill=TEXT_COLOR)
+
+    # copy that still overflows at the smallest size wraps
+    ad_copy_y = headline_y + headline_height + gap
+    ad_copy_height = _draw_centered_lines(draw, fonts.wrap(ad_copy, body_font, text_width), body_font, width, ad_copy_y)
+
+    cta_width, cta_height = fonts.measure(cta, cta_font)
+    cta_y = height - cta_height - margin
+    draw.text(((width - cta_width) / 2, cta_y), cta, font=cta_font, fill=TEXT_COLOR)
+
+    # the imagery fills the space between the ad copy and the CTA
+    imagery_y = ad_copy_y + ad_copy_height + gap
+    imagery_height = cta_y - gap - imagery_y
+    if imagery_height > 0:
+        ad.paste(_fit_imagery(pyramid, (width, imagery_height)), (0, imagery_y))
+    return ad
+
+
+def generate_ad_formats(headline, ad_copy, cta, image, brand=None, formats=None, output_dir=None, font_path=FONT_PATH,
+                        policy=output_encoder.DEFAULT_POLICY):
+    """
+    Render one creative in every requested ad size in a single pass.
+    The imagery is decoded once into a resize pyramid, text measurements are shared across sizes
+    and the finished ads are encoded in parallel.
+    Args:
+        image (str or Image): The ad imagery.
+        formats (dict): Name -> (width, height), defaults to AD_FORMATS.
+        output_dir (str): Defaults to assets/generated_ads/formats_<timestamp>.
+        policy (str): Output encoding, one of output_encoder.POLICIES.
+    Returns:
+        ads (dict): Format name -> path of the rendered ad, also listed in manifest.json in output_dir.
+    """
+    start = time.perf_counter()
+    formats = formats or AD_FORMATS
+    output_dir = output_dir or f"{ASSETS_DIR}/generated_ads/formats_{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    os.makedirs(output_dir, exist_ok=True)
+    # halve down to what the smallest format needs; each format picks the closest level above its own size
+    pyramid = build_pyramid(image, (min(w for w, _ in formats.values()), min(h for _, h in formats.values())))
+    rendered = {
+        name: compose_format(headline, ad_copy, cta, pyramid, size, font_path) for name, size in formats.items()
+    }
+    stems = {name: os.path.join(output_dir, f"ad_{name}_{w}x{h}") for name, (w, h) in formats.items()}
+    # PIL releases the GIL while encoding, so the writes overlap
+    with ThreadPoolExecutor(max_workers=len(rendered)) as executor:
+        ads = dict(zip(rendered, executor.map(lambda name: output_encoder.save(rendered[name], stems[name], policy), rendered)))
+    manifest = {
+        "brand": brand,
+        "created_at": datetime.datetime.now().isoformat(),
+        "wall_seconds": time.perf_counter() - start,
+        "image": image if isinstance(image, str) else None,
+        "headline": headline,
+        "ad_copy": ad_copy,
+        "cta": cta,
+        "ads": [{"format": name, "size": list(formats[name]), "file": path} for name, path in ads.items()],
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return ads
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Render every headline x ad copy x CTA x image combination")
+    parser.add_argument("--spec", required=True, help='JSON file with "headlines", "ad_copies", "ctas", "images" and optional "brand"')
+    parser.add_argument("--output", default=None, help="Output directory for the ads and manifest.json")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes, defaults to one per CPU")
+    parser.add_argument("--policy", default=output_encoder.DEFAULT_POLICY, choices=list(output_encoder.POLICIES), help="Output encoding")
+    parser.add_argument("--formats", action="store_true", help="Render the first variants in every AD_FORMATS size instead")
+    args = parser.parse_args()
+    with open(args.spec, "r") as f:
+        spec = json.load(f)
+    if args.formats:
+        ads = generate_ad_formats(
+            spec["headlines"][0], spec["ad_copies"][0], spec["ctas"][0], spec["images"][0], spec.get("brand"), output_dir=args.output,
+            policy=args.policy,
+        )
+        print("\n".join(f"{name}: {path}" for name, path in ads.items()))
+        raise SystemExit(0)
+    manifest = generate_ad_batch(
+        spec["headlines"], spec["ad_copies"], spec["ctas"], spec["images"], spec.get("brand"), args.output, args.processes,
+        policy=args.policy,
+    )
+    print(f"Rendered {len(manifest['ads'])} ads in {manifest['wall_seconds']:.2f} s")
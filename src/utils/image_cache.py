@@ -0,0 +1,162 @@
+"""
+Content-addressed cache for resized, base64-encoded request images.
+
+Entries are keyed by the source file's content hash plus everything that changes
+the encoded output (model, task type, target size, resample filter). Hot entries
+live in an in-memory LRU bounded by bytes; entries evicted from memory spill to
+an on-disk directory that is itself pruned by total size and age.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+DISK_BUDGET_BYTES = 512 * 1024 * 1024
+MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+CACHE_DIR = f"{os.getcwd()}/temp/image_cache"
+
+
+def make_key(content_hash, model_id, task_type, target_size, resample):
+    """Build the cache key for one encoded image."""
+    raw = f"{content_hash}|{model_id}|{task_type}|{target_size[0]}x{target_size[1]}|{resample}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """Two-tier LRU of (base64_str, width, height) entries."""
+    def __init__(self, memory_budget=MEMORY_BUDGET_BYTES, disk_budget=DISK_BUDGET_BYTES,
+                 max_age=MAX_AGE_SECONDS, cache_dir=CACHE_DIR):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.max_age = max_age
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "spills": 0, "disk_evictions": 0}
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached (base64_str, width, height) or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[1] <= self.max_age:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry[0]
+            if entry is not None:
+                self._drop_locked(key)
+        value = self._read_disk(key, now)
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        """Insert an entry, spilling least recently used entries to disk when over budget."""
+        spilled = []
+        with self._lock:
+            if key in self._entries:
+                self._drop_locked(key)
+            self._entries[key] = (value, time.time())
+            self._memory_bytes += len(value[0])
+            while self._memory_bytes > self.memory_budget and len(self._entries) > 1:
+                old_key, (old_value, created) = self._entries.popitem(last=False)
+                self._memory_bytes -= len(old_value[0])
+                spilled.append((old_key, old_value, created))
+            self._stats["spills"] += len(spilled)
+        for old_key, old_value, created in spilled:
+            self._write_disk(old_key, old_value, created)
+        if spilled:
+            self.prune_disk()
+
+    def _drop_locked(self, key):
+        value, _ = self._entries.pop(key)
+        self._memory_bytes -= len(value[0])
+
+    def _read_disk(self, key, now):
+        path = self._path(key)
+        try:
+            if now - os.path.getmtime(path) > self.max_age:
+                os.remove(path)
+                return None
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry["data"], entry["width"], entry["height"]
+
+    def _write_disk(self, key, value, created):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._path(key)}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"data": value[0], "width": value[1], "height": value[2]}, f)
+            os.replace(tmp_path, self._path(key))
+            os.utime(self._path(key), (created, created))
+        except OSError as e:
+            logger.error(f"Could not spill image cache entry to disk: {e}")
+
+    def prune_disk(self):
+        """Delete spilled entries older than max_age, then the oldest until under the disk budget."""
+        try:
+            names = [n for n in os.listdir(self.cache_dir) if n.endswith(".json")]
+        except OSError:
+            return
+        now = time.time()
+        files = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for mtime, size, path in files:
+            if now - mtime <= self.max_age and total <= self.disk_budget:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._stats["disk_evictions"] += evicted
+
+    def stats(self):
+        """Hit/miss counters plus the overall and memory-only hit ratios."""
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), memory_bytes=self._memory_bytes)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_hit_ratio"] = stats["memory_hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide image cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ImageCache()
+    return _cache
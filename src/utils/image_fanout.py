@@ -0,0 +1,134 @@
+"""
+Concurrent fan-out of image generation requests.
+
+A request for N images, or for a grid of seeds and cfg scales, is split into
+independent invoke_model calls that run on a bounded thread pool. A per-model
+semaphore caps how many calls hit one model at a time across all sessions in
+the process. Results are yielded as each call lands so the UI can show images
+immediately, and the wall time is reported against the summed per-call time.
+"""
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+MAX_WORKERS = 8
+# concurrent calls allowed per model family, shared by every session in the process
+MODEL_CONCURRENCY = {
+    "amazon.titan-image": 4,
+    "stability": 4,
+}
+DEFAULT_MODEL_CONCURRENCY = 2
+# Titan accepts up to 5 images per call, Stability models return one
+TITAN_MAX_IMAGES_PER_CALL = 5
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def _model_semaphore(model_id):
+    limit = next((v for k, v in MODEL_CONCURRENCY.items() if k in model_id), DEFAULT_MODEL_CONCURRENCY)
+    with _semaphores_lock:
+        semaphore = _semaphores.get(model_id)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(limit)
+            _semaphores[model_id] = semaphore
+    return semaphore
+
+
+def images_per_call(model_id):
+    """How many images one invoke_model call can return for the model."""
+    return TITAN_MAX_IMAGES_PER_CALL if "amazon.titan-image" in model_id else 1
+
+
+def plan_calls(model_id, num_images, seed, cfg_scale, seeds=None, cfg_scales=None):
+    """
+    Split a generation request into per-call parameters.
+    With seeds and/or cfg_scales, every grid cell becomes one call for min(num_images, per-call cap)
+    images. Otherwise num_images is split into calls of at most the per-call cap, each with its
+    own seed so the calls do not return duplicates.
+    Returns:
+        calls (list): Dicts with seed, cfg_scale and num_images for each call.
+    """
+    per_call = images_per_call(model_id)
+    if seeds or cfg_scales:
+        return [
+            {"seed": s, "cfg_scale": c, "num_images": min(num_images, per_call)}
+            for s, c in itertools.product(seeds or [seed], cfg_scales or [cfg_scale])
+        ]
+    calls = []
+    remaining = num_images
+    while remaining > 0:
+        count = min(remaining, per_call)
+        # seed 0 asks Stability for a random seed, keep it that way for every call;
+        # for Titan 0 is a fixed seed, so every call needs its own
+        call_seed = seed if "stability" in model_id and not seed else seed + len(calls)
+        calls.append({"seed": call_seed, "cfg_scale": cfg_scale, "num_images": count})
+        remaining -= count
+    return calls
+
+
+def parse_sweep(text, cast=int):
+    """Parse a comma separated sweep such as "1, 7, 42" into a list, skipping blanks and bad values."""
+    values = []
+    for value in (v.strip() for v in text.split(",")):
+        if not value:
+            continue
+        try:
+            values.append(cast(value))
+        except ValueError:
+            logger.warning(f"Ignoring sweep value {value!r}")
+    return values
+
+
+class FanOutResult:
+    """Outcome of one call: its index in the plan, parameters, response, error and duration."""
+    def __init__(self, index, params, response, error, seconds):
+        self.index = index
+        self.params = params
+        self.response = response
+        self.error = error
+        self.seconds = seconds
+
+
+class FanOut:
+    """
+    Runs invoke(params) -> (response, error) for every planned call and yields
+    FanOutResult objects in completion order. stats is filled in as results arrive.
+    """
+    def __init__(self, model_id, invoke, calls, max_workers=MAX_WORKERS):
+        self.model_id = model_id
+        self.invoke = invoke
+        self.calls = calls
+        self.max_workers = max_workers
+        self.stats = {"calls": len(calls), "completed": 0, "failed": 0, "wall_seconds": 0.0, "serial_seconds": 0.0, "speedup": None}
+
+    def _run(self, index, params):
+        semaphore = _model_semaphore(self.model_id)
+        with semaphore:
+            start = time.perf_counter()
+            try:
+                response, error = self.invoke(params)
+            except Exception as e:
+                logger.error(f"Fan-out call {index} failed: {e}")
+                response, error = None, {"Message": str(e)}
+            return FanOutResult(index, params, response, error, time.perf_counter() - start)
+
+    def __iter__(self):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(len(self.calls), 1))) as executor:
+            futures = [executor.submit(self._run, i, params) for i, params in enumerate(self.calls)]
+            for future in as_completed(futures):
+                result = future.result()
+                self.stats["completed"] += 1
+                if result.error is not None:
+                    self.stats["failed"] += 1
+                self.stats["serial_seconds"] += result.seconds
+                self.stats["wall_seconds"] = time.perf_counter() - start
+                yield result
+        wall = self.stats["wall_seconds"]
+        self.stats["speedup"] = self.stats["serial_seconds"] / wall if wall else None
+        logger.info(f"Fan-out finished: {self.stats}")
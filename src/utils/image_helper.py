@@ -0,0 +1,161 @@
+"""
+Image resampling helpers used when preparing images for Amazon Bedrock requests.
+
+All resizing is done in bulk by Pillow's C resampling kernels instead of
+copying pixels one at a time from Python.
+"""
+import base64
+import io
+import logging
+import time
+from argparse import ArgumentParser
+from PIL import Image
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+RESAMPLE_FILTERS = {
+    "nearest": Image.Resampling.NEAREST,
+    "bilinear": Image.Resampling.BILINEAR,
+    "lanczos": Image.Resampling.LANCZOS,
+}
+DEFAULT_RESAMPLE_FILTER = "lanczos"
+# let Pillow do a cheap integer box reduce first when shrinking by more than 3x
+REDUCING_GAP = 3.0
+# per-upload decode budgets, checked against the file header before any pixel is decoded
+MAX_UPLOAD_PIXELS = 100_000_000
+MAX_DECODE_BYTES = 256 * 1024 * 1024
+
+
+class ImageBudgetError(Exception):
+    "Custom exception for uploads that exceed the decode budget"
+    def __init__(self, message):
+        self.message = message
+
+
+def get_resample_filter(name):
+    """Map a filter name (nearest, bilinear, lanczos) to the Pillow constant."""
+    try:
+        return RESAMPLE_FILTERS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unsupported resample filter: {name}. Use one of {list(RESAMPLE_FILTERS)}")
+
+
+def resample_image(image, width, height, resample=DEFAULT_RESAMPLE_FILTER):
+    """
+    Resize an image to exactly width x height in a single bulk operation.
+    Args:
+        image (PIL.Image): The source image.
+        width (int): Target width in pixels.
+        height (int): Target height in pixels.
+        resample (str): One of nearest, bilinear or lanczos.
+    Returns:
+        PIL.Image: RGB image of the requested size.
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.size == (width, height):
+        return image
+    return image.resize(
+        (width, height),
+        resample=get_resample_filter(resample),
+        reducing_gap=REDUCING_GAP,
+    )
+
+
+def encode_base64_jpeg(image):
+    """JPEG-encode an image and return it as a base64 string."""
+    byte_io = io.BytesIO()
+    image.save(byte_io, format="JPEG")
+    return base64.b64encode(byte_io.getvalue()).decode("utf-8")
+
+
+def ingest_image(source, dest_path, min_edge=None, max_pixels=MAX_UPLOAD_PIXELS, max_bytes=MAX_DECODE_BYTES):
+    """
+    Decode an uploaded image at the smallest resolution the target model can use and save it.
+    JPEGs are scaled in the DCT domain with Image.draft, other formats are box-reduced
+    by an integer factor right after decoding.
+    Args:
+        source (str or file): Path or file-like object of the upload.
+        dest_path (str): Where to write the ingested image.
+        min_edge (int): Shortest edge to keep, usually bedrockHelper.get_max_img_size(model_id).
+            None keeps the full resolution.
+        max_pixels (int): Reject images whose header reports more pixels than this.
+        max_bytes (int): Reject images whose decoded raster would exceed this many bytes.
+    Returns:
+        stats (dict): Source/stored sizes, peak decoded bytes and decode time for the upload.
+    """
+    start = time.perf_counter()
+    image = Image.open(source)
+    source_size = image.size
+    if source_size[0] * source_size[1] > max_pixels:
+        raise ImageBudgetError(
+            f"Image is {source_size[0]} x {source_size[1]}, above the {max_pixels} pixel upload budget"
+        )
+    drafted = False
+    if min_edge and image.format == "JPEG":
+        # the decoder picks the largest 1/2, 1/4 or 1/8 scale that stays at or above min_edge
+        drafted = image.draft("RGB", (min_edge, min_edge)) is not None
+    decoded_size = image.size
+    peak_bytes = decoded_size[0] * decoded_size[1] * len(image.getbands())
+    if peak_bytes > max_bytes:
+        raise ImageBudgetError(
+            f"Decoding {decoded_size[0]} x {decoded_size[1]} needs {peak_bytes} bytes, above the {max_bytes} byte budget"
+        )
+    image.load()
+    reduce_factor = min(decoded_size) // min_edge if min_edge else 1
+    if reduce_factor > 1:
+        image = image.reduce(reduce_factor)
+    image.save(dest_path)
+    stats = {
+        "file": dest_path,
+        "source_size": source_size,
+        "decoded_size": decoded_size,
+        "stored_size": image.size,
+        "draft": drafted,
+        "reduce_factor": max(reduce_factor, 1),
+        "peak_decoded_bytes": peak_bytes,
+        "decode_seconds": time.perf_counter() - start,
+    }
+    logger.info(f"Ingested upload: {stats}")
+    return stats
+
+
+def _resize_pixel_loop(image, width, height):
+    # the original per-pixel implementation, kept only as the benchmark baseline
+    pixels = image.load()
+    src_width, src_height = image.size
+    new_image = Image.new("RGB", (width, height))
+    for x in range(width):
+        for y in range(height):
+            new_image.putpixel((x, y), pixels[int(x * src_width / width), int(y * src_height / height)])
+    return new_image
+
+
+def benchmark_resize(sizes=(1024, 2048, 4096), target=(1408, 768), filters=tuple(RESAMPLE_FILTERS), include_loop=True):
+    """
+    Time the per-pixel loop against the bulk resampler for square inputs of each size.
+    Returns:
+        results (list): One dict per (input size, method) with the elapsed seconds.
+    """
+    results = []
+    for size in sizes:
+        source = Image.effect_noise((size, size), 64).convert("RGB")
+        if include_loop:
+            start = time.perf_counter()
+            _resize_pixel_loop(source, *target)
+            results.append({"input": size, "method": "pixel_loop", "seconds": time.perf_counter() - start})
+        for name in filters:
+            start = time.perf_counter()
+            resample_image(source, *target, resample=name)
+            results.append({"input": size, "method": name, "seconds": time.perf_counter() - start})
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the bulk image resampler against the per-pixel loop")
+    parser.add_argument("--sizes", default="1024,2048,4096", help="Comma separated square input sizes")
+    parser.add_argument("--skip-loop", action="store_true", help="Skip the slow per-pixel baseline")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+    for result in benchmark_resize(sizes, include_loop=not args.skip_loop):
+        print(f"{result['input']:>5}px  {result['method']:<10} {result['seconds'] * 1000:10.1f} ms")
@@ -0,0 +1,171 @@
+"""
+Columnar item catalogs for the personalized email page.
+
+Each catalog CSV is converted once into a Parquet file under temp/catalogs/,
+streamed through pandas in chunks so catalogs with millions of rows never need
+to fit in memory as text. The Parquet footer records the size and mtime of the
+CSV it was built from; when the CSV changes the cache is rebuilt. Loaded
+tables are kept process-wide, so Streamlit reruns read no CSV and no Parquet.
+"""
+import logging
+import os
+import threading
+import time
+from argparse import ArgumentParser
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+ASSETS_DIR = "assets"
+CACHE_DIR = f"{os.getcwd()}/temp/catalogs"
+CATALOGS = {
+    "movie": {"csv": f"{ASSETS_DIR}/movie_items.csv", "dtype": {"PROMOTION": "string"}},
+    "retail": {"csv": f"{ASSETS_DIR}/adidas_items.csv", "dtype": {"PROMOTION": "string"}},
+    "travel": {"csv": f"{ASSETS_DIR}/travel_items.csv", "dtype": {"PROMOTION": "string"}},
+}
+# rows parsed per chunk while converting a CSV; each chunk becomes a Parquet row group
+CHUNK_ROWS = 100_000
+
+
+def source_signature(csv_path):
+    """Size and mtime of a source CSV, recorded in the Parquet footer for change detection."""
+    stat = os.stat(csv_path)
+    return {"source_size": str(stat.st_size), "source_mtime_ns": str(stat.st_mtime_ns)}
+
+
+def _footer_signature(parquet_path):
+    try:
+        metadata = pq.read_schema(parquet_path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    return {key.decode(): value.decode() for key, value in metadata.items() if key.startswith(b"source_")}
+
+
+def build_catalog(csv_path, parquet_path, dtype=None, chunk_rows=CHUNK_ROWS):
+    """
+    Convert a CSV into Parquet one chunk at a time.
+    The schema comes from the first chunk (all-empty columns become strings) and later chunks are cast to it.
+    Args:
+        csv_path (str): Source CSV.
+        parquet_path (str): Destination, written atomically.
+        dtype (dict): Column dtypes passed to pandas.read_csv.
+        chunk_rows (int): Rows per chunk and per row group.
+    Returns:
+        rows (int): Rows written.
+    """
+    start = time.perf_counter()
+    signature = source_signature(csv_path)
+    os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+    tmp_path = f"{parquet_path}.tmp{threading.get_ident()}"
+    writer = None
+    schema = None
+    rows = 0
+    try:
+        for chunk in pd.read_csv(csv_path, sep=',', dtype=dtype, chunksize=chunk_rows):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                schema = pa.schema(
+                    [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema],
+                    metadata={**(table.schema.metadata or {}), **signature},
+                )
+                writer = pq.ParquetWriter(tmp_path, schema)
+            try:
+                writer.write_table(table.cast(schema))
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise ValueError(f"{csv_path} rows {rows}-{rows + len(chunk)} do not match the column types of the first chunk, pass a dtype for them: {e}")
+            rows += len(chunk)
+        if writer is None:
+            # header only: keep the columns so lookups still find them
+            table = pa.Table.from_pandas(pd.read_csv(csv_path, sep=',', dtype=dtype, nrows=0), preserve_index=False)
+            writer = pq.ParquetWriter(tmp_path, table.schema.with_metadata(signature))
+        writer.close()
+        os.replace(tmp_path, parquet_path)
+    except Exception:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(f"Converted {csv_path} ({rows} rows) to {parquet_path} in {time.perf_counter() - start:.2f} s")
+    return rows
+
+
+class ItemCatalogs:
+    def __init__(self, catalogs=CATALOGS, cache_dir=CACHE_DIR):
+        self.catalogs = catalogs
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._loaded = {}
+        self._stats = {"hits": 0, "loads": 0, "builds": 0, "load_seconds": 0.0, "build_seconds": 0.0}
+
+    def parquet_path(self, name):
+        return os.path.join(self.cache_dir, f"{name}.parquet")
+
+    def get(self, name, columns=None):
+        """
+        Catalog as a DataFrame, converted and loaded at most once per CSV version.
+        Args:
+            name (str): movie, retail or travel.
+            columns (list): Only load these columns; Parquet reads nothing else.
+        Returns:
+            data (DataFrame): The catalog rows. Callers should not modify it in place.
+        """
+        spec = self.catalogs[name]
+        signature = source_signature(spec["csv"])
+        key = (name, tuple(columns) if columns else None)
+        with self._lock:
+            loaded = self._loaded.get(key)
+            if loaded is not None and loaded[0] == signature:
+                self._stats["hits"] += 1
+                return loaded[1]
+            parquet_path = self.parquet_path(name)
+            if _footer_signature(parquet_path) != signature:
+                start = time.perf_counter()
+                build_catalog(spec["csv"], parquet_path, spec.get("dtype"))
+                self._stats["builds"] += 1
+                self._stats["build_seconds"] += time.perf_counter() - start
+            start = time.perf_counter()
+            data = pq.read_table(parquet_path, columns=list(columns) if columns else None).to_pandas()
+            self._stats["loads"] += 1
+            self._stats["load_seconds"] += time.perf_counter() - start
+            self._loaded[key] = (signature, data)
+            return data
+
+    def stats(self):
+        """Cache hits, Parquet loads and CSV conversions in this process."""
+        with self._lock:
+            return dict(self._stats)
+
+
+_catalogs = None
+_catalogs_lock = threading.Lock()
+
+
+def get_catalogs():
+    """Return the process-wide item catalogs."""
+    global _catalogs
+    with _catalogs_lock:
+        if _catalogs is None:
+            _catalogs = ItemCatalogs()
+    return _catalogs
+
+
+def get_catalog(name, columns=None):
+    """Shortcut for get_catalogs().get(name, columns)."""
+    return get_catalogs().get(name, columns)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Convert the item catalog CSVs to Parquet")
+    parser.add_argument("--catalog", action="append", choices=list(CATALOGS), help="Catalog to convert, defaults to all")
+    parser.add_argument("--csv", default=None, help="Convert this CSV instead, written next to the catalogs as <name>.parquet")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows per chunk and Parquet row group")
+    args = parser.parse_args()
+    if args.csv:
+        name = os.path.splitext(os.path.basename(args.csv))[0]
+        build_catalog(args.csv, os.path.join(CACHE_DIR, f"{name}.parquet"), chunk_rows=args.chunk_rows)
+    else:
+        for name in args.catalog or CATALOGS:
+            build_catalog(CATALOGS[name]["csv"], os.path.join(CACHE_DIR, f"{name}.parquet"), CATALOGS[name].get("dtype"), args.chunk_rows)
@@ -0,0 +1,197 @@
+"""
+Per-category top-k index for the personalized email recommendations.
+
+For every genre, breadcrumb path and destination city the index keeps the
+row positions of the best TOP_K items, already ordered by rating or search
+count, and the name and description columns are precomputed in vectorized
+form. A lookup matches the category against the distinct index keys (the
+same regex search str.contains runs, but over a few dozen keys instead of
+every row) and merges at most TOP_K positions per matching key. Ties on the
+score keep catalog order.
+"""
+import logging
+import re
+import threading
+import time
+from argparse import ArgumentParser
+import numpy as np
+import pandas as pd
+from src.utils import item_catalog
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+TOP_K = 10
+
+
+def travel_descriptions(data):
+    """Vectorized form of the row-wise travel description the email page used to build."""
+    return (
+        "Travel from " + data["SRC_CITY"].astype(str) + " on " + data["AIRLINE"].astype(str)
+        + " for a " + data["DURATION_DAYS"].astype(str) + " days trip in " + data["MONTH"].astype(str)
+        + " - $" + data["DYNAMIC_PRICE"].astype(str)
+    )
+
+
+# field is matched against the category, split on separator into index keys; score orders the items
+DOMAINS = {
+    "movie": {"field": "GENRES", "separator": "|", "score": "IMDB_RATING", "name": "TITLE", "description": "PLOT"},
+    "retail": {"field": "breadcrumbs", "separator": None, "score": "average_rating", "name": "name", "description": "description"},
+    "travel": {"field": "DST_CITY", "separator": None, "score": "NUMBER_OF_SEARCH_BY_USER", "name": "DST_CITY", "description": travel_descriptions},
+}
+
+
+class TopItemsIndex:
+    def __init__(self, data, field, score, name, description, separator=None, k=TOP_K):
+        """
+        Build the index over a catalog.
+        Args:
+            data (DataFrame): The catalog.
+            field (str): Column the category is matched against.
+            score (str): Column items are ranked by, highest first.
+            name (str): Column returned as name.
+            description (str or callable): Column returned as description, or a function building it from data.
+            separator (str): Splits field into several keys per row, e.g. | between genres.
+            k (int): Items kept per key.
+        """
+        start = time.perf_counter()
+        self.k = k
+        self.separator = separator
+        self.labels = data.index
+        self.names = data[name].to_numpy()
+        self.descriptions = (description(data) if callable(description) else data[description]).to_numpy()
+        self.scores = data[score].to_numpy(dtype=float)
+        # rank every row once, then keep the best k per distinct field value (e.g. "Action|Western")
+        codes, values = pd.factorize(data[field])
+        ranked = self._rank(np.arange(len(data)))
+        ranked = ranked[codes[ranked] >= 0]
+        by_value = ranked[np.argsort(codes[ranked], kind="stable")]
+        value_codes = codes[by_value]
+        starts = np.searchsorted(value_codes, value_codes, side="left")
+        by_value = by_value[np.arange(len(by_value)) - starts < k]
+        value_codes = codes[by_value]
+        bounds = np.searchsorted(value_codes, np.arange(len(values) + 1), side="left")
+        # a value with several keys contributes its best rows to each of them
+        candidates = {}
+        for code, value in enumerate(values):
+            for key in (value.split(separator) if separator else (value,)):
+                candidates.setdefault(key, []).append(by_value[bounds[code]:bounds[code + 1]])
+        self.keys = {key: self._rank(np.concatenate(parts))[:k] for key, parts in candidates.items()}
+        self._matches = {}
+        self.build_seconds = time.perf_counter() - start
+
+    def _rank(self, positions):
+        # best score first, catalog order between ties, NaN scores last like sort_values
+        positions = np.unique(positions)
+        return positions[np.lexsort((positions, np.nan_to_num(-self.scores[positions], nan=np.inf)))]
+
+    def _matching_keys(self, category):
+        matches = self._matches.get(category)
+        if matches is None:
+            pattern = re.compile(category)
+            matches = [key for key in self.keys if pattern.search(key)]
+            self._matches[category] = matches
+        return matches
+
+    def top_positions(self, category, n=3):
+        """
+        Row positions of the n best items whose field contains category, or None when the index cannot answer
+        (n above k, or a category spanning the separator) and the caller has to scan the catalog.
+        """
+        if n > self.k or (self.separator and self.separator in category):
+            return None
+        candidates = [self.keys[key] for key in self._matching_keys(category)]
+        if not candidates:
+            return np.empty(0, dtype=np.int64)
+        return self._rank(np.concatenate(candidates))[:n]
+
+    def top_items(self, category, n=3):
+        """Top n items as a DataFrame with name and description, or None when the caller has to scan."""
+        positions = self.top_positions(category, n)
+        if positions is None:
+            return None
+        return pd.DataFrame(
+            {"name": self.names[positions], "description": self.descriptions[positions]},
+            index=self.labels[positions],
+        )
+
+
+def scan_top_items(data, category, n, field, score, name, description, **_):
+    """The full-catalog str.contains and sort the index replaces, used when it cannot answer."""
+    data = data[data[field].str.contains(category)].sort_values(by=score, ascending=False, kind="stable").head(n)
+    descriptions = description(data) if callable(description) else data[description]
+    return pd.DataFrame({"name": data[name], "description": descriptions}, index=data.index)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(domain):
+    """Index over the current catalog of a domain, rebuilt when item_catalog reloads the catalog."""
+    data = item_catalog.get_catalog(domain)
+    with _indexes_lock:
+        cached = _indexes.get(domain)
+        if cached is not None and cached[0] is data:
+            return cached[1]
+        index = TopItemsIndex(data, **DOMAINS[domain])
+        _indexes[domain] = (data, index)
+    logger.info(f"Indexed {len(index.keys)} {domain} categories over {len(data)} items in {index.build_seconds:.3f} s")
+    return index
+
+
+def get_top_items(domain, category, n=3):
+    """
+    Best n items of a domain whose category field contains category.
+    Returns:
+        items (DataFrame): name and description columns, best first.
+    """
+    items = get_index(domain).top_items(category, n)
+    if items is None:
+        items = scan_top_items(item_catalog.get_catalog(domain), category, n, **DOMAINS[domain])
+    return items
+
+
+def _synthetic_movies(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    genres = np.array(["Drama", "Action", "Adventure", "Comedy", "Sci-Fi", "Western", "Horror", "Romance",
+                       "Thriller", "Crime", "Fantasy", "Animation", "Family", "Mystery", "Musical", "War"])
+    first = genres[rng.integers(0, len(genres), rows)]
+    second = genres[rng.integers(0, len(genres), rows)]
+    return pd.DataFrame({
+        "TITLE": np.char.add("Movie ", np.arange(rows).astype(str)),
+        "PLOT": "A plot.",
+        "GENRES": np.where(rng.random(rows) < 0.5, first, np.char.add(np.char.add(first, "|"), second)),
+        "IMDB_RATING": rng.integers(1, 11, rows),
+    })
+
+
+def benchmark_top_items(sizes=(10_000, 1_000_000), categories=("Drama", "Action", "Adventure", "Comedy", "Sci-Fi")):
+    """Compare the pandas scan with index lookups over synthetic movie catalogs."""
+    spec = DOMAINS["movie"]
+    results = {}
+    for rows in sizes:
+        data = _synthetic_movies(rows)
+        start = time.perf_counter()
+        for category in categories:
+            data[data["GENRES"].str.contains(category)].sort_values(by="IMDB_RATING", ascending=False).head(3)
+        scan_ms = (time.perf_counter() - start) * 1000 / len(categories)
+        index = TopItemsIndex(data, **spec)
+        start = time.perf_counter()
+        for category in categories:
+            index.top_items(category)
+        first_ms = (time.perf_counter() - start) * 1000 / len(categories)
+        start = time.perf_counter()
+        for category in categories:
+            index.top_items(category)
+        lookup_ms = (time.perf_counter() - start) * 1000 / len(categories)
+        results[rows] = {"scan_ms": scan_ms, "build_ms": index.build_seconds * 1000, "first_lookup_ms": first_ms, "lookup_ms": lookup_ms}
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark top-k index lookups against the pandas scan")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000], help="Catalog sizes to compare")
+    args = parser.parse_args()
+    for rows, result in benchmark_top_items(args.rows).items():
+        print(f"{rows:>9} rows: scan {result['scan_ms']:8.2f} ms  build {result['build_ms']:8.1f} ms  "
+              f"first lookup {result['first_lookup_ms']:.3f} ms  lookup {result['lookup_ms']:.3f} ms")
@@ -0,0 +1,217 @@
+"""
+Process-wide catalog of Amazon Bedrock foundation models.
+
+Every Streamlit session in the process shares one catalog per AWS profile. The
+catalog is served from memory, refreshed in a background thread once its TTL
+expires, and snapshotted to disk so a cold process can render model pickers
+before the first list_foundation_models call returns.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from botocore.exceptions import ClientError
+from src.utils import client_registry
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+CATALOG_TTL_SECONDS = 15 * 60
+REFRESH_RETRY_SECONDS = 60
+SNAPSHOT_DIR = f"{os.getcwd()}/temp"
+
+# served until the first refresh lands when there is no snapshot on disk
+FALLBACK_MODELS = {
+    ("IMAGE", "TEXT"): [
+        "anthropic.claude-3-sonnet-20240229-v1:0",
+        "anthropic.claude-3-5-sonnet-20240620-v1:0",
+        "anthropic.claude-3-haiku-20240307-v1:0",
+    ],
+    ("TEXT", "TEXT"): [
+        "anthropic.claude-3-sonnet-20240229-v1:0",
+        "anthropic.claude-3-5-sonnet-20240620-v1:0",
+        "anthropic.claude-3-haiku-20240307-v1:0",
+    ],
+    ("TEXT", "IMAGE"): [
+        "stability.sd3-large-v1:0",
+        "amazon.titan-image-generator-v2:0",
+        "amazon.titan-image-generator-v1",
+    ],
+    ("IMAGE", "IMAGE"): [
+        "stability.sd3-large-v1:0",
+        "amazon.titan-image-generator-v2:0",
+        "amazon.titan-image-generator-v1",
+    ],
+}
+
+# supported output sizes per model family; anything that is not Titan uses the Stability table
+SUPPORTED_IMG_SIZES = {
+    "amazon.titan": {
+        "aspect_ratios": (1,0.666666666666667,1.5,0.6,1.666666666666667,0.777777777777778,
+            1.28571428571429,0.545454545454545,1.83333333333333,0.454545454545455,2.2,1.8,1.8328125),
+        "sizes": (
+            (1024,1024),
+            (768,768),
+            (512,512),
+            (768,1152),
+            (384,576),
+            (1152,768),
+            (576,384),
+            (768,1280),
+            (384,640),
+            (1280,768),
+            (640,384),
+            (896,1152),
+            (448,576),
+            (1152,896),
+            (576,448),
+            (768,1408),
+            (384,704),
+            (1408,768),
+            (704,384),
+            (640,1408),
+            (320,704),
+            (1408,640),
+            (704,320),
+            (1152,640),
+            (1173,640),
+        ),
+    },
+    "stability": {
+        "aspect_ratios": (1,1.28, 1.46,1.75,2.4),
+        "sizes": (
+            (1024, 1024),
+            (512, 512),
+            (1152, 896),
+            (1216, 832),
+            (1344, 768),
+            (1536, 640)
+        ),
+    },
+}
+
+
+def get_supported_sizes(model_id):
+    """Return the (aspect_ratios, sizes) tables supported by the model family."""
+    family = "amazon.titan" if "amazon.titan" in model_id else "stability"
+    table = SUPPORTED_IMG_SIZES[family]
+    return table["aspect_ratios"], table["sizes"]
+
+
+class ModelCatalog:
+    """
+    Foundation model summaries for one AWS profile with precomputed modality indexes.
+    Reads never call the control plane; a stale catalog schedules a background refresh
+    and keeps serving what it has.
+    """
+    def __init__(self, profile="default", ttl=CATALOG_TTL_SECONDS, snapshot_dir=SNAPSHOT_DIR):
+        self.profile = profile
+        self.ttl = ttl
+        self.snapshot_path = f"{snapshot_dir}/model_catalog_{profile or 'default'}.json"
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self._models = {}
+        self._index = {}
+        self._loaded_at = 0
+        self._next_attempt = 0
+        self._load_snapshot()
+
+    def _build(self, summaries, loaded_at):
+        models = {}
+        index = {}
+        for summary in summaries:
+            model = dict(summary)
+            if "IMAGE" in model.get("outputModalities", []):
+                aspect_ratios, sizes = get_supported_sizes(model["modelId"])
+                model["supportedImageSizes"] = {"aspect_ratios": aspect_ratios, "sizes": sizes}
+            models[model["modelId"]] = model
+            for input_mode in model.get("inputModalities", []):
+                for output_mode in model.get("outputModalities", []):
+                    index.setdefault((input_mode, output_mode), []).append(model["modelId"])
+        with self._lock:
+            self._models = models
+            self._index = index
+            self._loaded_at = loaded_at
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._build(snapshot["modelSummaries"], snapshot["loaded_at"])
+        logger.info(f"Loaded model catalog snapshot {self.snapshot_path} with {len(self._models)} models")
+
+    def _write_snapshot(self, summaries, loaded_at):
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"loaded_at": loaded_at, "modelSummaries": summaries}, f, default=str)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.error(f"Could not write model catalog snapshot: {e}")
+
+    @property
+    def is_stale(self):
+        return time.time() - self._loaded_at > self.ttl
+
+    def refresh(self):
+        """Fetch the model list from Bedrock and rebuild the indexes. Blocks the caller."""
+        client = client_registry.get_client("bedrock", self.profile)
+        try:
+            summaries = client.list_foundation_models()["modelSummaries"]
+        except ClientError as e:
+            logger.error(e.response)
+            return False
+        loaded_at = time.time()
+        self._build(summaries, loaded_at)
+        self._write_snapshot(summaries, loaded_at)
+        logger.info(f"Refreshed model catalog with {len(summaries)} models")
+        return True
+
+    def refresh_async(self):
+        """Start a background refresh unless one is already running."""
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            if time.time() < self._next_attempt:
+                return
+            self._next_attempt = time.time() + REFRESH_RETRY_SECONDS
+            self._refresh_thread = threading.Thread(target=self._refresh_safely, name="model-catalog-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    def _refresh_safely(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Model catalog refresh failed: {e}")
+
+    def get_models(self, input_mode="TEXT", output_mode="IMAGE"):
+        """Model IDs accepting input_mode and producing output_mode, without blocking on Bedrock."""
+        if self.is_stale:
+            self.refresh_async()
+        with self._lock:
+            model_ids = self._index.get((input_mode, output_mode))
+        if model_ids is None and not self._models:
+            return list(FALLBACK_MODELS.get((input_mode, output_mode), []))
+        return list(model_ids or [])
+
+    def get_model(self, model_id):
+        """Return the catalog entry for a model, or None if it is unknown."""
+        with self._lock:
+            return self._models.get(model_id)
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(profile="default"):
+    """Return the process-wide catalog for an AWS profile, creating it on first use."""
+    with _catalogs_lock:
+        catalog = _catalogs.get(profile)
+        if catalog is None:
+            catalog = ModelCatalog(profile)
+            _catalogs[profile] = catalog
+    return catalog
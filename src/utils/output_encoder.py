@@ -0,0 +1,171 @@
+"""
+Output encoding for generated images and ads.
+
+Each output format is a policy: WebP or JPEG at tuned quality for delivery
+copies, lossless PNG for masters. Encoding and writing run on a small worker
+pool (Pillow releases the GIL while encoding) so the Streamlit script can hand
+the in-memory image straight to st.image and move on; the files land a few
+hundred milliseconds later. Bytes that are already in the policy's format,
+such as the PNG a model returns, are written as they are without a decode and
+re-encode.
+"""
+import io
+import logging
+import os
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, wait
+from PIL import Image
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+POLICIES = {
+    "webp": {"format": "WEBP", "extension": ".webp", "options": {"quality": 85, "method": 4}},
+    "jpeg": {"format": "JPEG", "extension": ".jpg", "options": {"quality": 88, "optimize": True, "progressive": True}},
+    "png": {"format": "PNG", "extension": ".png", "options": {"compress_level": 6}},
+}
+DEFAULT_POLICY = "webp"
+MASTER_POLICY = "png"
+MAX_WORKERS = 2
+
+
+def detect_format(data):
+    """Format name of encoded image bytes from their signature, or None."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "PNG"
+    if data[:3] == b"\xff\xd8\xff":
+        return "JPEG"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def encode(image, policy=DEFAULT_POLICY):
+    """
+    Encode an image under a policy.
+    Args:
+        image (Image or bytes): Decoded image, or already encoded bytes.
+        policy (str): One of POLICIES.
+    Returns:
+        data (bytes): The encoded image; encoded input already in the policy's format is returned unchanged.
+    """
+    spec = POLICIES[policy]
+    if isinstance(image, (bytes, bytearray)):
+        if detect_format(image) == spec["format"]:
+            return bytes(image)
+        image = Image.open(io.BytesIO(image))
+    if spec["format"] == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=spec["format"], **spec["options"])
+    return buffer.getvalue()
+
+
+def output_path(path_stem, policy=DEFAULT_POLICY):
+    """File path for a stem such as assets/generated_images/generated_image0 under a policy."""
+    return f"{path_stem}{POLICIES[policy]['extension']}"
+
+
+def save(image, path_stem, policy=DEFAULT_POLICY):
+    """
+    Encode and write one image atomically.
+    Returns:
+        path (str): The written file, path_stem plus the policy's extension.
+    """
+    data = encode(image, policy)
+    path = output_path(path_stem, policy)
+    tmp_path = f"{path}.tmp{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+class OutputEncoder:
+    def __init__(self, max_workers=MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="output-encoder")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._stats = {}
+
+    def _save(self, image, path_stem, policy):
+        start = time.perf_counter()
+        try:
+            path = save(image, path_stem, policy)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not write {path_stem} as {policy}: {e}")
+            raise
+        seconds = time.perf_counter() - start
+        with self._lock:
+            stats = self._stats.setdefault(policy, {"files": 0, "bytes": 0, "seconds": 0.0})
+            stats["files"] += 1
+            stats["bytes"] += os.path.getsize(path)
+            stats["seconds"] += seconds
+        return path
+
+    def persist(self, image, path_stem, policies=(DEFAULT_POLICY,)):
+        """
+        Encode and write an image in the background, once per policy.
+        The caller keeps using the in-memory image (st.image accepts it directly).
+        Returns:
+            futures (dict): Policy -> future resolving to the written path.
+        """
+        futures = {}
+        for policy in dict.fromkeys(policies):
+            future = self._executor.submit(self._save, image, path_stem, policy)
+            with self._lock:
+                self._pending.add(future)
+            future.add_done_callback(self._done)
+            futures[policy] = future
+        return futures
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def flush(self, timeout=None):
+        """Wait for every queued write to land."""
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending, timeout=timeout)
+
+    def stats(self):
+        """Files, bytes and encode seconds per policy, plus the writes still queued."""
+        with self._lock:
+            stats = {policy: dict(values) for policy, values in self._stats.items()}
+            stats["pending"] = len(self._pending)
+        return stats
+
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder():
+    """Return the process-wide output encoder."""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = OutputEncoder()
+    return _encoder
+
+
+def benchmark_policies(image_path, policies=tuple(POLICIES)):
+    """Encode one image under each policy and report size and encode time."""
+    image = Image.open(image_path)
+    image.load()
+    results = {}
+    for policy in policies:
+        start = time.perf_counter()
+        data = encode(image, policy)
+        results[policy] = {"kb": len(data) / 1024, "encode_ms": (time.perf_counter() - start) * 1000}
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compare output encoding policies on an image")
+    parser.add_argument("--image", required=True, help="Image to encode")
+    args = parser.parse_args()
+    for policy, result in benchmark_policies(args.image).items():
+        print(f"{policy:>5}: {result['kb']:8.1f} KB  {result['encode_ms']:7.1f} ms")
@@ -0,0 +1,182 @@
+"""
+Memory-lean JSON bodies for multimodal Bedrock requests and image responses.
+
+json.dumps on a request holding a base64 image makes a full copy of the image
+string, and botocore makes another when it encodes the str body to bytes.
+encode_body serializes the small JSON envelope on its own and copies each
+image into a single pre-sized bytearray, so the request exists once on the
+heap. decode_response does the reverse for image model responses: base64
+fields are decoded straight out of the raw response bytes and only the small
+JSON skeleton around them goes through json.loads.
+"""
+import base64
+import binascii
+import json
+import logging
+import re
+import time
+import tracemalloc
+from argparse import ArgumentParser
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+# 48 KiB of raw bytes, 64 KiB of base64 text per copy step
+CHUNK_BYTES = 3 * 16 * 1024
+CHUNK_CHARS = 4 * 16 * 1024
+# string values at least this long in an image response are treated as base64 images
+MIN_IMAGE_CHARS = 1024
+
+_MARKER = "\x00payload-image-{}\x00"
+# json.dumps escapes the NUL characters of the marker
+_MARKER_RE = re.compile(r"\\u0000payload-image-(\d+)\\u0000")
+_BASE64_STRING_RE = re.compile(rb'"([A-Za-z0-9+/]{%d,}={0,2})"' % MIN_IMAGE_CHARS)
+
+
+class Base64Image:
+    """
+    An image field of a request body.
+    data is either a base64 string, written as is, or raw image bytes, base64-encoded into the body.
+    """
+    def __init__(self, data):
+        self.data = data.data if isinstance(data, Base64Image) else data
+
+    def __len__(self):
+        if isinstance(self.data, str):
+            return len(self.data)
+        return 4 * ((len(self.data) + 2) // 3)
+
+    def write_into(self, buffer, offset):
+        """Copy the base64 text into buffer at offset in bounded chunks and return the new offset."""
+        if isinstance(self.data, str):
+            for i in range(0, len(self.data), CHUNK_CHARS):
+                chunk = self.data[i:i + CHUNK_CHARS].encode("ascii")
+                buffer[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+            return offset
+        view = memoryview(self.data)
+        for i in range(0, len(view), CHUNK_BYTES):
+            chunk = binascii.b2a_base64(view[i:i + CHUNK_BYTES], newline=False)
+            buffer[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+        return offset
+
+    def __str__(self):
+        return self.data if isinstance(self.data, str) else base64.b64encode(self.data).decode("utf-8")
+
+
+def encode_body(envelope):
+    """
+    Serialize a request body, splicing Base64Image values into one pre-sized buffer.
+    Args:
+        envelope (dict): The JSON request; image fields hold Base64Image objects.
+    Returns:
+        body (bytearray): The UTF-8 JSON body, ready to pass to invoke_model.
+    """
+    images = []
+
+    def default(value):
+        if isinstance(value, Base64Image):
+            images.append(value)
+            return _MARKER.format(len(images) - 1)
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    skeleton = json.dumps(envelope, default=default, separators=(",", ":"))
+    parts = _MARKER_RE.split(skeleton)
+    texts = [part.encode("utf-8") for part in parts[0::2]]
+    spliced = [images[int(index)] for index in parts[1::2]]
+    body = bytearray(sum(len(text) for text in texts) + sum(len(image) for image in spliced))
+    offset = 0
+    for i, text in enumerate(texts):
+        body[offset:offset + len(text)] = text
+        offset += len(text)
+        if i < len(spliced):
+            offset = spliced[i].write_into(body, offset)
+    return body
+
+
+def _restore(value, images):
+    if isinstance(value, dict):
+        if len(value) == 1 and "__image__" in value:
+            return images[value["__image__"]]
+        return {k: _restore(v, images) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_restore(v, images) for v in value]
+    return value
+
+
+def decode_response(raw):
+    """
+    Parse an image model response body, decoding base64 image fields without a second string copy.
+    Args:
+        raw (bytes): The response body as read from invoke_model.
+    Returns:
+        response_body (dict): The parsed response; image fields hold the decoded image bytes.
+    """
+    view = memoryview(raw)
+    pieces = []
+    images = []
+    last = 0
+    for match in _BASE64_STRING_RE.finditer(raw):
+        start, end = match.span(1)
+        pieces.append(view[last:match.start()])
+        pieces.append(b'{"__image__":%d}' % len(images))
+        images.append(binascii.a2b_base64(view[start:end]))
+        last = match.end()
+    pieces.append(view[last:])
+    return _restore(json.loads(b"".join(pieces)), images)
+
+
+def benchmark_payload(size=4096, quality=95):
+    """
+    Compare the peak Python heap of json.dumps/json.loads against encode_body/decode_response
+    for a square noise image of the given size, the worst case for base64 payload size.
+    Returns:
+        results (list): One dict per (direction, method) with the peak heap bytes and seconds.
+    """
+    import io
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.effect_noise((size, size), 64).convert("RGB").save(buffer, format="JPEG", quality=quality)
+    image_bytes = buffer.getvalue()
+    image_b64 = base64.b64encode(image_bytes).decode("utf-8")
+    response_raw = json.dumps({"images": [image_b64], "error": None}).encode("utf-8")
+
+    def request_json():
+        body = json.dumps({"taskType": "IMAGE_VARIATION", "imageVariationParams": {"text": "x", "images": [image_b64]}})
+        return body.encode("utf-8")
+
+    def request_lean():
+        return encode_body({"taskType": "IMAGE_VARIATION", "imageVariationParams": {"text": "x", "images": [Base64Image(image_b64)]}})
+
+    def response_json():
+        return [base64.b64decode(item) for item in json.loads(response_raw)["images"]]
+
+    def response_lean():
+        return decode_response(response_raw)["images"]
+
+    results = []
+    for direction, method, fn in (
+        ("request", "json", request_json),
+        ("request", "lean", request_lean),
+        ("response", "json", response_json),
+        ("response", "lean", response_lean),
+    ):
+        tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append({"direction": direction, "method": method, "peak_bytes": peak, "seconds": seconds, "image_bytes": len(image_bytes)})
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Measure peak heap per request for json.dumps and the lean body builder")
+    parser.add_argument("--size", type=int, default=4096, help="Square input image size")
+    args = parser.parse_args()
+    for result in benchmark_payload(args.size):
+        print(
+            f"{result['direction']:<9} {result['method']:<5} peak {result['peak_bytes'] / 2**20:8.1f} MB "
+            f"{result['seconds'] * 1000:8.1f} ms  (image {result['image_bytes'] / 2**20:.1f} MB)"
+        )
@@ -0,0 +1,458 @@
+"""
+Headless runner for the creative pipeline behind pages 1, 9, 4, 5 and 6.
+
+Each creative brief flows through a DAG of stages:
+brief analysis -> design description -> image prompt -> image -> ad.
+Every stage has its own bounded thread pool, and a brief moves on to its next
+stage as soon as that stage's inputs are ready, so a season of briefs is
+pipelined instead of run one page at a time. Stage outputs are written under
+the run directory and a manifest.json records the status, timing and output
+paths of every brief and stage. Stages are memoized on a fingerprint of their
+prompt template, parameters and upstream outputs, so rerunning a season after
+editing one brief only recomputes what that edit affects.
+
+    python -m src.utils.pipeline --briefs assets/briefs --concurrency image=4
+"""
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from src.utils import bedrock_scheduler, bedrockHelper, generateAd, image_helper, prompts, step_memo
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+RUNS_DIR = f"{os.getcwd()}/temp/pipeline"
+TEXT_PARAMS = {
+    "model_id": "anthropic.claude-3-sonnet-20240229-v1:0",
+    "max_tokens": 2000,
+    "temperature": 1.0,
+    "top_p": 0.999,
+    "top_k": 268,
+    "seed": 45,
+    "cfg_scale": 10,
+    "steps": 30,
+    "num_images": 1,
+    "style_preset": "photographic",
+    "weight": 1.0,
+    "image_strength": 0.5,
+    "resample_filter": image_helper.DEFAULT_RESAMPLE_FILTER,
+    "use_cache": False,
+    "bypass_cache": False,
+}
+IMAGE_PARAMS = dict(TEXT_PARAMS, model_id="stability.sd3-large-v1:0", use_cache=True)
+STAGE_CONCURRENCY = {"brief": 4, "design": 4, "prompt": 4, "image": 2, "ad": 2}
+IMAGE_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp", ".gif": "image/gif"}
+TEXT_TYPES = (".txt", ".csv", ".md")
+
+
+class PipelineError(Exception):
+    "Raised by a stage when the model returns an error or an unusable response"
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class Brief:
+    """One creative brief: an ID, its source files and the directory its outputs go to."""
+    def __init__(self, brief_id, sources, output_dir):
+        self.id = brief_id
+        self.sources = sources
+        self.output_dir = output_dir
+
+
+class Stage:
+    """
+    A pipeline step: fn(brief, inputs, context) -> JSON-serializable output, run after its deps.
+    params_key names the context parameters the step uses and salt is its prompt template;
+    both go into the step's memo fingerprint together with the upstream outputs.
+    """
+    def __init__(self, name, fn, deps=(), max_workers=2, params_key=None, salt=""):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.max_workers = max_workers
+        self.params_key = params_key
+        self.salt = salt
+
+
+def load_briefs(paths, output_dir):
+    """
+    Build Brief objects from files and directories. Every file is one brief, named after its stem.
+    Returns:
+        briefs (list): Briefs in path order.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if not name.startswith("."))
+        else:
+            files.append(path)
+    briefs = []
+    seen = set()
+    for file in files:
+        ext = os.path.splitext(file)[1].lower()
+        if ext not in IMAGE_TYPES and ext not in TEXT_TYPES and ext != ".pdf":
+            logger.warning(f"Skipping unsupported brief {file}")
+            continue
+        brief_id = os.path.splitext(os.path.basename(file))[0]
+        while brief_id in seen:
+            brief_id = f"{brief_id}_"
+        seen.add(brief_id)
+        briefs.append(Brief(brief_id, [file], os.path.join(output_dir, brief_id)))
+    return briefs
+
+
+def extract_json(text):
+    """Parse the first JSON object in a model response, ignoring any text around it."""
+    start = text.find("{")
+    if start < 0:
+        raise PipelineError("Response does not contain a JSON object")
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text[start:])
+    except ValueError as e:
+        raise PipelineError(f"Could not parse JSON response: {e}")
+    return value
+
+
+def _invoke(prompt, file_paths, context, params, task_type="", negative_prompt=""):
+    response, error = bedrockHelper.build_request(
+        prompt,
+        file_paths,
+        context["profile"],
+        negative_prompt=negative_prompt,
+        task_type=task_type,
+        params=params,
+        priority=bedrock_scheduler.BATCH,
+    )
+    if error:
+        raise PipelineError(error.get("Message", str(error)))
+    return response
+
+
+def run_brief(brief, inputs, context):
+    """Page 1: analyze the brief into advertisements."""
+    prompt = prompts.CREATIVE_BRIEF_PROMPT
+    file_paths = []
+    for source in brief.sources:
+        ext = os.path.splitext(source)[1].lower()
+        if ext in TEXT_TYPES:
+            with open(source, "r") as f:
+                prompt = f"{prompt}\n\n{f.read()}"
+        elif ext == ".pdf":
+            import fitz
+            with fitz.open(source) as doc:
+                prompt = f"{prompt}\n\n{''.join(page.get_text() for page in doc)}"
+        else:
+            dest_path = os.path.join(brief.output_dir, f"input_{os.path.basename(source)}")
+            image_helper.ingest_image(source, dest_path, bedrockHelper.get_max_img_size(context["text_params"]["model_id"]))
+            file_paths.append({"file_path": dest_path, "file_type": IMAGE_TYPES[ext]})
+    response = _invoke(prompt, file_paths, context, context["text_params"])
+    return extract_json(response["content"][0]["text"])
+
+
+def run_design(brief, inputs, context):
+    """Page 9: describe the design of the selected advertisement."""
+    advertisements = inputs["brief"].get("advertisements") or []
+    if len(advertisements) <= context["ad_index"]:
+        raise PipelineError(f"Brief analysis has no advertisement {context['ad_index']}")
+    prompt = prompts.design_description_prompt(advertisements[context["ad_index"]])
+    response = _invoke(prompt, [], context, context["text_params"])
+    return response["content"][0]["text"]
+
+
+def run_prompt(brief, inputs, context):
+    """Page 4: turn the design description into image generation prompts."""
+    response = _invoke(prompts.image_prompt_prompt(inputs["design"]), [], context, context["text_params"])
+    image_prompt = extract_json(response["content"][0]["text"])
+    if not image_prompt.get("prompt"):
+        raise PipelineError("Image prompt response has no prompt")
+    return image_prompt
+
+
+def run_image(brief, inputs, context):
+    """Page 5: generate the ad imagery from the prompt."""
+    params = context["image_params"]
+    response = _invoke(
+        inputs["prompt"]["prompt"],
+        [],
+        context,
+        params,
+        task_type="TEXT_IMAGE",
+        negative_prompt=inputs["prompt"].get("negative_prompt", ""),
+    )
+    paths = []
+    for i, image_bytes in enumerate(bedrockHelper.extract_images(params["model_id"], response)):
+        path = os.path.join(brief.output_dir, f"image_{i}.png")
+        with open(path, "wb") as f:
+            f.write(image_bytes)
+        paths.append(path)
+    return {"images": paths}
+
+
+def run_ad(brief, inputs, context):
+    """Page 6: compose the ad from the advertisement copy and the first generated image."""
+    advertisement = inputs["brief"]["advertisements"][context["ad_index"]]
+    path = generateAd.generate_ad_image(
+        advertisement["headline"],
+        advertisement["ad_copy"],
+        advertisement["call_to_action"],
+        inputs["image"]["images"][0],
+        advertisement.get("brand"),
+        ad_image_out=os.path.join(brief.output_dir, "ad.png"),
+    )
+    return {"ad": path}
+
+
+def default_stages(concurrency=None):
+    """The page 1 -> 9 -> 4 -> 5 -> 6 flow with per-stage worker counts from STAGE_CONCURRENCY."""
+    concurrency = dict(STAGE_CONCURRENCY, **(concurrency or {}))
+    return [
+        Stage("brief", run_brief, (), concurrency["brief"], "text_params", prompts.CREATIVE_BRIEF_PROMPT),
+        Stage("design", run_design, ("brief",), concurrency["design"], "text_params", prompts.design_description_prompt("{advertisement}")),
+        Stage("prompt", run_prompt, ("design",), concurrency["prompt"], "text_params", prompts.image_prompt_prompt("{design_description}")),
+        Stage("image", run_image, ("prompt",), concurrency["image"], "image_params"),
+        Stage("ad", run_ad, ("brief", "image"), concurrency["ad"]),
+    ]
+
+
+class PipelineRunner:
+    """Runs every brief through the stage DAG and keeps the manifest up to date as tasks finish."""
+    def __init__(self, stages, output_dir, context):
+        self.stages = {stage.name: stage for stage in stages}
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+        self.dependents = {name: [s.name for s in stages if name in s.deps] for name in self.stages}
+        self.output_dir = output_dir
+        self.context = context
+        self.manifest_path = os.path.join(output_dir, "manifest.json")
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._outputs = {}
+        self._pending = 0
+        self._executors = {}
+        self.manifest = {}
+
+    def run(self, briefs):
+        """
+        Run all briefs to completion.
+        Returns:
+            manifest (dict): Per-brief and per-stage status, timings and output paths.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        started = time.perf_counter()
+        self.manifest = {
+            "started_at": datetime.datetime.now().isoformat(),
+            "finished_at": None,
+            "wall_seconds": None,
+            "stages": {
+                name: {"deps": list(stage.deps), "max_workers": stage.max_workers, "completed": 0, "failed": 0, "skipped": 0, "memo_hits": 0, "busy_seconds": 0.0}
+                for name, stage in self.stages.items()
+            },
+            "briefs": {
+                brief.id: {"sources": brief.sources, "status": "running", "stages": {name: {"status": "pending"} for name in self.stages}}
+                for brief in briefs
+            },
+        }
+        self._pending = len(briefs) * len(self.stages)
+        if not self._pending:
+            self._done.set()
+        self._executors = {
+            name: ThreadPoolExecutor(max_workers=stage.max_workers, thread_name_prefix=f"pipeline-{name}")
+            for name, stage in self.stages.items()
+        }
+        try:
+            for brief in briefs:
+                os.makedirs(brief.output_dir, exist_ok=True)
+                for name, stage in self.stages.items():
+                    if not stage.deps:
+                        self._submit(brief, name)
+            self._done.wait()
+        finally:
+            for executor in self._executors.values():
+                executor.shutdown(wait=True)
+        with self._lock:
+            self.manifest["finished_at"] = datetime.datetime.now().isoformat()
+            self.manifest["wall_seconds"] = time.perf_counter() - started
+            self._write_manifest_locked()
+        return self.manifest
+
+    def _submit(self, brief, name):
+        with self._lock:
+            self.manifest["briefs"][brief.id]["stages"][name]["status"] = "queued"
+        self._executors[name].submit(self._run_task, brief, name)
+
+    def _fingerprint(self, brief, stage, inputs):
+        params = self.context[stage.params_key] if stage.params_key else {}
+        upstream = dict(inputs)
+        if not stage.deps:
+            upstream["sources"] = brief.sources
+        return step_memo.fingerprint(
+            f"pipeline_{stage.name}",
+            stage.salt,
+            params.get("model_id"),
+            dict(params, ad_index=self.context["ad_index"]),
+            upstream,
+        )
+
+    def _run_task(self, brief, name):
+        # any failure, including reading inputs or updating the manifest, ends in _finish so run() never waits on it
+        start = time.perf_counter()
+        cached = None
+        try:
+            stage = self.stages[name]
+            inputs = {dep: self._outputs[(brief.id, dep)] for dep in stage.deps}
+            with self._lock:
+                self.manifest["briefs"][brief.id]["stages"][name]["status"] = "running"
+            memo = self.context.get("memo")
+            if memo is not None:
+                fp = self._fingerprint(brief, stage, inputs)
+                cached = memo.get(f"pipeline_{name}", fp, brief.output_dir)
+            output = cached if cached is not None else stage.fn(brief, inputs, self.context)
+            output_path = os.path.join(brief.output_dir, f"{name}.json")
+            with open(output_path, "w") as f:
+                json.dump(output, f, indent=2)
+            if memo is not None and cached is None:
+                memo.put(f"pipeline_{name}", fp, output, time.perf_counter() - start)
+            error = None
+        except Exception as e:
+            logger.error(f"Brief {brief.id} failed at {name}: {e}")
+            output, output_path, error = None, None, str(e)
+        self._finish(brief, name, output, output_path, error, time.perf_counter() - start, cached is not None)
+
+    def _finish(self, brief, name, output, output_path, error, seconds, cached=False):
+        ready = []
+        # this task plus any stages it skips; counted down in finally so run() is always released
+        done = 1
+        with self._lock:
+            try:
+                record = self.manifest["briefs"][brief.id]
+                stats = self.manifest["stages"][name]
+                stats["busy_seconds"] += seconds
+                stats["memo_hits"] += int(cached)
+                record["stages"][name] = {"status": "failed" if error else "complete", "seconds": seconds, "output": output_path, "cached": cached, "error": error}
+                if error:
+                    stats["failed"] += 1
+                    record["status"] = "failed"
+                    for skipped in self._descendants(name):
+                        if record["stages"][skipped]["status"] == "pending":
+                            record["stages"][skipped]["status"] = "skipped"
+                            self.manifest["stages"][skipped]["skipped"] += 1
+                            done += 1
+                else:
+                    stats["completed"] += 1
+                    self._outputs[(brief.id, name)] = output
+                    for dependent in self.dependents[name]:
+                        deps_done = all(record["stages"][dep]["status"] == "complete" for dep in self.stages[dependent].deps)
+                        if deps_done and record["stages"][dependent]["status"] == "pending":
+                            record["stages"][dependent]["status"] = "queued"
+                            ready.append(dependent)
+                    if all(s["status"] == "complete" for s in record["stages"].values()):
+                        record["status"] = "complete"
+                        # later stages no longer need the in-memory outputs
+                        for stage_name in self.stages:
+                            self._outputs.pop((brief.id, stage_name), None)
+                try:
+                    self._write_manifest_locked()
+                except (OSError, TypeError, ValueError) as e:
+                    # the run goes on; the final write retries and the error is kept in the manifest
+                    logger.error(f"Could not write {self.manifest_path}: {e}")
+                    self.manifest["manifest_error"] = str(e)
+            except Exception as e:
+                logger.error(f"Could not record {name} for brief {brief.id}: {e}")
+                ready = []
+                # stages after this one will never be submitted, count them down as skipped
+                stages = self.manifest.get("briefs", {}).get(brief.id, {}).get("stages", {})
+                for dependent in self._descendants(name):
+                    if stages.get(dependent, {}).get("status") in ("pending", "queued"):
+                        stages[dependent] = {"status": "skipped"}
+                        done += 1
+            finally:
+                self._pending -= done
+                finished = self._pending == 0
+        for dependent in ready:
+            self._executors[dependent].submit(self._run_task, brief, dependent)
+        if finished:
+            self._done.set()
+
+    def _descendants(self, name):
+        found = []
+        stack = list(self.dependents[name])
+        while stack:
+            current = stack.pop()
+            if current not in found:
+                found.append(current)
+                stack.extend(self.dependents[current])
+        return found
+
+    def _write_manifest_locked(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def run_pipeline(brief_paths, output_dir=None, profile=None, text_params=None, image_params=None, concurrency=None, ad_index=0, memoize=True):
+    """
+    Run the creative pipeline over every brief under brief_paths.
+    With memoize, stages whose fingerprint matches an earlier run reuse that run's output.
+    Returns:
+        manifest (dict): The run manifest, also written to <output_dir>/manifest.json.
+    """
+    output_dir = output_dir or os.path.join(RUNS_DIR, datetime.datetime.now().strftime("%Y%m%d-%H%M%S"))
+    context = {
+        "profile": profile,
+        "text_params": dict(TEXT_PARAMS, **(text_params or {})),
+        "image_params": dict(IMAGE_PARAMS, **(image_params or {})),
+        "ad_index": ad_index,
+        "memo": step_memo.get_memo() if memoize else None,
+    }
+    briefs = load_briefs(brief_paths, output_dir)
+    logger.info(f"Running {len(briefs)} briefs into {output_dir}")
+    return PipelineRunner(default_stages(concurrency), output_dir, context).run(briefs)
+
+
+def parse_concurrency(text):
+    """Parse "image=4,ad=2" into {"image": 4, "ad": 2}."""
+    concurrency = {}
+    for item in filter(None, (i.strip() for i in text.split(","))):
+        name, _, value = item.partition("=")
+        if name not in STAGE_CONCURRENCY:
+            raise ValueError(f"Unknown stage {name}")
+        concurrency[name] = int(value)
+    return concurrency
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Run creative briefs through the brief, design, prompt, image and ad steps without the UI")
+    parser.add_argument("--briefs", nargs="+", required=True, help="Brief files or directories of briefs (images, PDF, TXT, CSV)")
+    parser.add_argument("--output", default=None, help="Run directory, defaults to temp/pipeline/<timestamp>")
+    parser.add_argument("--profile", default=os.getenv("AWS_PROFILE", None), help="AWS CLI profile")
+    parser.add_argument("--text-model", default=TEXT_PARAMS["model_id"], help="Model for the brief, design and prompt steps")
+    parser.add_argument("--image-model", default=IMAGE_PARAMS["model_id"], help="Model for the image step")
+    parser.add_argument("--seed", type=int, default=IMAGE_PARAMS["seed"], help="Image generation seed")
+    parser.add_argument("--ad-index", type=int, default=0, help="Which of the brief's advertisements to produce")
+    parser.add_argument("--concurrency", default="", help="Per-stage workers, e.g. image=4,ad=2")
+    parser.add_argument("--no-memo", action="store_true", help="Recompute every stage even when its inputs are unchanged")
+    args = parser.parse_args()
+    manifest = run_pipeline(
+        args.briefs,
+        args.output,
+        args.profile,
+        text_params={"model_id": args.text_model},
+        image_params={"model_id": args.image_model, "seed": args.seed},
+        concurrency=parse_concurrency(args.concurrency),
+        ad_index=args.ad_index,
+        memoize=not args.no_memo,
+    )
+    statuses = [brief["status"] for brief in manifest["briefs"].values()]
+    print(f"{statuses.count('complete')} of {len(statuses)} briefs complete in {manifest['wall_seconds']:.1f} s")
+    for name, stats in manifest["stages"].items():
+        print(f"  {name:<7} completed {stats['completed']:>4}  failed {stats['failed']:>3}  skipped {stats['skipped']:>3}  memo hits {stats['memo_hits']:>4}  busy {stats['busy_seconds']:.1f} s")
@@ -0,0 +1,123 @@
+"""
+Default prompts for the creative pipeline steps.
+
+Shared by the Streamlit pages, which show them as editable defaults, and the
+headless pipeline runner, which sends them as is.
+"""
+
+CREATIVE_BRIEF_PROMPT = '''You are a Creative Director for a leading advertising agency. 
+Based on the following Creative Brief, analyze and identify the key attributes of the campaign - brand, product, audience. 
+Develop three compelling online digital advertisements based on the analyzed information. 
+In your response, include a unique ad ID (UUID), brand, product, audience, headline, ad copy, call to action, and description of imagery for each. 
+The ad copy should be 20 words or less.
+Format the response as a series of JSON objects according to the template below. Return only the json
+{
+    "advertisements": [
+        {
+            "id": "",
+            "brand": "",
+            "product": "",
+            "audience": "",
+            "image_description": ""
+            "headline": "",
+            "ad_copy": "",
+            "call_to_action": ""
+        },
+        {
+            "id": "",
+            "brand": "",
+            "product": "",
+            "audience": "",
+            "image_description": ""
+            "headline": "",
+            "ad_copy": "",
+            "call_to_action": ""
+        },
+        {
+            "id": "",
+            "brand": "",
+            "product": "",
+            "audience": "",
+            "image_description": ""
+            "headline": "",
+            "ad_copy": "",
+            "call_to_action": ""
+        }
+    ]
+}
+Important: if no media brief is provided, do not produce the analysis.'''
+
+
+def design_description_prompt(advertisement):
+    """Prompt for the design description of one advertisement from the creative brief analysis."""
+    return f'''You are a talented Graphic Designer for a leading advertising agency. Based on the following headline, ad copy, call to action, and description of imagery, describe the design for a compelling online digital advertisement. The advertisement should be designed in a tall, portrait format, with a width of 300 pixels and a height of 600 pixels. The Creative Brief is included for reference.
+{advertisement}'''
+
+
+def image_prompt_prompt(design_description):
+    """Prompt asking for the image generation prompt, mask prompt and negative prompt as JSON."""
+    return f'''You are an expert at optimizing generating large language model prompts for advertising image generation.
+Help the marketing analyst create a concise and effective positive prompt that will provide effective responses from a large language model using the accompanying advertising creative design description.
+Avoid brand logo boxes, text overlays in the image. Return the response in json format "prompt": "","mask_prompt": "","negative_prompt": ""
+Main Prompt should be less than 512 characters. Return only the json object.
+Creative Design description : {design_description}'''
+
+
+EMAIL_PROMPT = '''You are a skilled publicist working for a leading consumer brand
+Write a high-converting marketing email advertising several items available, given the item and user information below. 
+Your email will leverage the power of storytelling and persuasive language.
+You want the email to impress the user, so make it appealing to them based on the information contained in the <user> tags,
+and take into account the user\'s preferred category in the <category> tags.
+The items to recommend and their information is contained in the <item> tag.
+All items in the <item> tag must be recommended. Give a summary of the items and why the user should consider them.
+Use the language of the user to write the email.
+Do not include any information that is not explicitly asked for in the prompt.
+Do not include any information not explicitly asked for in the prompt.
+Do not include any information that is not relevant to the email.
+Put the email between <email> tags.'''
+
+
+def email_prompt(user_html, category_html, items_html):
+    """Personalized email prompt for one user, with the user, category and item tables as HTML."""
+    return EMAIL_PROMPT \
+        + f"\n<user>{user_html}</user>" \
+        + f"\n<category>{category_html}</category>" \
+        + f"\n<item>\n{items_html}\n</item>" \
+        + "\n<email>" \
+        + "\n" \
+        + "\n</email>"
+
+
+# stands in for the reader's name in drafts shared by a whole segment
+NAME_PLACEHOLDER = "[[NAME]]"
+EMAIL_DRAFT_PROMPT = f'''You are a skilled publicist working for a leading consumer brand
+Write a high-converting marketing email advertising several items available, given the item information below. 
+Your email will leverage the power of storytelling and persuasive language.
+Make it appealing to a reader whose preferred category is contained in the <category> tags.
+The items to recommend and their information is contained in the <item> tag.
+All items in the <item> tag must be recommended. Give a summary of the items and why the reader should consider them.
+Write the email in American English and address the reader as {NAME_PLACEHOLDER}.
+Do not include any information that is not explicitly asked for in the prompt.
+Do not include any information that is not relevant to the email.
+Put the email between <email> tags.'''
+
+
+def email_draft_prompt(category_html, items_html):
+    """Canonical email for everyone who shares an item set, translated per language afterwards."""
+    return EMAIL_DRAFT_PROMPT \
+        + f"\n<category>{category_html}</category>" \
+        + f"\n<item>\n{items_html}\n</item>" \
+        + "\n<email>" \
+        + "\n" \
+        + "\n</email>"
+
+
+def email_translation_prompt(draft, language):
+    """Short prompt translating and localizing a canonical email draft."""
+    return f'''Translate the marketing email in the <email> tags into {language}.
+Adapt idioms, units, currency formats and tone for a native {language} reader, keeping the meaning and the persuasive style.
+Keep {NAME_PLACEHOLDER} exactly as it is.
+Put the translated email between <email> tags.
+<email>
+{draft}
+</email>'''
@@ -0,0 +1,216 @@
+"""
+Opt-in on-disk cache for deterministic image generation responses.
+
+Requests with a fixed seed return the same images, so the response can be
+replayed instead of paying for another invoke_model call. Entries are keyed by
+(modelId, hash of the canonicalized request body). Generated images are stored
+as decoded bytes next to a small JSON manifest instead of as base64 text and
+are returned as bytes, the same shape payload_codec.decode_response produces.
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+CACHE_DIR = f"{os.getcwd()}/temp/response_cache"
+MAX_CACHE_BYTES = 1024 * 1024 * 1024
+TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def canonical_body(body):
+    """Re-serialize a JSON request body with sorted keys and no whitespace."""
+    if isinstance(body, (bytes, bytearray)):
+        body = body.decode("utf-8")
+    return json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"))
+
+
+def make_key(model_id, body):
+    """Cache key for an invoke_model call."""
+    digest = hashlib.sha256(canonical_body(body).encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{model_id}|{digest}".encode("utf-8")).hexdigest()
+
+
+def is_cacheable(model_id, body):
+    """Only image models with a pinned seed produce repeatable output."""
+    if "stability" not in model_id and "amazon.titan-image" not in model_id:
+        return False
+    request = json.loads(body)
+    seed = request.get("seed", request.get("imageGenerationConfig", {}).get("seed"))
+    # Stability treats seed 0 as "pick a random seed"
+    if "stability" in model_id and not seed:
+        return False
+    return True
+
+
+def _decoded(value):
+    return bytes(value) if isinstance(value, (bytes, bytearray)) else base64.b64decode(value)
+
+
+def _split_images(response_body):
+    # pull the base64 payloads out of the response and leave index placeholders behind
+    manifest = dict(response_body)
+    images = []
+    if isinstance(manifest.get("images"), list):
+        placeholders = []
+        for item in manifest["images"]:
+            placeholders.append({"__image__": len(images)})
+            images.append(_decoded(item))
+        manifest["images"] = placeholders
+    if isinstance(manifest.get("artifacts"), list):
+        artifacts = []
+        for artifact in manifest["artifacts"]:
+            artifact = dict(artifact)
+            if artifact.get("base64"):
+                image_bytes = _decoded(artifact["base64"])
+                artifact["base64"] = {"__image__": len(images)}
+                images.append(image_bytes)
+            artifacts.append(artifact)
+        manifest["artifacts"] = artifacts
+    return manifest, images
+
+
+def _join_images(manifest, images):
+    def restore(value):
+        return images[value["__image__"]]
+    response_body = dict(manifest)
+    if isinstance(response_body.get("images"), list):
+        response_body["images"] = [restore(item) for item in response_body["images"]]
+    if isinstance(response_body.get("artifacts"), list):
+        artifacts = []
+        for artifact in response_body["artifacts"]:
+            artifact = dict(artifact)
+            if isinstance(artifact.get("base64"), dict):
+                artifact["base64"] = restore(artifact["base64"])
+            artifacts.append(artifact)
+        response_body["artifacts"] = artifacts
+    return response_body
+
+
+class ResponseCache:
+    """Directory-per-entry LRU bounded by total bytes and entry age."""
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, ttl=TTL_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """Return the cached response body, or None on a miss or expired entry."""
+        entry_dir = self._entry_dir(key)
+        manifest_path = os.path.join(entry_dir, "response.json")
+        try:
+            if time.time() - os.path.getmtime(manifest_path) > self.ttl:
+                self.invalidate(key)
+                raise OSError("expired")
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            images = []
+            for i in range(manifest.pop("__image_count__")):
+                with open(os.path.join(entry_dir, f"image_{i}.bin"), "rb") as f:
+                    images.append(f.read())
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        # touch the entry so pruning evicts least recently used entries first; a concurrent prune may
+        # already have removed it, which does not affect the response read above
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+        with self._lock:
+            self._stats["hits"] += 1
+        return _join_images(manifest, images)
+
+    def put(self, key, response_body):
+        """Store a response body, writing generated images as raw bytes."""
+        manifest, images = _split_images(response_body)
+        manifest["__image_count__"] = len(images)
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp{threading.get_ident()}"
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+            for i, image_bytes in enumerate(images):
+                with open(os.path.join(tmp_dir, f"image_{i}.bin"), "wb") as f:
+                    f.write(image_bytes)
+            with open(os.path.join(tmp_dir, "response.json"), "w") as f:
+                json.dump(manifest, f)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except OSError as e:
+            logger.error(f"Could not store response cache entry: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        with self._lock:
+            self._stats["stores"] += 1
+        try:
+            self.prune()
+        except OSError as e:
+            # the response is stored and paid for; a failed eviction must not surface as a call error
+            logger.warning(f"Could not prune response cache: {e}")
+
+    def invalidate(self, key=None):
+        """Drop one entry, or the whole cache when key is None."""
+        if key is None:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            logger.info("Response cache cleared")
+        else:
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def prune(self):
+        """Evict expired entries, then least recently used ones until under max_bytes."""
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        entries = []
+        for name in names:
+            entry_dir = self._entry_dir(name)
+            if ".tmp" in name or not os.path.isdir(entry_dir):
+                continue
+            try:
+                size = sum(e.stat().st_size for e in os.scandir(entry_dir))
+                mtime = os.path.getmtime(entry_dir)
+            except OSError:
+                # another session evicted it since listdir
+                continue
+            entries.append((mtime, size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        evicted = 0
+        for mtime, size, name in entries:
+            if now - mtime <= self.ttl and total <= self.max_bytes:
+                break
+            self.invalidate(name)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._stats["evictions"] += evicted
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide response cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+    return _cache
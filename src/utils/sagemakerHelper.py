@@ -1,11 +1,11 @@
 import sagemaker
-import boto3
 from PIL import Image
 import base64
 import io
 from sagemaker.huggingface import HuggingFaceModel
 import logging
 import json
+from src.utils import client_registry
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 assets_dir = "../../assets"
@@ -59,8 +59,7 @@ def deploy_hf_model(boto_session, hub_env, instance_type, role_name):
 def run_inference(prompt, image_path, profile_name, endpoint_name, image_format = 'JPEG'):
     # setup clients
     # Create a SageMaker runtime client
-    boto_session = boto3.Session(profile_name=profile_name)
-    runtime = boto_session.client('sagemaker-runtime')
+    runtime = client_registry.get_client('sagemaker-runtime', profile_name)
     
     # Open the image
     # image = Image.open(f"{original_dir}/AdobeStock_185274335.jpeg")
@@ -0,0 +1,445 @@
+"""
+Semantic item retrieval for the personalized email recommendations.
+
+Every catalog item's name and description is embedded once (Titan text
+embeddings on Bedrock, or the local hashing embedder without AWS access) and
+stored under temp/semantic_index/<domain>/ as a memory-mapped float32 matrix
+of unit vectors, with the catalog row position of each vector alongside.
+Rebuilds are incremental: vectors are keyed by a hash of the embedded text, so
+only new or edited rows are embedded again.
+
+Large catalogs are partitioned into clusters (spherical k-means) and the
+matrix is stored cluster by cluster. A query scores the centroids, then the
+rows of the nprobe closest clusters as contiguous slices, which keeps cosine
+top-k in the low milliseconds at a million items. Catalogs below
+CLUSTER_MIN_ROWS are a single cluster and always searched exactly.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from src.utils import bedrock_scheduler, client_registry, item_catalog, item_index
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+INDEX_DIR = f"{os.getcwd()}/temp/semantic_index"
+EMBED_MODEL_ID = "amazon.titan-embed-text-v2:0"
+# Titan text v2 supports 256, 512 or 1024; 256 keeps a million items at 1 GB
+DIMENSIONS = 256
+EMBED_CONCURRENCY = 8
+MAX_TEXT_CHARS = 2000
+# catalogs smaller than this are searched exactly
+CLUSTER_MIN_ROWS = 50_000
+MAX_CLUSTERS = 1024
+KMEANS_SAMPLE = 50_000
+KMEANS_ITERATIONS = 8
+DEFAULT_NPROBE = 16
+# rows embedded or assigned per matrix product
+CHUNK_ROWS = 65_536
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class LocalEmbedder:
+    """
+    Deterministic hashing embedder: word and word-bigram counts hashed into DIMENSIONS signed buckets.
+    Stands in for Titan without AWS access; items sharing words land close together.
+    """
+    name = "local-hashing"
+
+    def __init__(self, dimensions=DIMENSIONS):
+        self.dimensions = dimensions
+        self._buckets = {}
+
+    def _bucket(self, token):
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            h = zlib.crc32(token.encode("utf-8"))
+            bucket = (h % self.dimensions, 1.0 if h & 0x80000000 else -1.0)
+            self._buckets[token] = bucket
+        return bucket
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _TOKEN_RE.findall(text.lower())
+            for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                column, sign = self._bucket(token)
+                vectors[row, column] += sign
+        return normalize(vectors)
+
+
+class TitanEmbedder:
+    """Titan text embeddings, one InvokeModel call per text, queued as batch work on the shared scheduler."""
+    name = EMBED_MODEL_ID
+
+    def __init__(self, profile="default", dimensions=DIMENSIONS, concurrency=EMBED_CONCURRENCY):
+        self.profile = profile
+        self.dimensions = dimensions
+        self.concurrency = concurrency
+
+    def _embed_one(self, text):
+        client = client_registry.get_client("bedrock-runtime", self.profile)
+        body = json.dumps({"inputText": text[:MAX_TEXT_CHARS] or " ", "dimensions": self.dimensions, "normalize": True})
+
+        def call():
+            response = client.invoke_model(modelId=EMBED_MODEL_ID, body=body, accept="application/json", contentType="application/json")
+            return json.loads(response["body"].read())["embedding"]
+
+        return bedrock_scheduler.get_scheduler().invoke(EMBED_MODEL_ID, call, bedrock_scheduler.BATCH)
+
+    def embed(self, texts):
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="titan-embed") as executor:
+            vectors = np.array(list(executor.map(self._embed_one, texts)), dtype=np.float32)
+        return normalize(vectors.reshape(len(texts), self.dimensions))
+
+
+def normalize(vectors):
+    """Scale rows to unit length so a dot product is the cosine similarity; zero rows stay zero."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def item_texts(data, name, description, **_):
+    """The text embedded for each catalog row: name and description, as in the item_index DOMAINS spec."""
+    descriptions = description(data) if callable(description) else data[description]
+    return (data[name].fillna("").astype(str) + ". " + descriptions.fillna("").astype(str)).tolist()
+
+
+def text_keys(texts):
+    """16-byte content hash per text; an unchanged row keeps its key and its vector across rebuilds."""
+    return np.array([hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest() for text in texts], dtype="S16")
+
+
+def _kmeans(vectors, clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    # spherical k-means on a sample: centroids are renormalized means, empty clusters keep their old centroid
+    rng = np.random.default_rng(seed)
+    sample = vectors[np.sort(rng.choice(len(vectors), min(len(vectors), KMEANS_SAMPLE), replace=False))]
+    centroids = sample[rng.choice(len(sample), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        filled, starts = np.unique(assignment[order], return_index=True)
+        centroids[filled] = normalize(np.add.reduceat(sample[order], starts, axis=0))
+    return centroids
+
+
+def _assign(vectors, centroids):
+    return np.concatenate([
+        np.argmax(vectors[start:start + CHUNK_ROWS] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), CHUNK_ROWS)
+    ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+
+class SemanticIndex:
+    def __init__(self, index_dir):
+        """
+        Open a built index; the vectors stay on disk and are paged in by the OS as queries touch them.
+        Args:
+            index_dir (str): Directory written by build_index.
+        """
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        rows, dimensions = self.meta["rows"], self.meta["dimensions"]
+        self.vectors = np.memmap(os.path.join(index_dir, "vectors.f32"), dtype=np.float32, mode="r", shape=(rows, dimensions)) if rows else np.empty((0, dimensions), dtype=np.float32)
+        self.positions = np.load(os.path.join(index_dir, "positions.npy"))
+        self.keys = np.load(os.path.join(index_dir, "keys.npy"))
+        self.centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"))
+
+    def search(self, query, n=3, nprobe=DEFAULT_NPROBE):
+        """
+        Cosine top-n for one query vector.
+        Args:
+            query (ndarray): Unit query vector from the index's embedder.
+            n (int): Results to return.
+            nprobe (int): Clusters searched; ignored for single-cluster indexes. More is slower and closer to exact.
+        Returns:
+            (positions, scores): Catalog row positions and cosine similarities, best first.
+        """
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if len(self.centroids) <= 1 or nprobe >= len(self.centroids):
+            slices = [(0, len(self.positions))]
+        else:
+            probe = np.argpartition(-(self.centroids @ query), nprobe)[:nprobe]
+            slices = [(self.offsets[c], self.offsets[c + 1]) for c in np.sort(probe)]
+        ranges = [np.arange(start, end) for start, end in slices if end > start]
+        if not ranges:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate(ranges)
+        scores = np.concatenate([self.vectors[start:end] @ query for start, end in slices if end > start])
+        n = min(n, len(scores))
+        best = np.argpartition(-scores, n - 1)[:n] if n < len(scores) else np.arange(len(scores))
+        # best score first, stored order between ties
+        best = best[np.lexsort((rows[best], -scores[best]))]
+        return self.positions[rows[best]], scores[best]
+
+
+def build_index(texts, index_dir, embedder, signature=None, previous=None):
+    """
+    Embed texts and write an index, reusing the vectors of texts the previous index already holds.
+    Args:
+        texts (list): One text per catalog row, in catalog order.
+        index_dir (str): Destination directory, replaced atomically.
+        embedder: LocalEmbedder or TitanEmbedder.
+        signature (dict): Catalog signature recorded in meta.json.
+        previous (SemanticIndex): Index to reuse vectors from; ignored when built with another embedder.
+    Returns:
+        index (SemanticIndex): The new index.
+    """
+    start = time.perf_counter()
+    keys = text_keys(texts)
+    vectors = np.zeros((len(texts), embedder.dimensions), dtype=np.float32)
+    missing = np.ones(len(texts), dtype=bool)
+    if previous is not None and previous.meta["embedder"] == embedder.name and previous.meta["dimensions"] == embedder.dimensions and len(previous.keys):
+        order = np.argsort(previous.keys)
+        found = np.searchsorted(previous.keys, keys, sorter=order)
+        found = order[np.minimum(found, len(order) - 1)]
+        reused = previous.keys[found] == keys
+        vectors[reused] = previous.vectors[found[reused]]
+        missing = ~reused
+    # embed each distinct new text once
+    todo = np.flatnonzero(missing)
+    unique_keys, first, inverse = np.unique(keys[todo], return_index=True, return_inverse=True)
+    embedded = np.empty((len(unique_keys), embedder.dimensions), dtype=np.float32)
+    for chunk in range(0, len(unique_keys), CHUNK_ROWS):
+        rows = todo[first[chunk:chunk + CHUNK_ROWS]]
+        embedded[chunk:chunk + CHUNK_ROWS] = embedder.embed([texts[row] for row in rows])
+    vectors[todo] = embedded[inverse.reshape(-1)]
+    embed_seconds = time.perf_counter() - start
+
+    clusters = min(MAX_CLUSTERS, int(np.sqrt(len(texts)))) if len(texts) >= CLUSTER_MIN_ROWS else 1
+    if clusters > 1:
+        # an incremental rebuild keeps the partition and only assigns rows to it
+        reuse = previous is not None and not missing.all() and len(previous.centroids) == clusters
+        centroids = previous.centroids if reuse else _kmeans(vectors, clusters)
+        assignment = _assign(vectors, centroids)
+    else:
+        centroids = normalize(vectors.sum(axis=0, keepdims=True)) if len(texts) else np.zeros((1, embedder.dimensions), dtype=np.float32)
+        assignment = np.zeros(len(texts), dtype=np.int64)
+    order = np.argsort(assignment, kind="stable")
+    offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+
+    os.makedirs(os.path.dirname(index_dir) or ".", exist_ok=True)
+    tmp_dir = f"{index_dir}.tmp{threading.get_ident()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        if len(texts):
+            stored = np.memmap(os.path.join(tmp_dir, "vectors.f32"), dtype=np.float32, mode="w+", shape=vectors.shape)
+            stored[:] = vectors[order]
+            stored.flush()
+            del stored
+        np.save(os.path.join(tmp_dir, "positions.npy"), order)
+        np.save(os.path.join(tmp_dir, "keys.npy"), keys[order])
+        np.save(os.path.join(tmp_dir, "centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+        meta = {
+            "embedder": embedder.name,
+            "dimensions": embedder.dimensions,
+            "rows": len(texts),
+            "clusters": len(centroids),
+            "embedded": len(unique_keys),
+            "signature": signature,
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        shutil.rmtree(index_dir, ignore_errors=True)
+        os.replace(tmp_dir, index_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    logger.info(f"Indexed {len(texts)} items into {len(centroids)} clusters, embedded {len(unique_keys)} new texts "
+                f"in {embed_seconds:.2f} s, total {time.perf_counter() - start:.2f} s")
+    return SemanticIndex(index_dir)
+
+
+def _open(index_dir):
+    try:
+        return SemanticIndex(index_dir)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_embedders = {}
+_embedders_lock = threading.Lock()
+# one lock per (domain, embedder) so a build only blocks lookups of the index it is building
+_build_locks = {}
+_building = set()
+
+
+def get_embedder(local=False, profile="default"):
+    """The shared local embedder, or the Titan embedder for a profile."""
+    key = "local" if local else profile
+    with _embedders_lock:
+        embedder = _embedders.get(key)
+        if embedder is None:
+            embedder = LocalEmbedder() if local else TitanEmbedder(profile)
+            _embedders[key] = embedder
+    return embedder
+
+
+def _current_index(domain, embedder, index_dir):
+    # (data, index or None, stale index or None, index dir, catalog signature); index is None when a build is needed
+    data = item_catalog.get_catalog(domain)
+    key = (domain, embedder.name)
+    with _indexes_lock:
+        cached = _indexes.get(key)
+    if cached is not None and cached[0] is data:
+        return data, cached[1], None, None, None
+    domain_dir = os.path.join(index_dir, domain, embedder.name.replace(":", "_"))
+    signature = item_catalog.source_signature(item_catalog.CATALOGS[domain]["csv"])
+    index = _open(domain_dir)
+    if index is None or index.meta["signature"] != signature or index.meta["rows"] != len(data):
+        return data, None, index, domain_dir, signature
+    with _indexes_lock:
+        _indexes[key] = (data, index)
+    return data, index, None, domain_dir, signature
+
+
+def get_index(domain, embedder=None, index_dir=INDEX_DIR, build=True):
+    """
+    Semantic index over the current catalog of a domain.
+    Opened from disk when it matches the catalog CSV and embedder, otherwise rebuilt incrementally.
+    A build embeds every new catalog row (one Titan call each), so interactive callers pass build=False
+    and get None until the index has been built by the CLI or build_index_async.
+    """
+    embedder = embedder or get_embedder()
+    key = (domain, embedder.name)
+    data, index, previous, domain_dir, signature = _current_index(domain, embedder, index_dir)
+    if index is not None or not build:
+        return index
+    with _indexes_lock:
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    with build_lock:
+        # another thread may have finished the same build while this one waited
+        data, index, previous, domain_dir, signature = _current_index(domain, embedder, index_dir)
+        if index is None:
+            index = build_index(item_texts(data, **item_index.DOMAINS[domain]), domain_dir, embedder, signature, previous)
+            with _indexes_lock:
+                _indexes[key] = (data, index)
+    return index
+
+
+def build_index_async(domain, embedder=None, index_dir=INDEX_DIR):
+    """
+    Build a domain's index in a daemon thread, at most one build per domain and embedder at a time.
+    Returns:
+        thread (Thread): The build thread, or None when a build is already running.
+    """
+    embedder = embedder or get_embedder()
+    key = (domain, embedder.name)
+    with _indexes_lock:
+        if key in _building:
+            return None
+        _building.add(key)
+
+    def build():
+        try:
+            get_index(domain, embedder, index_dir)
+        except Exception as e:
+            logger.error(f"Could not build the {domain} semantic index: {e!r}")
+        finally:
+            with _indexes_lock:
+                _building.discard(key)
+
+    thread = threading.Thread(target=build, name=f"semantic-index-{domain}", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_semantic_items(domain, query, n=3, embedder=None, nprobe=DEFAULT_NPROBE, build=True):
+    """
+    Best n items of a domain for a free-text interest such as "cozy winter jacket".
+    Args:
+        build (bool): Build a missing or outdated index first; with False, return None instead.
+    Returns:
+        items (DataFrame): name, description and score columns, most similar first.
+    """
+    embedder = embedder or get_embedder()
+    index = get_index(domain, embedder, build=build)
+    if index is None:
+        return None
+    positions, scores = index.search(embedder.embed([query])[0], n, nprobe)
+    data = item_catalog.get_catalog(domain)
+    spec = item_index.DOMAINS[domain]
+    items = data.iloc[positions]
+    descriptions = spec["description"](items) if callable(spec["description"]) else items[spec["description"]]
+    return pd.DataFrame({"name": items[spec["name"]], "description": descriptions, "score": scores}, index=items.index)
+
+
+def _synthetic_texts(rows, seed=0):
+    # items are drawn from a few hundred product lines, each with its own vocabulary, plus shared words
+    rng = np.random.default_rng(seed)
+    words = np.array(["cozy", "winter", "jacket", "running", "shoe", "trail", "waterproof", "light", "warm", "fleece",
+                      "soccer", "cleat", "kids", "women", "men", "classic", "retro", "leather", "summer", "shorts",
+                      "hoodie", "training", "track", "pants", "cap", "bag", "sock", "boot", "insulated", "breathable"])
+    lines = rng.integers(0, len(words), (300, 5))
+    picks = np.concatenate([words[lines[rng.integers(0, len(lines), rows)]], words[rng.integers(0, len(words), (rows, 2))]], axis=1)
+    return [" ".join(row) for row in picks]
+
+
+def benchmark_search(sizes=(10_000, 1_000_000), queries=("cozy winter jacket", "kids soccer cleat", "waterproof trail shoe"), nprobe=DEFAULT_NPROBE):
+    """Build local-embedder indexes over synthetic catalogs and time exact and clustered queries."""
+    import tempfile
+    embedder = LocalEmbedder()
+    query_vectors = embedder.embed(list(queries))
+    results = {}
+    for rows in sizes:
+        texts = _synthetic_texts(rows)
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            index = build_index(texts, os.path.join(tmp, "index"), embedder)
+            build_seconds = time.perf_counter() - start
+            timings = {}
+            for label, probe in (("exact", len(index.centroids)), ("probe", nprobe)):
+                index.search(query_vectors[0], 10, probe)
+                start = time.perf_counter()
+                found = [index.search(query, 10, probe)[1] for query in query_vectors]
+                timings[label] = ((time.perf_counter() - start) * 1000 / len(queries), found)
+            # synthetic items tie a lot, so a probed result counts when it scores as well as the exact 10th
+            recall = np.mean([np.mean(probed >= exact[-1] - 1e-6) for exact, probed in zip(timings["exact"][1], timings["probe"][1])])
+            texts.append("cozy winter jacket, now in red")
+            start = time.perf_counter()
+            build_index(texts, os.path.join(tmp, "index"), embedder, previous=index)
+            rebuild_seconds = time.perf_counter() - start
+            del index
+        results[rows] = {"build_s": build_seconds, "rebuild_s": rebuild_seconds, "exact_ms": timings["exact"][0],
+                         "probe_ms": timings["probe"][0], "recall_at_10": recall}
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Build semantic item indexes or benchmark search")
+    parser.add_argument("--domain", action="append", choices=list(item_index.DOMAINS), help="Catalog to index, defaults to all")
+    parser.add_argument("--query", default=None, help="Print the best items for this interest after building")
+    parser.add_argument("--local", action="store_true", help="Use the local hashing embedder instead of Titan")
+    parser.add_argument("--profile", default="default", help="AWS CLI profile for Titan embeddings")
+    parser.add_argument("--benchmark", type=int, nargs="*", default=None, help="Benchmark synthetic catalogs of these sizes instead")
+    args = parser.parse_args()
+    if args.benchmark is not None:
+        for rows, result in benchmark_search(args.benchmark or (10_000, 1_000_000)).items():
+            print(f"{rows:>9} rows: build {result['build_s']:7.2f} s  incremental rebuild {result['rebuild_s']:6.2f} s  "
+                  f"exact {result['exact_ms']:7.2f} ms  nprobe {DEFAULT_NPROBE} {result['probe_ms']:6.2f} ms  "
+                  f"recall@10 {result['recall_at_10']:.2f}")
+    else:
+        embedder = get_embedder(args.local, args.profile)
+        for domain in args.domain or item_index.DOMAINS:
+            try:
+                get_index(domain, embedder)
+            except KeyError as e:
+                logger.error(f"Cannot index {domain}: missing column {e}")
+                continue
+            if args.query:
+                print(get_semantic_items(domain, args.query, embedder=embedder).to_string())
@@ -0,0 +1,193 @@
+"""
+Input-fingerprint memoization for the creative pipeline steps.
+
+A step's fingerprint hashes everything that can change its output: the step
+name, prompt, model, inference parameters and the content hashes of its
+upstream artifacts. When a step is run again with the same fingerprint its
+recorded output is reused, so only steps downstream of an actual change are
+recomputed. Outputs are stored as JSON under temp/step_memo/<step>/<fingerprint>/;
+any file an output points to (generated images, composed ads) is copied next to
+it and copied back out on a hit.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+MEMO_DIR = f"{os.getcwd()}/temp/step_memo"
+MAX_AGE_SECONDS = 30 * 24 * 60 * 60
+# parameters that only control caching and never change a step's output
+IGNORED_PARAMS = ("use_cache", "bypass_cache", "reuse_steps")
+
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+
+def file_hash(path):
+    """sha256 of a file's contents, remembered per (path, size, mtime) so reruns do not rehash."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        digest = _file_hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with _file_hashes_lock:
+            _file_hashes[key] = digest
+    return digest
+
+
+def _is_file(value):
+    return isinstance(value, str) and len(value) < 4096 and "\n" not in value and os.path.isfile(value)
+
+
+def _hashable(value):
+    # files are identified by content, not by the run directory they happen to live in
+    if isinstance(value, dict):
+        return {str(k): _hashable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_hashable(v) for v in value]
+    if isinstance(value, (bytes, bytearray)):
+        return {"__sha256__": hashlib.sha256(value).hexdigest()}
+    if _is_file(value):
+        return {"__file__": file_hash(value)}
+    return value
+
+
+def artifact_hash(value):
+    """Content hash of an artifact: JSON values, raw bytes, or outputs referencing files."""
+    canonical = json.dumps(_hashable(value), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def fingerprint(step, prompt=None, model_id=None, params=None, upstream=None):
+    """
+    Fingerprint one run of a step.
+    Args:
+        step (str): Step name, e.g. creative_brief_analysis.
+        prompt (str): The prompt sent to the model, if any.
+        model_id (str): The model the step calls, if any.
+        params (dict): Inference or layout parameters; caching switches are ignored.
+        upstream (dict): Upstream artifacts or file paths by name; only their content hashes are used.
+    Returns:
+        fingerprint (str): Hex digest identifying the step's inputs.
+    """
+    params = {k: v for k, v in (params or {}).items() if k not in IGNORED_PARAMS}
+    return artifact_hash({
+        "step": step,
+        "prompt": prompt,
+        "model_id": model_id,
+        "params": params,
+        "upstream": {name: artifact_hash(value) for name, value in (upstream or {}).items()},
+    })
+
+
+def _store_files(value, entry_dir):
+    # copy every referenced file into the entry and leave a marker with its name
+    if isinstance(value, dict):
+        return {k: _store_files(v, entry_dir) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_store_files(v, entry_dir) for v in value]
+    if _is_file(value):
+        name = os.path.basename(value)
+        shutil.copyfile(value, os.path.join(entry_dir, name))
+        return {"__memo_file__": name}
+    return value
+
+
+def _restore_files(value, entry_dir, dest_dir):
+    if isinstance(value, dict):
+        if len(value) == 1 and "__memo_file__" in value:
+            source = os.path.join(entry_dir, value["__memo_file__"])
+            if dest_dir is None:
+                return source
+            os.makedirs(dest_dir, exist_ok=True)
+            dest = os.path.join(dest_dir, value["__memo_file__"])
+            shutil.copyfile(source, dest)
+            return dest
+        return {k: _restore_files(v, entry_dir, dest_dir) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_restore_files(v, entry_dir, dest_dir) for v in value]
+    return value
+
+
+class StepMemo:
+    def __init__(self, memo_dir=MEMO_DIR, max_age=MAX_AGE_SECONDS):
+        self.memo_dir = memo_dir
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _entry_dir(self, step, fp):
+        return os.path.join(self.memo_dir, step, fp)
+
+    def _count(self, step, key, amount=1):
+        with self._lock:
+            stats = self._stats.setdefault(step, {"hits": 0, "misses": 0, "stores": 0, "saved_seconds": 0.0})
+            stats[key] += amount
+
+    def get(self, step, fp, dest_dir=None):
+        """
+        Return the recorded output for a fingerprint, or None.
+        Files the output references are copied into dest_dir, or point into the memo entry when it is None.
+        """
+        entry_dir = self._entry_dir(step, fp)
+        try:
+            path = os.path.join(entry_dir, "output.json")
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                raise OSError("expired")
+            with open(path, "r") as f:
+                entry = json.load(f)
+            output = _restore_files(entry["output"], entry_dir, dest_dir)
+        except (OSError, ValueError, KeyError):
+            self._count(step, "misses")
+            return None
+        self._count(step, "hits")
+        self._count(step, "saved_seconds", entry.get("seconds", 0.0))
+        logger.info(f"Reusing {step} output for unchanged inputs")
+        return output
+
+    def put(self, step, fp, output, seconds=0.0):
+        """Record a step's output, copying any files it references into the memo entry."""
+        entry_dir = self._entry_dir(step, fp)
+        tmp_dir = f"{entry_dir}.tmp{threading.get_ident()}"
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+            stored = _store_files(output, tmp_dir)
+            with open(os.path.join(tmp_dir, "output.json"), "w") as f:
+                json.dump({"output": stored, "seconds": seconds, "created": time.time()}, f)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except (OSError, TypeError) as e:
+            logger.error(f"Could not memoize {step}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        self._count(step, "stores")
+
+    def stats(self, step=None):
+        """Per-step hits, misses, stores and the model time saved by hits."""
+        with self._lock:
+            if step is not None:
+                return dict(self._stats.get(step, {"hits": 0, "misses": 0, "stores": 0, "saved_seconds": 0.0}))
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def get_memo():
+    """Return the process-wide step memo."""
+    global _memo
+    with _memo_lock:
+        if _memo is None:
+            _memo = StepMemo()
+    return _memo
@@ -0,0 +1,251 @@
+"""
+Consumer profiles for the personalized email page and batch email runs.
+
+generate_population draws millions of profiles in vectorized chunks (names
+from Faker's weighted first and last name lists) and write_population streams
+them into Parquet with bounded memory. Setting USER_POPULATION to such a file
+makes get_user_profile pick its consumer from it, for load tests of the email
+page.
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from argparse import ArgumentParser
+import faker
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from faker.providers.person.en_US import Provider as PersonProvider
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO)
+
+CATEGORIES = ({'domain': 'movie', 'category': 'Drama'},
+    {'domain': 'movie', 'category': 'Action'},
+    {'domain': 'movie', 'category': 'Adventure'},
+    {'domain': 'movie', 'category': 'Comedy'},
+    {'domain': 'movie', 'category': 'Sci-Fi'},
+    {'domain': 'retail', 'category': 'Kids/Accessories'},
+    {'domain': 'retail', 'category': 'Kids/Clothing'},
+    {'domain': 'retail', 'category': 'Kids/Shoes'},
+    {'domain': 'retail', 'category': 'Men/Accessories'},
+    {'domain': 'retail', 'category': 'Men/Clothing'},
+    {'domain': 'retail', 'category': 'Men/Shoes'},
+    {'domain': 'retail', 'category': 'Running/Accessories'},
+    {'domain': 'retail', 'category': 'Running/Shoes'},
+    {'domain': 'retail', 'category': 'Soccer/Accessories'},
+    {'domain': 'retail', 'category': 'Soccer/Shoes'},
+    {'domain': 'retail', 'category': 'Women/Accessories'},
+    {'domain': 'retail', 'category': 'Women/Clothing'},
+    {'domain': 'retail', 'category': 'Women/Shoes'},
+    {'domain': 'travel', 'category': 'Beijing'},
+    {'domain': 'travel', 'category': 'Guangzhou'},
+    {'domain': 'travel', 'category': 'Hong Kong'},
+    {'domain': 'travel', 'category': 'London'},
+    {'domain': 'travel', 'category': 'New York'},
+    {'domain': 'travel', 'category': 'Seoul'},
+    {'domain': 'travel', 'category': 'Shanghai'},
+    {'domain': 'travel', 'category': 'Sydney'},
+    {'domain': 'travel', 'category': 'Tokyo'})
+LANGUAGES = ('American English', 'Common Wealth English', 'Spanish', 'French', 'German', 'Italian', 'Portuguese', 'Dutch',
+             'Russian', 'Chinese', 'Japanese', 'Korean', 'Arabic', 'Hindi')
+POPULATION_DIR = f"{os.getcwd()}/temp/users"
+# path of a population Parquet file get_user_profile draws from instead of Faker
+POPULATION_ENV = "USER_POPULATION"
+# profiles generated and written per chunk, one Parquet row group each
+CHUNK_ROWS = 250_000
+
+
+def random_profile(fake=None):
+    """One random consumer profile as a dict."""
+    fake = fake or faker.Faker()
+    return {
+        "user_id": fake.random_int(min=1, max=999),
+        "name": fake.name(),
+        # "age": fake.random_int(min=18, max=75),
+        "fav_category": fake.random_element(elements=CATEGORIES),
+        "language": fake.random_element(elements=LANGUAGES),
+        }
+
+
+def get_user_profile():
+    """One random consumer profile, flattened into a one-row DataFrame (fav_category.domain, ...)."""
+    population = os.environ.get(POPULATION_ENV)
+    if population:
+        return sample_population(population)
+    # load to a pandas data frame
+    user_df = pd.json_normalize(random_profile())
+    return user_df
+
+
+def profile_html(user):
+    """
+    The user and category tables the email prompt embeds, rendered like the email page renders them.
+    Returns:
+        (user_html, category_html): HTML tables for the <user> and <category> tags.
+    """
+    user_df = pd.json_normalize(user)
+    category_df = user_df[['fav_category.domain', 'fav_category.category']]
+    return user_df.to_html(escape=False, index=False), category_df.to_html(escape=False, index=False)
+
+
+def generate_users(count, seed=None):
+    """
+    Random consumer profiles for a segment.
+    Args:
+        count (int): Number of profiles.
+        seed (int): Makes the segment reproducible.
+    Returns:
+        users (list): Profile dicts with user_id 1..count, unique within the segment.
+    """
+    fake = faker.Faker()
+    if seed is not None:
+        fake.seed_instance(seed)
+    users = []
+    for user_id in range(1, count + 1):
+        user = random_profile(fake)
+        user["user_id"] = user_id
+        users.append(user)
+    return users
+
+
+def load_users(path, limit=None):
+    """Read profiles from a JSONL file, one profile dict per line, or from a population Parquet file."""
+    if path.endswith(".parquet"):
+        users = []
+        for frame in iter_population(path):
+            users.extend(population_users(frame))
+            if limit is not None and len(users) >= limit:
+                break
+        return users[:limit]
+    with open(path, "r") as f:
+        users = [json.loads(line) for line in f if line.strip()]
+    return users[:limit]
+
+
+def write_users(users, path):
+    """Write profiles to a JSONL file, one profile dict per line."""
+    with open(path, "w") as f:
+        for user in users:
+            f.write(json.dumps(user) + "\n")
+
+
+def _weighted(names):
+    # Faker keeps en_US names as name -> relative frequency
+    if isinstance(names, dict):
+        weights = np.array(list(names.values()), dtype=float)
+        return np.array(list(names), dtype=object), weights / weights.sum()
+    return np.array(list(names), dtype=object), None
+
+
+FIRST_NAMES, FIRST_NAME_WEIGHTS = _weighted(PersonProvider.first_names)
+LAST_NAMES, LAST_NAME_WEIGHTS = _weighted(PersonProvider.last_names)
+
+
+def generate_population(count, seed=None, chunk_rows=CHUNK_ROWS, start_id=1):
+    """
+    Random consumer profiles in vectorized chunks.
+    Args:
+        count (int): Number of profiles.
+        seed (int): The same seed and chunk_rows give the same population.
+        chunk_rows (int): Profiles per chunk; memory stays bounded by one chunk.
+        start_id (int): user_id of the first profile; ids are consecutive and unique.
+    Yields:
+        frame (DataFrame): user_id, name, language, fav_category.domain and fav_category.category columns,
+            as get_user_profile returns them, with categorical language and category columns.
+    """
+    rng = np.random.default_rng(seed)
+    domains = pd.Categorical([c["domain"] for c in CATEGORIES])
+    categories = pd.Categorical([c["category"] for c in CATEGORIES])
+    languages = pd.Categorical(LANGUAGES)
+    for offset in range(0, count, chunk_rows):
+        rows = min(chunk_rows, count - offset)
+        first = FIRST_NAMES[rng.choice(len(FIRST_NAMES), rows, p=FIRST_NAME_WEIGHTS)]
+        last = LAST_NAMES[rng.choice(len(LAST_NAMES), rows, p=LAST_NAME_WEIGHTS)]
+        category = rng.integers(0, len(CATEGORIES), rows)
+        yield pd.DataFrame({
+            "user_id": np.arange(start_id + offset, start_id + offset + rows, dtype=np.int64),
+            "name": first + " " + last,
+            "language": languages.take(rng.integers(0, len(LANGUAGES), rows)),
+            "fav_category.domain": domains.take(category),
+            "fav_category.category": categories.take(category),
+        })
+
+
+def write_population(count, path, seed=None, chunk_rows=CHUNK_ROWS):
+    """
+    Generate a population straight into a Parquet file, one row group per chunk.
+    Returns:
+        rows (int): Profiles written.
+    """
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp{threading.get_ident()}"
+    writer = None
+    rows = 0
+    try:
+        for frame in generate_population(count, seed, chunk_rows):
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+            rows += len(frame)
+        if writer is None:
+            writer = pq.ParquetWriter(tmp_path, pa.Table.from_pandas(next(generate_population(1, seed)).head(0), preserve_index=False).schema)
+        writer.close()
+        os.replace(tmp_path, path)
+    except Exception:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(f"Wrote {rows} profiles to {path} in {time.perf_counter() - start:.2f} s")
+    return rows
+
+
+def iter_population(path, batch_rows=CHUNK_ROWS):
+    """Read a population Parquet file back in DataFrames of at most batch_rows profiles."""
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows):
+        yield batch.to_pandas()
+
+
+def population_users(frame):
+    """Profile dicts, as generate_users returns them, for the rows of a population DataFrame."""
+    return [
+        {"user_id": int(user_id), "name": name, "fav_category": {"domain": domain, "category": category}, "language": language}
+        for user_id, name, language, domain, category in zip(
+            frame["user_id"], frame["name"], frame["language"].astype(str),
+            frame["fav_category.domain"].astype(str), frame["fav_category.category"].astype(str))
+    ]
+
+
+_populations = {}
+_populations_lock = threading.Lock()
+
+
+def sample_population(path):
+    """One random profile of a population file as a one-row DataFrame; the file is read once per process."""
+    with _populations_lock:
+        population = _populations.get(path)
+        if population is None:
+            population = pq.read_table(path).to_pandas()
+            _populations[path] = population
+    row = random.randrange(len(population))
+    return pd.DataFrame({
+        column: [int(values.iat[row]) if column == "user_id" else str(values.iat[row])]
+        for column, values in population.items()
+    })
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Generate a synthetic consumer population as Parquet")
+    parser.add_argument("--count", type=int, required=True, help="Number of profiles")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for a reproducible population")
+    parser.add_argument("--output", default=f"{POPULATION_DIR}/population.parquet", help="Parquet file to write")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Profiles per chunk and row group")
+    args = parser.parse_args()
+    write_population(args.count, args.output, args.seed, args.chunk_rows)
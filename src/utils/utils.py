@@ -112,6 +112,7 @@ custom_css = """
         </style>
         """
 import os
+from src.utils import artifact_store
 def pickle_dump(obj, file_name):
     print(f"current Dir: {os.getcwd()}")
     full_path = f"{os.getcwd()}/temp/{file_name}"
@@ -122,4 +123,12 @@ def pickle_load(file_name):
     print(f"current Dir: {os.getcwd()}")
     full_path = f"{os.getcwd()}/temp/{file_name}"
     with open(full_path, "rb") as f:
-        return pickle.load(f)
\ No newline at end of file
+        return pickle.load(f)
+
+def artifact_dump(obj, file_name):
+    """Store a page artifact for the current session, e.g. artifact_dump(analysis, "creative_brief_analysis.pkl")."""
+    artifact_store.get_store().put(artifact_store.step_name(file_name), obj)
+
+def artifact_load(file_name):
+    """Load the current session's artifact, falling back to the shared seed file in temp/."""
+    return artifact_store.get_store().get(artifact_store.step_name(file_name))
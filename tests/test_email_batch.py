@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import zlib
+import pandas as pd
+import pytest
+from src.utils import email_batch, item_index, prompts, step_memo
+
+
+def make_users(count):
+    categories = [("movie", "Drama"), ("retail", "Men/Shoes")]
+    languages = ["American English", "French", "German"]
+    return [
+        {
+            "user_id": i + 1,
+            "name": f"User {i + 1}",
+            "fav_category": {"domain": categories[i % 2][0], "category": categories[i % 2][1]},
+            "language": languages[i % 3],
+        }
+        for i in range(count)
+    ]
+
+
+class FakeInvoke:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, params, profile):
+        with self._lock:
+            self.prompts.append(prompt)
+        for name in self.fail:
+            if name in prompt:
+                raise RuntimeError(f"failed for {name}")
+        if prompt.startswith("Translate"):
+            return f"<email>Traduction {zlib.crc32(prompt.encode())} pour {prompts.NAME_PLACEHOLDER}</email>", 40, 20
+        return f"<email>Email {zlib.crc32(prompt.encode())} for {prompts.NAME_PLACEHOLDER}</email>", 100, 50
+
+
+@pytest.fixture(autouse=True)
+def fake_catalog(monkeypatch, tmp_path):
+    def get_top_items(domain, category, n=3):
+        if domain == "travel":
+            raise KeyError("DST_CITY")
+        return pd.DataFrame({"name": [f"{category} item"], "description": ["An item."]})
+
+    monkeypatch.setattr(item_index, "get_top_items", get_top_items)
+    monkeypatch.setattr(step_memo, "_memo", step_memo.StepMemo(memo_dir=str(tmp_path / "memo")))
+
+
+def read_emails(output_dir):
+    with open(os.path.join(output_dir, "emails.jsonl")) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_online_generates_one_email_per_user(tmp_path):
+    users = make_users(10) + [{"user_id": 11, "name": "Traveller", "fav_category": {"domain": "travel", "category": "Tokyo"}, "language": "French"}]
+    invoke = FakeInvoke()
+    summary = email_batch.run_email_batch(users, str(tmp_path / "run"), invoke=invoke, concurrency=4)
+    assert summary["emails"] == 10
+    assert summary["failed"] == 1
+    assert len(invoke.prompts) == 10
+    emails = read_emails(tmp_path / "run")
+    assert sorted(e["record_id"] for e in emails) == [f"{i:08d}" for i in range(11)]
+    assert next(e for e in emails if e["domain"] == "travel")["error"].startswith("no items")
+
+
+def test_resume_retries_only_failed_records(tmp_path):
+    output_dir = str(tmp_path / "run")
+    users = make_users(6)
+    first = email_batch.run_email_batch(users, output_dir, invoke=FakeInvoke(fail=["User 3<"]))
+    assert first["failed"] == 1
+    retry = FakeInvoke()
+    second = email_batch.run_email_batch(None, output_dir, invoke=retry)
+    assert second["already_done"] == 5
+    assert second["emails"] == 1
+    assert len(retry.prompts) == 1 and "User 3<" in retry.prompts[0]
+
+
+def test_draft_translate_calls_once_per_item_set_and_language(tmp_path):
+    users = make_users(12)
+    invoke = FakeInvoke()
+    summary = email_batch.run_draft_translate(users, str(tmp_path / "run"), invoke=invoke)
+    # two item sets, each drafted once and translated into its two other languages
+    assert summary["emails"] == 12
+    assert summary["drafts"] == 2
+    assert summary["translations"] == 4
+    emails = read_emails(tmp_path / "run")
+    assert all(e["email"].endswith(e["name"]) for e in emails)
+    assert len({e["draft_hash"] for e in emails}) == 2
+
+    again = FakeInvoke()
+    cached = email_batch.run_draft_translate(users, str(tmp_path / "again"), invoke=again)
+    assert again.prompts == []
+    assert cached["cache_hits"] == 6
+    assert cached["input_tokens"] == 0
+
+
+def test_local_batch_and_resume_without_a_job(tmp_path):
+    output_dir = str(tmp_path / "run")
+    users = make_users(8)
+    summary = email_batch.run_batch_inference(users, output_dir, local=True)
+    assert summary["emails"] == 8
+    assert all(e["email"].startswith("Stand-in email") for e in read_emails(output_dir))
+    resumed = email_batch.run_batch_inference(None, output_dir, local=True)
+    assert resumed["already_done"] == 8
+    assert resumed["emails"] == 0
+
+
+def test_batch_below_minimum_runs_on_demand(tmp_path, monkeypatch):
+    def no_job(*args, **kwargs):
+        raise AssertionError("no job should be submitted")
+
+    calls = []
+    monkeypatch.setattr(email_batch, "submit_batch_job", no_job)
+    monkeypatch.setattr(email_batch, "run_email_batch", lambda *args, **kwargs: calls.append(args) or {"mode": "online"})
+    summary = email_batch.run_batch_inference(make_users(5), str(tmp_path / "run"), s3_prefix="s3://bucket/prefix", role_arn="arn")
+    assert summary["mode"] == "online"
+    assert len(calls) == 1
+
+
+def test_batch_with_nothing_left_submits_no_job(tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "run")
+    users = make_users(4)
+    email_batch.run_email_batch(users, output_dir, invoke=FakeInvoke())
+
+    def no_job(*args, **kwargs):
+        raise AssertionError("no job should be submitted")
+
+    monkeypatch.setattr(email_batch, "submit_batch_job", no_job)
+    summary = email_batch.run_batch_inference(None, output_dir, s3_prefix="s3://bucket/prefix", role_arn="arn")
+    assert summary["already_done"] == 4
+    assert not os.path.exists(os.path.join(output_dir, "batch_input.jsonl"))
+
+
+def fake_job(monkeypatch, status):
+    # a job some earlier run submitted; its output is what run_local_batch would write
+    waited, submitted = [], []
+
+    def wait_batch_job(job_arn, profile="default", poll_seconds=60):
+        waited.append(job_arn)
+        return {"jobArn": job_arn, "status": status, "message": "quota exceeded"}
+
+    def download_batch_output(job, output_path, profile="default"):
+        records, _ = email_batch.build_records(email_batch.user_profiles.load_users(os.path.join(os.path.dirname(output_path), "users.jsonl")))
+        input_path = email_batch.write_batch_input(records, f"{output_path}.in", email_batch.EMAIL_PARAMS)
+        return email_batch.run_local_batch(input_path, output_path)
+
+    def submit_batch_job(*args, **kwargs):
+        submitted.append(args)
+        return "arn:aws:bedrock:us-east-1:123456789012:model-invocation-job/new"
+
+    monkeypatch.setattr(email_batch, "wait_batch_job", wait_batch_job)
+    monkeypatch.setattr(email_batch, "download_batch_output", download_batch_output)
+    monkeypatch.setattr(email_batch, "submit_batch_job", submit_batch_job)
+    return waited, submitted
+
+
+def write_checkpoint(output_dir, users, job_arn):
+    os.makedirs(output_dir)
+    email_batch.user_profiles.write_users(users, os.path.join(output_dir, "users.jsonl"))
+    email_batch._write_json(os.path.join(output_dir, "checkpoint.json"), {"job_arn": job_arn, "records": len(users)})
+
+
+def test_batch_resume_waits_on_the_checkpointed_job(tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "run")
+    job_arn = "arn:aws:bedrock:us-east-1:123456789012:model-invocation-job/abc123"
+    write_checkpoint(output_dir, make_users(8), job_arn)
+    waited, submitted = fake_job(monkeypatch, "Completed")
+    summary = email_batch.run_batch_inference(None, output_dir, s3_prefix="s3://bucket/prefix", role_arn="arn")
+    assert submitted == []
+    assert waited == [job_arn]
+    assert summary["emails"] == 8
+    with open(os.path.join(output_dir, "checkpoint.json")) as f:
+        assert json.load(f)["collected"]
+
+
+def test_failed_batch_job_writes_errors_and_resubmits(tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "run")
+    write_checkpoint(output_dir, make_users(8), "arn:aws:bedrock:us-east-1:123456789012:model-invocation-job/abc123")
+    monkeypatch.setattr(email_batch, "MIN_BATCH_RECORDS", 1)
+    waited, submitted = fake_job(monkeypatch, "Expired")
+    failed = email_batch.run_batch_inference(None, output_dir, s3_prefix="s3://bucket/prefix", role_arn="arn")
+    assert failed["emails"] == 0
+    assert all(e["error"] == "batch job Expired: quota exceeded" for e in read_emails(output_dir))
+    assert submitted == []
+    email_batch.run_batch_inference(None, output_dir, s3_prefix="s3://bucket/prefix", role_arn="arn")
+    assert len(submitted) == 1
+    assert waited[-1].endswith("/new")
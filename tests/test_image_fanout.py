@@ -0,0 +1,20 @@
+from src.utils import image_fanout
+
+TITAN = "amazon.titan-image-generator-v2:0"
+SD3 = "stability.sd3-large-v1:0"
+
+
+def test_titan_seed_zero_gives_each_call_its_own_seed():
+    calls = image_fanout.plan_calls(TITAN, 12, 0, 8)
+    assert [c["seed"] for c in calls] == [0, 1, 2]
+    assert [c["num_images"] for c in calls] == [5, 5, 2]
+
+
+def test_stability_seed_zero_stays_random():
+    calls = image_fanout.plan_calls(SD3, 3, 0, 8)
+    assert [c["seed"] for c in calls] == [0, 0, 0]
+
+
+def test_pinned_seed_increments_per_call():
+    calls = image_fanout.plan_calls(SD3, 3, 42, 8)
+    assert [c["seed"] for c in calls] == [42, 43, 44]
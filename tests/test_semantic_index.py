@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.utils import item_catalog, semantic_index
+
+
+class CountingEmbedder(semantic_index.LocalEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return super().embed(texts)
+
+
+def texts(rows, seed=0):
+    return semantic_index._synthetic_texts(rows, seed)
+
+
+def exact_top(index, query, n):
+    vectors = np.asarray(index.vectors)
+    scores = vectors @ query
+    best = np.argsort(-scores, kind="stable")[:n]
+    return index.positions[best], scores[best]
+
+
+def test_build_maps_vectors_to_catalog_rows(tmp_path):
+    items = ["cozy winter jacket", "kids soccer cleat", "waterproof trail shoe"]
+    embedder = semantic_index.LocalEmbedder()
+    index = semantic_index.build_index(items, str(tmp_path / "index"), embedder)
+    assert index.vectors.shape == (3, semantic_index.DIMENSIONS)
+    assert isinstance(index.vectors, np.memmap)
+    for row, text in enumerate(items):
+        positions, scores = index.search(embedder.embed([text])[0], n=1)
+        assert positions[0] == row
+        assert scores[0] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_incremental_rebuild_embeds_only_changed_rows(tmp_path):
+    items = [f"item {i} with words {i % 7}" for i in range(200)]
+    embedder = CountingEmbedder()
+    first = semantic_index.build_index(items, str(tmp_path / "index"), embedder)
+    assert len(embedder.embedded) == 200
+    before = {int(p): np.array(v) for p, v in zip(first.positions, first.vectors)}
+
+    embedder.embedded.clear()
+    changed = items[:50] + ["a brand new fleece hoodie"] + items[51:] + ["another new item"]
+    second = semantic_index.build_index(changed, str(tmp_path / "index"), embedder, previous=first)
+    assert sorted(embedder.embedded) == ["a brand new fleece hoodie", "another new item"]
+    assert second.meta["embedded"] == 2
+    after = {int(p): np.array(v) for p, v in zip(second.positions, second.vectors)}
+    assert all(np.array_equal(after[row], before[row]) for row in range(200) if row != 50)
+
+
+def test_rebuild_with_another_embedder_reembeds_everything(tmp_path):
+    items = ["cozy winter jacket", "kids soccer cleat"]
+    first = semantic_index.build_index(items, str(tmp_path / "index"), semantic_index.LocalEmbedder())
+    other = CountingEmbedder()
+    other.name = "other"
+    semantic_index.build_index(items, str(tmp_path / "index"), other, previous=first)
+    assert len(other.embedded) == 2
+
+
+def test_exact_search_matches_brute_force(tmp_path):
+    embedder = semantic_index.LocalEmbedder()
+    index = semantic_index.build_index(texts(2_000), str(tmp_path / "index"), embedder)
+    assert len(index.centroids) == 1
+    for query in embedder.embed(["cozy winter jacket", "kids soccer cleat"]):
+        positions, scores = index.search(query, n=10)
+        _, expected_scores = exact_top(index, query, 10)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+        # synthetic items tie often, so check the returned rows really have those scores
+        vectors = {int(p): v for p, v in zip(index.positions, np.asarray(index.vectors))}
+        np.testing.assert_allclose([vectors[int(p)] @ query for p in positions], scores, rtol=1e-5)
+
+
+def test_clustered_search_close_to_exact(tmp_path, monkeypatch):
+    monkeypatch.setattr(semantic_index, "CLUSTER_MIN_ROWS", 1_000)
+    embedder = semantic_index.LocalEmbedder()
+    index = semantic_index.build_index(texts(5_000), str(tmp_path / "index"), embedder)
+    assert len(index.centroids) > 1
+    recalls = []
+    for query in embedder.embed(["cozy winter jacket", "kids soccer cleat", "waterproof trail shoe"]):
+        _, expected = exact_top(index, query, 10)
+        _, scores = index.search(query, n=10)
+        assert np.all(np.diff(scores) <= 1e-6)
+        recalls.append(np.mean(scores >= expected[-1] - 1e-6))
+        # probing every cluster is exact
+        _, all_scores = index.search(query, n=10, nprobe=len(index.centroids))
+        np.testing.assert_allclose(all_scores, expected, rtol=1e-5)
+    assert np.mean(recalls) >= 0.8
+
+
+def test_get_index_does_not_build_when_asked_not_to(tmp_path, monkeypatch):
+    catalog = pd.DataFrame({"name": ["Fleece Jacket", "Soccer Cleat"], "description": ["Warm winter fleece.", "Firm ground cleat."],
+                            "breadcrumbs": ["Men/Clothing", "Soccer/Shoes"], "average_rating": [4.5, 4.0]})
+    csv_path = tmp_path / "retail.csv"
+    catalog.to_csv(csv_path, index=False)
+    monkeypatch.setattr(item_catalog, "CATALOGS", {"retail": {"csv": str(csv_path)}})
+    monkeypatch.setattr(item_catalog, "get_catalog", lambda name, columns=None: catalog)
+    monkeypatch.setattr(semantic_index, "_indexes", {})
+    embedder = semantic_index.LocalEmbedder()
+    index_dir = str(tmp_path / "indexes")
+    assert semantic_index.get_index("retail", embedder, index_dir, build=False) is None
+    assert semantic_index.get_index("retail", embedder, index_dir) is not None
+    monkeypatch.setattr(semantic_index, "_indexes", {})
+    assert semantic_index.get_index("retail", embedder, index_dir, build=False) is not None